@@ -1,8 +1,9 @@
+from datetime import datetime
 from http import HTTPMethod
 
 from app.common import base_schemas as schemas
 from app.common.base_adapter import HTTPAdapterBase
-from app.common.base_schemas import AppID
+from app.common.base_schemas import AppID, Country, ReviewsSort, TimeBucket
 
 
 class AppStoreReviewViewerAdapter(HTTPAdapterBase):
@@ -13,6 +14,20 @@ class AppStoreReviewViewerAdapter(HTTPAdapterBase):
 
     _api_prefix = "/api"
 
+    async def get_health(self) -> schemas.HealthResponse:
+        return await self._call_service(
+            HTTPMethod.GET,
+            "/health",
+            response_schema=schemas.HealthResponse,
+        )
+
+    async def get_worker_pool(self) -> schemas.WorkerPoolStatus:
+        return await self._call_service(
+            HTTPMethod.GET,
+            "/workers",
+            response_schema=schemas.WorkerPoolStatus,
+        )
+
     async def get_apps(self) -> schemas.GetAppsResponse:
         return await self._call_service(
             HTTPMethod.GET,
@@ -20,9 +35,115 @@ class AppStoreReviewViewerAdapter(HTTPAdapterBase):
             response_schema=schemas.GetAppsResponse,
         )
 
-    async def get_reviews(self, app_id: AppID) -> schemas.GetReviewsResponse:
+    async def update_app(
+        self, app_id: AppID, payload: schemas.UpdateAppRequest
+    ) -> schemas.App:
+        return await self._call_service(
+            HTTPMethod.PUT,
+            f"/apps/{app_id}",
+            payload=payload,
+            response_schema=schemas.App,
+        )
+
+    async def create_apps_bulk(
+        self, payload: schemas.CreateAppsBulkRequest
+    ) -> schemas.CreateAppsBulkResponse:
+        return await self._call_service(
+            HTTPMethod.POST,
+            "/apps:bulk",
+            payload=payload,
+            response_schema=schemas.CreateAppsBulkResponse,
+        )
+
+    async def get_app_stats(self, app_id: AppID) -> schemas.AppStats:
+        return await self._call_service(
+            HTTPMethod.GET,
+            f"/apps/{app_id}/stats",
+            response_schema=schemas.AppStats,
+        )
+
+    async def get_apps_timeseries(
+        self,
+        app_ids: list[AppID] | None = None,
+        *,
+        bucket: TimeBucket = "day",
+        window: int = 7,
+    ) -> schemas.GetTimeSeriesResponse:
+        return await self._call_service(
+            HTTPMethod.GET,
+            "/apps/stats/timeseries",
+            params=[
+                *(("app_id", app_id) for app_id in app_ids or []),
+                ("bucket", bucket),
+                ("window", window),
+            ],
+            response_schema=schemas.GetTimeSeriesResponse,
+        )
+
+    async def start_backfill(self, app_id: AppID) -> schemas.BackfillStatus:
+        return await self._call_service(
+            HTTPMethod.POST,
+            f"/apps/{app_id}/backfill",
+            response_schema=schemas.BackfillStatus,
+        )
+
+    async def get_backfill(self, app_id: AppID) -> schemas.BackfillStatus:
+        return await self._call_service(
+            HTTPMethod.GET,
+            f"/apps/{app_id}/backfill",
+            response_schema=schemas.BackfillStatus,
+        )
+
+    async def get_reviews(
+        self,
+        app_id: AppID,
+        *,
+        country: Country | None = None,
+        updated_min: datetime | None = None,
+        updated_max: datetime | None = None,
+        score_in: list[int] | None = None,
+        author: str | None = None,
+        sort: ReviewsSort | None = None,
+    ) -> schemas.GetReviewsResponse:
+        params = {
+            "country": country,
+            "updated_min": updated_min.isoformat() if updated_min else None,
+            "updated_max": updated_max.isoformat() if updated_max else None,
+            "score_in": score_in,
+            "author": author,
+            "sort": sort,
+        }
         return await self._call_service(
             HTTPMethod.GET,
             f"/reviews/{app_id}",
+            params={k: v for k, v in params.items() if v is not None} or None,
             response_schema=schemas.GetReviewsResponse,
         )
+
+    async def request_reviews(self, app_id: AppID) -> schemas.PollingJob:
+        """Request reviews of unknown App asynchronously. See `get_job`."""
+        return await self._call_service(
+            HTTPMethod.GET,
+            f"/reviews/{app_id}",
+            headers={"Prefer": "respond-async"},
+            response_schema=schemas.PollingJob,
+        )
+
+    async def get_job(self, job_id: str) -> schemas.PollingJob:
+        return await self._call_service(
+            HTTPMethod.GET,
+            f"/jobs/{job_id}",
+            response_schema=schemas.PollingJob,
+        )
+
+    async def get_reviews_batch(
+        self, app_ids: list[AppID], *, updated_min: datetime | None = None
+    ) -> schemas.GetReviewsBatchResponse:
+        return await self._call_service(
+            HTTPMethod.POST,
+            "/reviews:batch",
+            payload=schemas.GetReviewsBatchRequest(
+                app_ids=app_ids, updated_min=updated_min
+            ),
+            response_schema=schemas.GetReviewsBatchResponse,
+        )
@@ -10,10 +10,20 @@ from fastapi.middleware.cors import CORSMiddleware
 from starlette.types import Lifespan
 
 from app.api import routes
+from app.api.middlewares import CompressionMiddleware, MetricsMiddleware
 from app.config import AppSettings
 from app.integration.itunes.adapter import ItunesRSSAdapter
+from app.services.autoscaler import WorkerPoolSupervisor
+from app.services.backfill import BackfillService
+from app.services.backoff import PollingBackoff
+from app.services.broker import TaskBroker
+from app.services.cache import ResponseCache
+from app.services.compaction import CompactionService
+from app.services.diagnostics import DiagnosticsService
 from app.services.polling import DataPollingWorker
+from app.services.pubsub import ReviewsHub
 from app.services.queue import DataPollingQueue
+from app.services.scheduller import SchedulerService
 from app.services.storage import StorageService
 
 logger = logging.getLogger(__name__)
@@ -27,11 +37,21 @@ class FastAPIApplication(FastAPI):
     class State(fastapi.datastructures.State):
         settings: AppSettings
         event_loop_tasks: list[asyncio.Task]
+        worker_tasks: list[asyncio.Task]
 
         # Services:
         storage: StorageService
         queue: DataPollingQueue
         workers: list[DataPollingWorker]
+        supervisor: WorkerPoolSupervisor
+        scheduler: SchedulerService
+        hub: ReviewsHub
+        backfill: BackfillService
+        backoff: PollingBackoff
+        broker: TaskBroker
+        response_cache: ResponseCache
+        compaction: CompactionService
+        diagnostics: DiagnosticsService
         external: ItunesRSSAdapter
 
     state: State
@@ -53,6 +73,7 @@ class FastAPIApplication(FastAPI):
             redirect_slashes=False,
         )
         app.state.settings = settings
+        app.state.response_cache = ResponseCache(settings.API_RESPONSE_CACHE_SIZE)
 
         app.add_middleware(
             CORSMiddleware,
@@ -61,9 +82,18 @@ class FastAPIApplication(FastAPI):
             allow_methods=["*"],
             allow_headers=["*"],
         )
+        app.add_middleware(
+            CompressionMiddleware,
+            encodings=settings.API_COMPRESSION_ENCODINGS,
+            minimum_size=settings.API_COMPRESSION_MIN_SIZE,
+        )
+        app.add_middleware(MetricsMiddleware)
 
         app.include_router(routes.apps, prefix=settings.API_PREFIX)
         app.include_router(routes.reviews, prefix=settings.API_PREFIX)
+        app.include_router(routes.jobs, prefix=settings.API_PREFIX)
         app.include_router(routes.monitoring, prefix=settings.API_PREFIX)
+        if settings.DIAGNOSTICS_ENABLED:
+            app.include_router(routes.debug, prefix=settings.API_PREFIX)
 
         return app
@@ -0,0 +1,115 @@
+import time
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.common.compression import compress_async, negotiate_encoding
+from app.common.metrics import REGISTRY
+
+HTTP_SERVER_LATENCY = REGISTRY.histogram(
+    "http_server_request_seconds",
+    "Incoming HTTP requests latency till response start.",
+    ("method", "route", "status"),
+)
+HTTP_SERVER_COMPRESSED = REGISTRY.counter(
+    "http_server_compressed_bytes_total",
+    "Response body bytes before and after compression.",
+    ("encoding", "stage"),
+)
+
+
+class MetricsMiddleware:
+    """
+    Measure per-route latency of incoming HTTP requests.
+    Latency is measured till response start, so long-living streams are not skewed.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # route is resolved at that point, use its template to limit cardinality
+                route = scope.get("route")
+                HTTP_SERVER_LATENCY.labels(
+                    scope["method"],
+                    route.path if route else "<unmatched>",
+                    message["status"],
+                ).observe(time.perf_counter() - started)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies with the encoding negotiated by `Accept-Encoding`.
+
+    Only complete bodies of at least `minimum_size` bytes are compressed. Streaming
+    responses (Server-Sent Events, etc.) and responses with `Content-Encoding` set
+    already (precompressed by route) are passed as is.
+    Large bodies are compressed in a thread.
+    """
+
+    def __init__(
+        self, app: ASGIApp, *, encodings: list[str], minimum_size: int = 1024
+    ) -> None:
+        self.app = app
+        self.encodings = encodings
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        encoding = negotiate_encoding(accept_encoding, self.encodings)
+        if not encoding:
+            return await self.app(scope, receive, send)
+
+        start: Message | None = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                return await send(message)
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if "content-encoding" in headers or content_type.startswith(
+                    "text/event-stream"
+                ):
+                    passthrough = True
+                    return await send(message)
+                start = message  # delay till the body is known
+                return None
+
+            if not start:
+                raise RuntimeError("Response body is sent before it's started")
+            body: bytes = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # streaming or tiny response: send as is
+                passthrough = True
+                await send(start)
+                return await send(message)
+
+            compressed = await compress_async(body, encoding)
+            HTTP_SERVER_COMPRESSED.labels(encoding, "in").inc(len(body))
+            HTTP_SERVER_COMPRESSED.labels(encoding, "out").inc(len(compressed))
+
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,19 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+class PydanticJSONResponse(JSONResponse):
+    """
+    JSON response of a pydantic model serialized by pydantic-core straight to bytes.
+
+    Route returning this response skips FastAPI response model re-validation and
+    `jsonable_encoder` pass, which are the most expensive part of responding with
+    large review lists. Route should declare `response_model` for OpenAPI schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.__pydantic_serializer__.to_json(content, by_alias=True)
+        return super().render(content)
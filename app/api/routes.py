@@ -1,11 +1,20 @@
+import asyncio
 import logging
-from datetime import datetime
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Annotated, AsyncIterator
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import AwareDatetime, TypeAdapter
 
+from app.api.responses import PydanticJSONResponse
 from app.common import base_schemas as schemas
-from app.common.base_schemas import AppID
+from app.common.base_schemas import AppID, Country, ReviewsSort, Score, TimeBucket
+from app.common.compression import compress_async, negotiate_encoding
+from app.common.metrics import REGISTRY
+from app.services.cache import CachedBody
+from app.services.diagnostics import ProfilerBusyError
+from app.services.queue import PollReviewsTask
+from app.services.storage import AppReviews, ReviewsQuery
 
 if TYPE_CHECKING:
     from app.api.app import Request
@@ -15,9 +24,13 @@ else:
 reviews = APIRouter(prefix="/reviews", tags=["App Store Reviews"])
 apps = APIRouter(prefix="/apps", tags=["App Store Apps"])
 monitoring = APIRouter(prefix="", tags=["Monitoring"])
+debug = APIRouter(prefix="/debug", tags=["Diagnostics"])
+jobs = APIRouter(prefix="/jobs", tags=["Polling Jobs"])
 
 logger = logging.getLogger(__name__)
 
+_REVIEWS_ADAPTER = TypeAdapter(list[schemas.Review])
+
 
 @apps.get("")
 async def get_apps(request: Request) -> schemas.GetAppsResponse:
@@ -25,18 +38,166 @@ async def get_apps(request: Request) -> schemas.GetAppsResponse:
 
     adapter = request.app.state.storage
     res = schemas.GetAppsResponse(items=await adapter.get_app_list())
-    logger.debug(f"Got {len(res.items)} apps")
+    logger.debug("Got %s apps", len(res.items))
     return res
 
 
-@reviews.get("/{app_id}")
+@apps.put("/{app_id}")
+async def update_app(
+    app_id: AppID, payload: schemas.UpdateAppRequest, request: Request
+) -> schemas.App:
+    """
+    Create or update App polling configuration.
+    Reviews are polled from all given storefront countries since the next poll.
+    Freshness tier is kept unless it's given.
+    """
+
+    logger.info("Handle HTTP Request: %s %s", request.method, request.url)
+
+    storage = request.app.state.storage
+    tier = payload.tier
+    if tier is None:
+        existing = await storage.get_app(app_id)
+        tier = existing.tier if existing else "standard"
+    app = schemas.App(
+        id=app_id, countries=list(dict.fromkeys(payload.countries)), tier=tier
+    )
+    await storage.create_app(app)
+    request.app.state.queue.push(app_id)
+    return app
+
+
+@apps.post(":bulk", status_code=status.HTTP_202_ACCEPTED)
+async def create_apps_bulk(
+    payload: schemas.CreateAppsBulkRequest, request: Request
+) -> schemas.CreateAppsBulkResponse:
+    """
+    Register many apps at once. Their first polls are spread over time (see
+    `POLLING_ONBOARDING_RATE`), so reviews of the new apps become available gradually.
+    """
+
+    logger.info("Handle HTTP Request: %s %s", request.method, request.url)
+
+    settings = request.app.state.settings
+    app_ids = list(dict.fromkeys(payload.app_ids))  # unique, but keep ordering
+    if len(app_ids) > settings.API_BULK_MAX_APPS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Too many apps: {len(app_ids)} > {settings.API_BULK_MAX_APPS}",
+        )
+
+    countries = list(dict.fromkeys(payload.countries))
+    created = await request.app.state.storage.create_apps(
+        [
+            schemas.App(id=app_id, countries=countries, tier=payload.tier)
+            for app_id in app_ids
+        ]
+    )
+    created_ids = [app.id for app in created]
+    existing_ids = set(app_ids) - set(created_ids)
+    rate = settings.POLLING_ONBOARDING_RATE
+    request.app.state.queue.push_staggered(created_ids, rate=rate)
+
+    logger.info("Registered %s of %s apps", len(created_ids), len(app_ids))
+    return schemas.CreateAppsBulkResponse(
+        created=created_ids,
+        existing=[app_id for app_id in app_ids if app_id in existing_ids],
+        polling_window=len(created_ids) / rate,
+    )
+
+
+@apps.get("/stats/timeseries")
+async def get_apps_timeseries(
+    request: Request,
+    *,
+    app_id: list[AppID] = Query(default_factory=list),
+    bucket: TimeBucket = "day",
+    window: int = Query(7, ge=1),
+) -> schemas.GetTimeSeriesResponse:
+    """
+    Get time bucketed rating aggregates (rolling average and trend delta) for the
+    given App IDs. All known apps are used if no App ID is provided.
+    """
+
+    storage = request.app.state.storage
+    app_ids = app_id or [app.id for app in await storage.get_app_list()]
+    items = await storage.get_app_timeseries(app_ids, bucket=bucket, window=window)
+    return schemas.GetTimeSeriesResponse(items=items)
+
+
+@apps.get("/{app_id}/stats")
+async def get_app_stats(app_id: AppID, request: Request) -> schemas.AppStats:
+    """Get precomputed rating aggregates for a given App ID."""
+
+    storage = request.app.state.storage
+    if not await storage.get_app(app_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown app: {app_id}"
+        )
+    return await storage.get_app_stats(app_id)
+
+
+@apps.post("/{app_id}/backfill", status_code=status.HTTP_202_ACCEPTED)
+async def start_backfill(app_id: AppID, request: Request) -> schemas.BackfillStatus:
+    """
+    Start fetching deep reviews history for a given App ID in the background.
+    Backfill runs with lower priority than the regular polling and is resumed after
+    restart from the last checkpoint. History is fetched from all storefront
+    countries of the App.
+    """
+
+    logger.info("Handle HTTP Request: %s %s", request.method, request.url)
+
+    app = await request.app.state.storage.get_app(app_id) or schemas.App(id=app_id)
+    backfill_status = await request.app.state.backfill.start(app_id, app.countries)
+    request.app.state.queue.push_backfill(app_id)
+    return backfill_status
+
+
+@apps.get("/{app_id}/backfill")
+async def get_backfill(app_id: AppID, request: Request) -> schemas.BackfillStatus:
+    """Get backfill progress for a given App ID."""
+
+    if not (backfill_status := request.app.state.backfill.get_status(app_id)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No backfill for app: {app_id}",
+        )
+    return backfill_status
+
+
+@reviews.get(
+    "/{app_id}",
+    response_model=schemas.GetReviewsResponse,
+    response_class=PydanticJSONResponse,
+    responses={
+        status.HTTP_202_ACCEPTED: {
+            "model": schemas.PollingJob,
+            "description": "Reviews of unknown App are being polled (async mode)",
+        },
+        status.HTTP_503_SERVICE_UNAVAILABLE: {
+            "description": "Polling backlog is full, retry later",
+        },
+    },
+)
 async def get_reviews(
     app_id: AppID,
     request: Request,
     *,
-    updated_min: datetime | None = None,
-) -> schemas.GetReviewsResponse:
-    """Get reviews for a given App ID."""
+    updated_min: AwareDatetime | None = None,
+    updated_max: AwareDatetime | None = None,
+    country: Country | None = None,
+    score_in: Annotated[list[Score] | None, Query()] = None,
+    author: str | None = None,
+    sort: ReviewsSort = "newest",
+) -> Response:
+    """
+    Get reviews for a given App ID, the most recent first by default.
+    Optionally, filtered by updated time range, storefront, scores and author.
+
+    Reviews of unknown App are polled before responding. In async mode (see
+    `API_ASYNC_JOBS` or `Prefer: respond-async`) polling job is returned at once.
+    """
 
     logger.info("Handle HTTP Request: %s %s", request.method, request.url)
 
@@ -50,14 +211,281 @@ async def get_reviews(
 
     else:
         logger.debug("Unknown app is requested: %s. ", app_id)
+        task = _admit_unknown_app(app_id, request)
+        if _is_async_requested(request):
+            return _respond_job(task, request, status.HTTP_202_ACCEPTED)
+
         logger.debug("Waiting for reviews being fetched for unknown app: %s", app_id)
-        task = queue.push(app_id)
         await task
 
-    reviews = await storage.get_review_list(app_id, updated_min=updated_min)
-    return schemas.GetReviewsResponse(items=reviews)
+    # all reads below are of the same snapshot, consistent with its ETag
+    snapshot = storage.get_app_reviews(app_id)
+    etag = f'W/"{storage.epoch}-{snapshot.version}"'
+    if _is_not_modified(request, etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+
+    query = ReviewsQuery(
+        updated_min=updated_min,
+        updated_max=updated_max,
+        country=country,
+        score_in=frozenset(score_in) if score_in else None,
+        author=author,
+        sort=sort,
+    )
+    if query.is_default:
+        response = await _get_cached_reviews_response(app_id, snapshot, request)
+    else:
+        reviews = await storage.select_reviews(snapshot, query)
+        # NOTE: stored reviews are valid already, so build response without validation
+        response = PydanticJSONResponse(
+            schemas.GetReviewsResponse.model_construct(items=reviews)
+        )
+    response.headers["ETag"] = etag
+    return response
+
+
+def _is_not_modified(request: Request, etag: str) -> bool:
+    """Weak comparison of the `If-None-Match` request header with the ETag."""
+    if not (header := request.headers.get("if-none-match")):
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def _admit_unknown_app(app_id: AppID, request: Request) -> PollReviewsTask:
+    """Push polling task, unless the queue backlog is too deep already."""
+    settings = request.app.state.settings
+    queue = request.app.state.queue
+
+    if queue.backlog >= settings.POLLING_MAX_BACKLOG and not queue.get_task(app_id):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Polling backlog is full: {queue.backlog} tasks",
+            headers={"Retry-After": str(settings.API_JOBS_RETRY_AFTER)},
+        )
+    return queue.push(app_id)
+
+
+def _is_async_requested(request: Request) -> bool:
+    prefer = request.headers.get("prefer", "").lower()
+    return request.app.state.settings.API_ASYNC_JOBS or "respond-async" in prefer
+
+
+def _respond_job(
+    task: PollReviewsTask, request: Request, status_code: int
+) -> PydanticJSONResponse:
+    headers = {"Location": str(request.url_for("get_job", job_id=task.job_id).path)}
+    if not task.is_completed:
+        headers["Retry-After"] = str(request.app.state.settings.API_JOBS_RETRY_AFTER)
+    job = schemas.PollingJob(
+        id=task.job_id,
+        app_id=task.app_id,
+        status=task.status,
+        pages_fetched=task.pages_fetched,
+        error=task.error,
+    )
+    return PydanticJSONResponse(job, status_code=status_code, headers=headers)
+
+
+async def _get_cached_reviews_response(
+    app_id: AppID, snapshot: AppReviews, request: Request
+) -> Response:
+    """
+    Respond with all App reviews serialized and compressed once per snapshot version.
+    Response is compressed here already, so CompressionMiddleware passes it as is.
+    """
+    settings = request.app.state.settings
+    storage = request.app.state.storage
+    cache = request.app.state.response_cache
+
+    accept = negotiate_encoding(
+        request.headers.get("accept-encoding", ""), settings.API_COMPRESSION_ENCODINGS
+    )
+    version = snapshot.version
+    if not (cached := cache.get(app_id, version, accept)):
+        if storage.is_offloaded(snapshot):
+            body = await asyncio.to_thread(_render_reviews, snapshot)
+        else:
+            body = _render_reviews(snapshot)
+        if accept and len(body) >= settings.API_COMPRESSION_MIN_SIZE:
+            cached = CachedBody(version, await compress_async(body, accept), accept)
+        else:
+            cached = CachedBody(version, body, None)
+        cache.set(app_id, accept, cached)
+
+    headers = {"Vary": "Accept-Encoding"}
+    if cached.encoding:
+        headers["Content-Encoding"] = cached.encoding
+    return Response(cached.body, media_type="application/json", headers=headers)
+
+
+def _render_reviews(snapshot: AppReviews) -> bytes:
+    reviews = schemas.GetReviewsResponse.model_construct(items=snapshot.select())
+    return bytes(PydanticJSONResponse(reviews).body)
+
+
+@jobs.get(
+    "/{job_id}",
+    response_model=schemas.PollingJob,
+    response_class=PydanticJSONResponse,
+)
+async def get_job(job_id: str, request: Request) -> PydanticJSONResponse:
+    """
+    Get polling job progress. Until the job is completed, response has
+    `Retry-After` header. After that, reviews are available at the reviews endpoint.
+    """
+    if not (task := request.app.state.queue.get_job(job_id)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown job: {job_id}"
+        )
+    return _respond_job(task, request, status.HTTP_200_OK)
+
+
+@reviews.post(
+    ":batch",
+    response_model=schemas.GetReviewsBatchResponse,
+    response_class=PydanticJSONResponse,
+)
+async def get_reviews_batch(
+    payload: schemas.GetReviewsBatchRequest,
+    request: Request,
+) -> PydanticJSONResponse:
+    """
+    Get reviews for many App IDs at once.
+    Reviews for unknown apps are polled concurrently before responding, unless
+    the polling backlog is full.
+    """
+
+    logger.info("Handle HTTP Request: %s %s", request.method, request.url)
+
+    settings = request.app.state.settings
+    storage = request.app.state.storage
+
+    app_ids = list(dict.fromkeys(payload.app_ids))  # unique, but keep ordering
+    if len(app_ids) > settings.API_BATCH_MAX_APPS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Too many apps: {len(app_ids)} > {settings.API_BATCH_MAX_APPS}",
+        )
+
+    # NOTE: known apps are kept actual by the scheduler, they are not re-polled
+    unknown_tasks = [
+        _admit_unknown_app(app_id, request)
+        for app_id in app_ids
+        if not await storage.get_app(app_id)
+    ]
+
+    if unknown_tasks:
+        logger.debug(
+            "Waiting for reviews being fetched for unknown apps: %s", unknown_tasks
+        )
+        await asyncio.gather(*[asyncio.ensure_future(task) for task in unknown_tasks])
+
+    items = await storage.get_review_lists(app_ids, updated_min=payload.updated_min)
+    return PydanticJSONResponse(
+        schemas.GetReviewsBatchResponse.model_construct(items=items)
+    )
+
+
+@reviews.get("/{app_id}/events", response_class=StreamingResponse)
+async def subscribe_reviews(app_id: AppID, request: Request) -> StreamingResponse:
+    """
+    Subscribe to newly ingested reviews for a given App ID (Server-Sent Events).
+    Every event contains only reviews inserted since the previous one.
+    """
+
+    logger.info("Handle HTTP Request: %s %s", request.method, request.url)
+
+    subscription = request.app.state.hub.subscribe(app_id)
+    keepalive = request.app.state.settings.PUBSUB_KEEPALIVE_INTERVAL
+
+    async def stream() -> AsyncIterator[bytes]:
+        try:
+            while True:
+                try:
+                    reviews = await asyncio.wait_for(anext(subscription), keepalive)
+                except TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                except StopAsyncIteration:
+                    # slow consumer is dropped, client has to re-sync via GET request
+                    yield b"event: dropped\ndata: {}\n\n"
+                    return
+
+                data = _REVIEWS_ADAPTER.dump_json(reviews, by_alias=True)
+                yield b"event: reviews\ndata: " + data + b"\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
 
 
 @monitoring.get("/health")
-async def health() -> None:
-    return None
+async def health(request: Request) -> schemas.HealthResponse:
+    """Service health and upstream availability."""
+
+    if not (breaker := request.app.state.external.circuit_breaker):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Upstream circuit breaker is not configured",
+        )
+    quarantined = request.app.state.backoff.get_quarantined()
+    scheduler = getattr(request.app.state, "scheduler", None)
+    return schemas.HealthResponse(
+        status="ok" if breaker.state == "closed" else "degraded",
+        upstream=schemas.CircuitBreakerStatus(
+            name=breaker.name,
+            state=breaker.state,
+            failures=breaker.failures,
+            retry_after=breaker.retry_after,
+        ),
+        quarantined_apps=quarantined,
+        freshness=await scheduler.get_freshness() if scheduler else [],
+    )
+
+
+@monitoring.get("/workers")
+async def get_worker_pool(request: Request) -> schemas.WorkerPoolStatus:
+    """Polling worker pool size and its recent scale events."""
+    if not (supervisor := getattr(request.app.state, "supervisor", None)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Polling workers are disabled"
+        )
+    return supervisor.status()
+
+
+@monitoring.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Metrics in Prometheus text exposition format."""
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@debug.get("/profile", response_class=PlainTextResponse)
+async def profile(
+    request: Request, *, seconds: float = Query(5.0, gt=0)
+) -> PlainTextResponse:
+    """
+    Sample event loop stacks for the given number of seconds.
+    Return flamegraph compatible collapsed-stack profile.
+    """
+
+    settings = request.app.state.settings
+    if seconds > settings.DIAGNOSTICS_PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Max profile duration is {settings.DIAGNOSTICS_PROFILE_MAX_SECONDS}s",
+        )
+
+    try:
+        content = await request.app.state.diagnostics.profile(seconds)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return PlainTextResponse(content)
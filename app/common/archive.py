@@ -0,0 +1,109 @@
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+from pydantic import AwareDatetime, BaseModel
+
+from app.common.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PAGES = REGISTRY.counter(
+    "archive_pages_total", "Archived upstream responses.", ("result",)
+)
+ARCHIVE_BYTES = REGISTRY.counter(
+    "archive_written_bytes_total", "Compressed bytes written to the archive."
+)
+
+
+class ArchiveEntry(BaseModel):
+    url: str
+    digest: str
+    """SHA-256 of the raw content, the blob address."""
+    fetched_at: AwareDatetime
+
+
+class FeedArchive:
+    """
+    Content addressed archive of raw upstream responses.
+
+    Every response content is gzip compressed and stored once by its hash at
+    `objects/<2 chars>/<hash>.gz`. Index of (url, hash) pairs is an append only
+    JSON lines file, so the same page is recorded again only when its content
+    is changed. The archive is safe to share among processes: blobs are written
+    atomically and index lines are appended at once.
+    """
+
+    INDEX = "index.jsonl"
+    OBJECTS = "objects"
+
+    def __init__(self, root: Path, *, compress_level: int = 6) -> None:
+        self._root = root
+        self._compress_level = compress_level
+        self._known: set[tuple[str, str]] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    async def put(self, url: str, content: bytes) -> str:
+        """Archive the response content of the given url. Return its hash."""
+        return await asyncio.to_thread(self._put, url, content)
+
+    def _put(self, url: str, content: bytes) -> str:
+        digest = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            known = self._load_known()
+            if (url, digest) in known:
+                ARCHIVE_PAGES.labels("duplicate").inc()
+                return digest
+
+            path = self._blob_path(digest)
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                blob = gzip.compress(content, self._compress_level, mtime=0)
+                tmp = path.with_suffix(f".{os.getpid()}.tmp")
+                tmp.write_bytes(blob)
+                tmp.replace(path)
+                ARCHIVE_BYTES.inc(len(blob))
+
+            entry = ArchiveEntry(
+                url=url, digest=digest, fetched_at=datetime.now(timezone.utc)
+            )
+            with (self._root / self.INDEX).open("a") as file:
+                file.write(entry.model_dump_json() + "\n")
+            known.add((url, digest))
+            ARCHIVE_PAGES.labels("new").inc()
+        return digest
+
+    def read(self, digest: str) -> bytes:
+        return gzip.decompress(self._blob_path(digest).read_bytes())
+
+    def entries(self) -> Iterator[ArchiveEntry]:
+        """Archived pages in order of fetching."""
+        path = self._root / self.INDEX
+        if not path.exists():
+            return
+        with path.open() as file:
+            for line in file:
+                if line.strip():
+                    yield ArchiveEntry.model_validate_json(line)
+
+    def _load_known(self) -> set[tuple[str, str]]:
+        if self._known is None:
+            self._root.mkdir(parents=True, exist_ok=True)
+            self._known = {(entry.url, entry.digest) for entry in self.entries()}
+        return self._known
+
+    def _blob_path(self, digest: str) -> Path:
+        return self._root / self.OBJECTS / digest[:2] / f"{digest}.gz"
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._root})"
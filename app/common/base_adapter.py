@@ -1,4 +1,6 @@
 import asyncio
+import logging
+import time
 from http import HTTPMethod
 from typing import Any, Type, TypeVar
 
@@ -6,10 +8,27 @@ import httpx
 from fastapi import HTTPException, status
 from pydantic import BaseModel, TypeAdapter
 
+from app.common.archive import FeedArchive
+from app.common.circuit_breaker import CircuitBreaker
+from app.common.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
 _T = TypeVar("_T")
 _TSchema = TypeVar("_TSchema", bound=BaseModel)
 _TYPE_ADAPTERS: dict[type, TypeAdapter[Any]] = {}
 
+HTTP_CLIENT_LATENCY = REGISTRY.histogram(
+    "http_client_request_seconds",
+    "Outgoing HTTP requests latency.",
+    ("adapter", "method", "result"),
+)
+HTTP_CLIENT_VALIDATION = REGISTRY.histogram(
+    "http_client_validation_seconds",
+    "Time to validate outgoing HTTP requests response content.",
+    ("adapter",),
+)
+
 PrimitiveData = str | int | float | bool | None
 QueryParamTypes = (
     dict[str, PrimitiveData | list[PrimitiveData]] | list[tuple[str, PrimitiveData]]
@@ -27,8 +46,16 @@ class HTTPAdapterBase:
     _base_url: httpx.URL | str | None = None
     _api_prefix: httpx.URL | str | None = None
 
-    def __init__(self, client: httpx.AsyncClient) -> None:
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        *,
+        circuit_breaker: CircuitBreaker | None = None,
+        archive: FeedArchive | None = None,
+    ) -> None:
         self._client = client
+        self.circuit_breaker = circuit_breaker
+        self.archive = archive
 
     def _use_url(self, url: httpx.URL | str) -> httpx.URL:
         if isinstance(url, str):
@@ -74,7 +101,18 @@ class HTTPAdapterBase:
         url = self._use_url(url)
         json = self._use_json(payload)
         params = self._use_params(params)
-
+        if json is not None:
+            other_request_kwargs["headers"] = {
+                "Content-Type": "application/json",
+                **(other_request_kwargs.get("headers") or {}),
+            }
+
+        adapter_name = type(self).__name__
+        if self.circuit_breaker:
+            self.circuit_breaker.check()
+
+        result = "error"
+        started = time.perf_counter()
         try:
             content = await self._process_request(
                 method,
@@ -84,9 +122,11 @@ class HTTPAdapterBase:
                 data=json,
                 **other_request_kwargs,
             )
+            result = "ok"
 
         # request timeout:
-        except asyncio.TimeoutError:
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            result = "timeout"
             raise HTTPException(
                 status_code=status.HTTP_504_GATEWAY_TIMEOUT,
                 detail=f"HTTP Request timed out: {method} {url}",
@@ -94,18 +134,52 @@ class HTTPAdapterBase:
 
         # reraise http error with original status code:
         except httpx.HTTPStatusError as e:
+            result = str(e.response.status_code)
             detail = (
                 f"HTTP Request failed: bad status code received. {method} {url} {e}"
             )
             raise HTTPException(status_code=e.response.status_code, detail=detail)
 
-        if response_with_content:
-            return await self._validate_content(
-                response_schema, content, validation_context
+        except httpx.TransportError:
+            result = "transport_error"
+            raise
+
+        finally:
+            HTTP_CLIENT_LATENCY.labels(adapter_name, method, result).observe(
+                time.perf_counter() - started
             )
+            if self.circuit_breaker:
+                self._record_call(self.circuit_breaker, result)
+
+        if self.archive and content:
+            await self._archive(url, content)
+
+        if response_with_content:
+            with HTTP_CLIENT_VALIDATION.labels(adapter_name).time():
+                return await self._validate_content(
+                    response_schema, content, validation_context
+                )
 
         return response_schema()
 
+    async def _archive(self, url: httpx.URL, content: bytes) -> None:
+        # NOTE: archive is best effort, it never fails the call
+        try:
+            await self.archive.put(str(url), content)  # type: ignore[union-attr]
+        except Exception as e:
+            logger.warning("Failed to archive response of %s: %r", url, e)
+
+    @staticmethod
+    def _record_call(circuit_breaker: CircuitBreaker, result: str) -> None:
+        # NOTE: only timeouts, server errors and transport errors mean that the
+        # service is unhealthy, client errors are the caller's problem
+        if result in ("timeout", "transport_error") or result.startswith("5"):
+            circuit_breaker.record_failure()
+        elif result == "error":
+            circuit_breaker.release()  # cancelled or failed locally, no verdict
+        else:
+            circuit_breaker.record_success()
+
     async def _process_request(
         self,
         method: HTTPMethod,
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 import warnings
-from typing import Annotated, Generic, TypeVar
+from datetime import date, timedelta
+from typing import Annotated, Generic, Literal, TypeVar
 
 from fastapi import Path
 from pydantic import AwareDatetime, BaseModel, ConfigDict, Field
@@ -13,6 +14,17 @@ warnings.filterwarnings("error", r"Pydantic serializer warnings")
 AppID = Annotated[int, Field(description="AppStore Application ID")]
 AppIDPath = Annotated[int, Path(description="AppStore Application ID")]
 ReviewId = Annotated[str, Field(description="AppStore Review ID")]
+Country = Annotated[
+    str, Field(description="AppStore storefront country code", pattern=r"^[a-z]{2}$")
+]
+TimeBucket = Literal["day", "week"]
+ScaleReason = Literal["backlog", "idle", "upstream_errors"]
+ReviewsSort = Literal["newest", "oldest", "highest", "lowest"]
+AppTier = Literal["flagship", "standard", "low"]
+"""Freshness tiers, the most important first (see `POLLING_TIER_SLA`)."""
+Score = Annotated[int, Field(ge=1, le=5, description="Review score")]
+
+DEFAULT_COUNTRY = "us"
 
 
 class BaseSchema(BaseModel):
@@ -34,6 +46,11 @@ class BaseSchema(BaseModel):
 class App(BaseSchema):
     id: AppID
 
+    countries: list[Country] = [DEFAULT_COUNTRY]
+    """Storefront countries to poll reviews from."""
+    tier: AppTier = "standard"
+    """Freshness tier: how stale the App reviews are allowed to be."""
+
 
 class Review(BaseSchema):
     id: ReviewId
@@ -44,6 +61,58 @@ class Review(BaseSchema):
     author: str
     score: int
     updated: AwareDatetime
+    country: Country = DEFAULT_COUNTRY
+
+
+class AppStats(BaseSchema):
+    app_id: AppID
+
+    count: int
+    """Total number of stored reviews."""
+    mean_score: float | None
+    """Average review score. None if there are no reviews yet."""
+    histogram: dict[int, int]
+    """Number of reviews per score (from 1 to 5)."""
+    daily: dict[date, int]
+    """Number of reviews per day (UTC)."""
+
+
+class TimeSeriesPoint(BaseSchema):
+    start: AwareDatetime
+    """Bucket start time (UTC)."""
+    count: int
+    mean_score: float
+    rolling_mean_score: float
+    """Average score over the rolling window ending at this bucket."""
+    trend_delta: float | None
+    """Rolling mean change compared to the previous window."""
+
+
+class AppTimeSeries(BaseSchema):
+    app_id: AppID
+    points: list[TimeSeriesPoint]
+
+
+class RetentionPolicy(BaseSchema):
+    max_age: timedelta | None = None
+    """Reviews updated earlier are removed. Unlimited if not set."""
+    max_count: int | None = Field(default=None, ge=0)
+    """Only that many most recent reviews are kept. Unlimited if not set."""
+
+    @property
+    def is_unlimited(self) -> bool:
+        return self.max_age is None and self.max_count is None
+
+
+class BackfillStatus(BaseSchema):
+    app_id: AppID
+
+    pending: list[str]
+    """Slices (`country:sortBy`) to fetch yet."""
+    completed: list[str]
+    """Slices fetched completely."""
+    error: str | None = None
+    """Error the backfill is failed with. It's resumed when started again."""
 
 
 _T = TypeVar("_T")
@@ -59,3 +128,100 @@ class GetAppsResponse(BasePaginatedResponse[App]):
 
 class GetReviewsResponse(BasePaginatedResponse[Review]):
     pass
+
+
+class GetTimeSeriesResponse(BasePaginatedResponse[AppTimeSeries]):
+    pass
+
+
+class CircuitBreakerStatus(BaseSchema):
+    name: str
+    state: Literal["closed", "open", "half_open"]
+    failures: int
+    """Number of consecutive failures."""
+    retry_after: float
+    """Seconds until the next upstream call is let through."""
+
+
+class PollingJob(BaseSchema):
+    id: str
+    app_id: AppID
+
+    status: Literal["pending", "in_progress", "completed", "failed"]
+    pages_fetched: int
+    """Upstream pages fetched so far."""
+    error: str | None = None
+
+
+class ScaleEvent(BaseSchema):
+    at: AwareDatetime
+    workers_before: int
+    workers_after: int
+    reason: ScaleReason
+    backlog: int
+    """Regular tasks waiting for workers."""
+    wait: float
+    """Seconds the oldest task waits for a worker."""
+    error_ratio: float
+    """Share of failed tasks since the previous evaluation."""
+
+
+class WorkerPoolStatus(BaseSchema):
+    workers: int
+    busy: int
+    min_workers: int
+    max_workers: int
+    events: list[ScaleEvent]
+    """Recent scale events, the latest last."""
+
+
+class TierFreshness(BaseSchema):
+    tier: AppTier
+    sla: float
+    """Max seconds since the last poll of an App of the tier."""
+    apps: int
+    lag: float
+    """Seconds since the last poll of the stalest polled App of the tier."""
+    breaches: int
+    """Apps polled longer than `sla` ago, or never polled."""
+    shed: int
+    """Scheduled polls skipped at the last scheduling, as workers are saturated."""
+
+
+class HealthResponse(BaseSchema):
+    status: Literal["ok", "degraded"]
+    upstream: CircuitBreakerStatus
+    quarantined_apps: list[AppID]
+    """Apps excluded from scheduled polling after repeated failures."""
+    freshness: list[TierFreshness] = []
+    """Reviews freshness per App tier, empty while the scheduler is disabled."""
+
+
+class UpdateAppRequest(BaseSchema):
+    countries: list[Country] = Field(min_length=1)
+    tier: AppTier | None = None
+    """Tier of the existing App is kept if not set, new App is `standard`."""
+
+
+class CreateAppsBulkRequest(BaseSchema):
+    app_ids: list[AppID] = Field(min_length=1)
+    countries: list[Country] = Field([DEFAULT_COUNTRY], min_length=1)
+    """Storefront countries to poll reviews of all the new apps from."""
+    tier: AppTier = "standard"
+
+
+class CreateAppsBulkResponse(BaseSchema):
+    created: list[AppID]
+    existing: list[AppID]
+    """Already known apps, they are kept as is."""
+    polling_window: float
+    """Seconds within which the first polls of the new apps are spread."""
+
+
+class GetReviewsBatchRequest(BaseSchema):
+    app_ids: list[AppID]
+    updated_min: AwareDatetime | None = None
+
+
+class GetReviewsBatchResponse(BaseModel):
+    items: dict[AppID, list[Review]]
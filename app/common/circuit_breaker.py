@@ -0,0 +1,119 @@
+import logging
+import time
+from typing import Callable, Literal
+
+from fastapi import HTTPException, status
+
+from app.common.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+CIRCUIT_STATE = REGISTRY.gauge(
+    "circuit_breaker_open",
+    "1 if the circuit breaker is open or half open, 0 otherwise.",
+    ("name",),
+)
+CIRCUIT_REJECTED = REGISTRY.counter(
+    "circuit_breaker_rejected_total",
+    "Number of calls rejected by the open circuit breaker.",
+    ("name",),
+)
+
+
+class CircuitOpenError(HTTPException):
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Circuit breaker is open: {name}. Retry after {retry_after:.1f}s",
+            headers={"Retry-After": str(int(retry_after) + 1)},
+        )
+
+
+class CircuitBreaker:
+    """
+    Consecutive failures circuit breaker.
+
+    Opens after `failure_threshold` consecutive failures, so calls are rejected
+    without reaching the failing service. After `recovery_timeout` one probe call is
+    let through (half open): it closes the circuit on success or opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,  # seconds
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._recovery_timeout = recovery_timeout
+        self._clock = clock
+
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> CircuitState:
+        if self._opened_at is None:
+            return "closed"
+        if self.retry_after > 0:
+            return "open"
+        return "half_open"
+
+    @property
+    def failures(self) -> int:
+        """Number of consecutive failures."""
+        return self._failures
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the next probe call is let through."""
+        if self._opened_at is None:
+            return 0.0
+        return max(self._opened_at + self._recovery_timeout - self._clock(), 0.0)
+
+    def check(self) -> None:
+        """Raise CircuitOpenError if the call is not allowed."""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return
+
+        CIRCUIT_REJECTED.labels(self.name).inc()
+        raise CircuitOpenError(self.name, self.retry_after)
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            logger.info("Circuit breaker is closed: %s", self.name)
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        CIRCUIT_STATE.labels(self.name).set(0)
+
+    def release(self) -> None:
+        """Let the next probe through, if the current call ends with no verdict."""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._probing or (
+            self._opened_at is None and self._failures >= self._failure_threshold
+        ):
+            logger.warning(
+                "Circuit breaker is open: %s. %s consecutive failures",
+                self.name,
+                self._failures,
+            )
+            self._opened_at = self._clock()
+            self._probing = False
+            CIRCUIT_STATE.labels(self.name).set(1)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.name}, {self.state})"
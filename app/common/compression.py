@@ -0,0 +1,69 @@
+import asyncio
+import gzip
+import logging
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+Compressor = Callable[[bytes], bytes]
+
+OFFLOAD_SIZE = 64 * 1024
+
+COMPRESSORS: dict[str, Compressor] = {
+    "gzip": lambda data: gzip.compress(data, compresslevel=6, mtime=0),
+}
+
+# optional dependencies: `compression` extra
+try:
+    import brotli
+
+    COMPRESSORS["br"] = lambda data: brotli.compress(data, quality=5)
+except ImportError:  # pragma: no cover
+    logger.debug("brotli is not installed, br encoding is disabled")
+
+try:
+    import zstandard
+
+    COMPRESSORS["zstd"] = lambda data: zstandard.compress(data, level=3)
+except ImportError:  # pragma: no cover
+    logger.debug("zstandard is not installed, zstd encoding is disabled")
+
+
+def negotiate_encoding(accept_encoding: str, preferred: list[str]) -> str | None:
+    """
+    Choose content encoding by `Accept-Encoding` header value.
+    Encodings accepted with the highest quality win, ties are resolved by the
+    server preference order. None if no encoding is acceptable (identity).
+    """
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        qualities[name.strip()] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    candidates = [
+        (qualities.get(encoding, wildcard), -idx, encoding)
+        for idx, encoding in enumerate(preferred)
+        if encoding in COMPRESSORS
+    ]
+    candidates = [c for c in candidates if c[0] > 0]
+    if not candidates:
+        return None
+    return max(candidates)[2]
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    return COMPRESSORS[encoding](data)
+
+
+async def compress_async(data: bytes, encoding: str) -> bytes:
+    """Compress large data in a thread, so event loop is not blocked."""
+    if len(data) < OFFLOAD_SIZE:
+        return compress(data, encoding)
+    return await asyncio.to_thread(compress, data, encoding)
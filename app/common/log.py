@@ -0,0 +1,105 @@
+import atexit
+import json
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Any
+
+# standard LogRecord attributes, everything else is passed via `extra`
+_RECORD_ATTRS = frozenset(
+    logging.LogRecord("", 0, "", 0, "", None, None).__dict__.keys()
+) | {"message", "asctime", "color_message"}
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+class JSONFormatter(logging.Formatter):
+    """Format log records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc_info"] = record.exc_text
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Allow at most `rate` records per `period` seconds for every message template of
+    the given level or below. Intended for chatty hot-path debug logs. The number of
+    suppressed records is reported with the next passed record.
+    """
+
+    MAX_KEYS = 10_000
+
+    def __init__(
+        self, rate: int = 20, period: float = 1.0, level: str | int = logging.DEBUG
+    ) -> None:
+        super().__init__()
+        self._rate = rate
+        self._period = period
+        self._level = logging.getLevelName(level) if isinstance(level, str) else level
+        # (logger, template) -> [window start, passed, suppressed]
+        self._windows: dict[tuple[str, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self._level:
+            return True
+
+        key = (record.name, str(record.msg))
+        window = self._windows.get(key)
+        if window is None or record.created - window[0] >= self._period:
+            if window is None and len(self._windows) >= self.MAX_KEYS:
+                self._windows.clear()
+            if window and window[2]:
+                record.msg = f"{record.msg} [{window[2]} similar records suppressed]"
+            self._windows[key] = [record.created, 1, 0]
+            return True
+
+        if window[1] < self._rate:
+            window[1] += 1
+            return True
+
+        window[2] += 1
+        return False
+
+
+def start_queue_listener(handler_name: str) -> None:
+    """
+    Start background listener of the QueueHandler configured by `dictConfig`.
+    Handlers behind the queue (console, files) are called from the listener thread,
+    so logging never blocks the event loop on I/O.
+    """
+    global _listener
+
+    stop_queue_listener()
+    handler = logging.getHandlerByName(handler_name)
+    if isinstance(handler, logging.handlers.QueueHandler) and handler.listener:
+        _listener = handler.listener
+        _listener.start()
+
+
+def stop_queue_listener() -> None:
+    """Flush pending records and stop background listener."""
+    global _listener
+
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_queue_listener)
@@ -0,0 +1,232 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Any, Generic, Iterator, Self, TypeVar
+
+_TChild = TypeVar("_TChild")
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+class _Metric(ABC, Generic[_TChild]):
+    type: str
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self._children: dict[tuple[str, ...], _TChild] = {}
+        if not labels:
+            self._children[()] = self._new_child()
+
+    def labels(self, *values: object) -> _TChild:
+        key = tuple(str(v) for v in values)
+        if (child := self._children.get(key)) is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f"Expected labels {self.label_names}, got {key}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self) -> _TChild: ...
+
+    def _render_labels(
+        self, values: tuple[str, ...], extra: tuple[tuple[str, str], ...] = ()
+    ) -> str:
+        pairs = [*zip(self.label_names, values), *extra]
+        if not pairs:
+            return ""
+        inner = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+        return "{" + inner + "}"
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]: ...
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self.samples(),
+        ]
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric[_Value]):
+    type = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._children[()].inc(amount)
+
+    def samples(self) -> Iterator[str]:
+        for values, child in self._children.items():
+            yield f"{self.name}{self._render_labels(values)} {_format(child.value)}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._children[()].dec(amount)
+
+    def set(self, value: float) -> None:
+        self._children[()].set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: _HistogramValue) -> None:
+        self._histogram = histogram
+        self._start = 0.0
+
+    def __enter__(self) -> Self:
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class Histogram(_Metric[_HistogramValue]):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...],
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labels)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._children[()].observe(value)
+
+    def time(self) -> _Timer:
+        return self._children[()].time()
+
+    def samples(self) -> Iterator[str]:
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), child.counts):
+                cumulative += count
+                labels = self._render_labels(values, (("le", _format(bound)),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = self._render_labels(values)
+            yield f"{self.name}_sum{labels} {_format(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus compatible metrics registry.
+
+    Metrics are plain in-process counters, gauges and histograms with cached label
+    children, so instrumentation of hot paths costs a dict lookup and a few float
+    operations. Registering the same metric twice returns the existing one.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Any] = {}
+
+    def counter(
+        self, name: str, documentation: str, labels: tuple[str, ...] = ()
+    ) -> Counter:
+        if not (metric := self._metrics.get(name)):
+            metric = self._metrics[name] = Counter(name, documentation, labels)
+        return metric
+
+    def gauge(
+        self, name: str, documentation: str, labels: tuple[str, ...] = ()
+    ) -> Gauge:
+        if not (metric := self._metrics.get(name)):
+            metric = self._metrics[name] = Gauge(name, documentation, labels)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        if not (metric := self._metrics.get(name)):
+            metric = self._metrics[name] = Histogram(
+                name, documentation, labels, buckets
+            )
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+REGISTRY = MetricsRegistry()
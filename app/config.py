@@ -4,7 +4,7 @@ from typing import Any, ClassVar, Literal
 
 from pydantic import BaseModel, ConfigDict
 
-from app.common.base_schemas import AppID
+from app.common.base_schemas import AppID, AppTier, RetentionPolicy
 
 
 class AppSettings(BaseModel):
@@ -32,24 +32,131 @@ class AppSettings(BaseModel):
         "http://ec2-35-91-177-204.us-west-2.compute.amazonaws.com",
     ]
     API_PREFIX: str = "/api"
+    API_COMPRESSION_ENCODINGS: list[str] = ["zstd", "br", "gzip"]
+    """Response encodings by preference. Unavailable ones (no extra deps) are skipped."""
+    API_COMPRESSION_MIN_SIZE: int = 1024  # bytes
+    API_RESPONSE_CACHE_SIZE: int = 256
+    """Max serialized reviews responses (per App and encoding) kept in memory."""
+    API_ASYNC_JOBS: bool = False
+    """
+    Respond `202 Accepted` with a polling job to requests of unknown apps instead of
+    waiting for reviews. Clients opt in per request with `Prefer: respond-async`.
+    """
+    API_JOBS_RETRY_AFTER: int = 2  # seconds
+    API_JOBS_HISTORY: int = 1000
+    """Number of recent polling jobs available for status requests."""
+    API_BULK_MAX_APPS: int = 10_000
+    """Max App IDs per bulk registration request."""
+    API_BATCH_MAX_APPS: int = 100
+    """Max App IDs per batch reviews request."""
 
     SCHEDULER_ENABLED: bool = True
     POLLING_REVIEWS_DEPTH: timedelta = timedelta(days=10)
     POOLING_WORKERS_NUM: int = 10
+    """Initial (or fixed, without autoscaling) number of polling workers. 0 disables."""
+    POLLING_AUTOSCALE_ENABLED: bool = True
+    POLLING_WORKERS_MIN: int = 2
+    POLLING_WORKERS_MAX: int = 50
+    POLLING_AUTOSCALE_INTERVAL: float = 5.0  # seconds
+    POLLING_AUTOSCALE_TARGET_WAIT: float = 10.0  # seconds
+    """Queue wait to scale up the worker pool at."""
+    POLLING_AUTOSCALE_MAX_ERROR_RATIO: float = 0.5
+    """Share of failed tasks to scale down the worker pool at (upstream is failing)."""
+    POLLING_MAX_CONCURRENT_REQUESTS: int = 20
+    """Upstream requests in flight shared among all workers and storefronts."""
+    POLLING_MAX_BACKLOG: int = 1000
+    """Pending tasks to reject requests of unknown apps with `503` (admission)."""
+    POLLING_TIER_SLA: dict[AppTier, timedelta] = {
+        "flagship": timedelta(minutes=2),
+        "standard": timedelta(minutes=15),
+        "low": timedelta(hours=1),
+    }
+    """
+    Max age of the App reviews (time since its last poll) per freshness tier.
+    Scheduled polls are due by that deadline and taken earliest deadline first.
+    """
+    POLLING_SHED_BACKLOG: int = 200
+    """
+    Pending tasks starting from which scheduled polls are shed, the lowest tier first.
+    Polls of the most important tier are never shed.
+    """
+    POLLING_ONBOARDING_RATE: float = 5.0  # apps per second
+    """First polls of bulk registered apps are spread (with jitter) at that rate."""
+    POLLING_QUEUE_SNAPSHOT_PATH: Path = ROOT_DIR / "data" / "queue.json"
+    """Unfinished polling tasks are saved on shutdown and restored at startup."""
+    POLLING_SHUTDOWN_TIMEOUT: float = 10.0  # seconds
+    """Time to let in progress polling tasks complete on shutdown."""
+    POLLING_BROKER_ENABLED: bool = False
+    """Delegate polling to the worker processes (`python -m app.main worker`)."""
+    POLLING_BROKER_PATH: Path = ROOT_DIR / "data" / "broker.sqlite3"
+    POLLING_BROKER_VISIBILITY_TIMEOUT: float = 60.0  # seconds
+    POLLING_BROKER_MAX_ATTEMPTS: int = 3
+    POLLING_BROKER_POLL_INTERVAL: float = 0.1  # seconds
+    POLLING_BROKER_PROCESSES: int = 2
+    POLLING_BROKER_CONCURRENCY: int = 10
+    """Number of tasks polled concurrently by every worker process."""
+    POLLING_BACKOFF_BASE_DELAY: float = 60.0  # seconds
+    POLLING_BACKOFF_MAX_DELAY: float = 3600.0  # seconds
+    POLLING_QUARANTINE_AFTER: int = 10
+    """Consecutive failed polls to exclude the app from scheduled polling."""
     STORAGE_PATH: Path = ROOT_DIR / "data" / "storage.json"
+    STORAGE_FORMAT: Literal["json", "binary"] = "json"
+    """Format to write storage file in. Any format is loaded."""
+    STORAGE_SNAPSHOT_COMPRESSION: Literal["none", "zlib", "zstd"] = "none"
+    """Compression of binary storage file and exported snapshots."""
+    STORAGE_READ_OFFLOAD_SIZE: int = 10_000
+    """Reviews of a single App, starting from which reads run in a thread."""
     STORAGE_INITIAL_APP_IDS: list[AppID] = [
         415458524,  # SkyScanner
         595068606,  # Tab
         640437525,  # Qantas
     ]
+    STORAGE_RETENTION: RetentionPolicy = RetentionPolicy()
+    """
+    Default reviews retention per app. Keep `max_age` above `POLLING_REVIEWS_DEPTH`,
+    otherwise removed reviews are polled again.
+    """
+    STORAGE_RETENTION_APPS: dict[AppID, RetentionPolicy] = {}
+    """Retention overrides for specific apps."""
+    STORAGE_COMPACTION_INTERVAL: float = 3600.0  # seconds
 
-    HTTP_EXTERNAL_RSS_HOST: str = "https://itunes.apple.com/us/rss/customerreviews"
+    BACKFILL_MAX_CONCURRENCY: int = 1
+    BACKFILL_RETRY_BASE_DELAY: float = 60.0  # seconds
+    BACKFILL_RETRY_MAX_DELAY: float = 3600.0  # seconds
+    BACKFILL_MAX_ATTEMPTS: int = 5
+    """Failed slice attempts in a row to fail the App backfill."""
+    BACKFILL_CHECKPOINT_PATH: Path = ROOT_DIR / "data" / "backfill.json"
+
+    PUBSUB_BUFFER_SIZE: int = 100
+    PUBSUB_KEEPALIVE_INTERVAL: float = 15.0  # seconds
+
+    DIAGNOSTICS_ENABLED: bool = False
+    DIAGNOSTICS_LOOP_LAG_INTERVAL: float = 0.25  # seconds
+    DIAGNOSTICS_SLOW_CALLBACK_THRESHOLD: float = 0.1  # seconds
+    DIAGNOSTICS_PROFILE_INTERVAL: float = 0.005  # seconds
+    DIAGNOSTICS_PROFILE_MAX_SECONDS: float = 60.0
+
+    HTTP_EXTERNAL_RSS_HOST: str = "https://itunes.apple.com"
     HTTP_EXTERNAL_RSS_TIMEOUT: float = 59.0
+    HTTP_EXTERNAL_RSS_BREAKER_THRESHOLD: int = 5
+    """Consecutive timeouts and server errors to open the circuit breaker."""
+    HTTP_EXTERNAL_RSS_BREAKER_RECOVERY: float = 30.0  # seconds
+    HTTP_EXTERNAL_RSS_ARCHIVE_ENABLED: bool = False
+    """Archive raw upstream pages for offline re-ingest, see `reingest` command."""
+    HTTP_EXTERNAL_RSS_ARCHIVE_PATH: Path = ROOT_DIR / "data" / "archive"
+    HTTP_EXTERNAL_RSS_REINGEST_PROCESSES: int | None = None
+    """Re-ingest worker processes, defaults to the number of CPUs."""
 
-    LOG_LEVEL: str = "DEBUG"
+    LOG_LEVEL: str = "INFO"
     LOG_LEVEL_CONFTEST: str = "DEBUG"
-    LOG_LEVEL_HTTPX: str = "DEBUG"
-    LOG_HANDLERS: list[str] = ["console", "file"]
+    LOG_LEVEL_HTTPX: str = "WARNING"
+    LOG_HANDLERS: list[str] = ["console", "file", "json"]
+    LOG_ASYNC: bool = True
+    """Emit records to handlers from a background thread through a queue."""
+    LOG_RATE_LIMIT: int = 20
+    """Max records per message template per period for hot-path logs."""
+    LOG_RATE_LIMIT_PERIOD: float = 1.0  # seconds
+    LOG_RATE_LIMIT_LEVEL: str = "DEBUG"
 
     LOG_DIR: Path = ROOT_DIR / "logs"
     LOG_FILE: str = "app_store_reviews_viewer.log"
@@ -83,8 +190,31 @@ class AppSettings(BaseModel):
                 "maxBytes": self.LOG_MAX_BYTE_WHEN_ROTATION,
                 "backupCount": self.LOG_BACKUP_COUNT,
             },
+            "json": {
+                "level": self.LOG_LEVEL,
+                "class": "logging.handlers.RotatingFileHandler",
+                "formatter": "json",
+                "filename": self.LOG_DIR / self.LOG_JSON_FILE,
+                "maxBytes": self.LOG_MAX_BYTE_WHEN_ROTATION,
+                "backupCount": self.LOG_BACKUP_COUNT,
+            },
+        }
+        handlers: dict[str, Any] = {
+            k: v for k, v in default_handlers.items() if k in self.LOG_HANDLERS
         }
-        handlers = {k: v for k, v in default_handlers.items() if k in self.LOG_HANDLERS}
+        logger_handlers = self.LOG_HANDLERS
+        if self.LOG_ASYNC and self.LOG_HANDLERS:
+            handlers["queue"] = {
+                "class": "logging.handlers.QueueHandler",
+                "handlers": self.LOG_HANDLERS,
+                "respect_handler_level": True,
+                "filters": ["rate_limit"],
+            }
+            logger_handlers = ["queue"]
+        else:
+            for handler in handlers.values():
+                handler["filters"] = ["rate_limit"]
+
         config = {
             "version": 1,
             "formatters": {
@@ -97,24 +227,35 @@ class AppSettings(BaseModel):
                     "fmt": "%(levelprefix)s %(message)s",
                     "use_colors": None,
                 },
+                "json": {
+                    "()": "app.common.log.JSONFormatter",
+                },
+            },
+            "filters": {
+                "rate_limit": {
+                    "()": "app.common.log.RateLimitFilter",
+                    "rate": self.LOG_RATE_LIMIT,
+                    "period": self.LOG_RATE_LIMIT_PERIOD,
+                    "level": self.LOG_RATE_LIMIT_LEVEL,
+                },
             },
             "handlers": handlers,
             "loggers": {
                 "app": {
                     "level": self.LOG_LEVEL,
-                    "handlers": self.LOG_HANDLERS,
+                    "handlers": logger_handlers,
                 },
                 "uvicorn": {
-                    "handlers": self.LOG_HANDLERS,
+                    "handlers": logger_handlers,
                     "level": self.LOG_LEVEL,
                 },
                 "conftest": {
                     "level": self.LOG_LEVEL_CONFTEST,
-                    "handlers": self.LOG_HANDLERS,
+                    "handlers": logger_handlers,
                 },
                 "httpx": {
                     "level": self.LOG_LEVEL_HTTPX,
-                    "handlers": self.LOG_HANDLERS,
+                    "handlers": logger_handlers,
                 },
             },
         }
@@ -1,39 +1,56 @@
+import re
 from http import HTTPMethod
 from typing import Literal
 
 import httpx
 
 from app.common.base_adapter import HTTPAdapterBase
-from app.common.base_schemas import AppID
+from app.common.base_schemas import DEFAULT_COUNTRY, AppID, Country
 from app.integration.itunes import schemas
 
+SortBy = Literal["mostRecent", "mostHelpful"]
+
+_PATH_PATTERN = re.compile(
+    r"/(?P<country>[a-z]{2})/rss/customerreviews/id=(?P<id>\d+)/"
+)
+
 
 class ItunesRSSAdapter(HTTPAdapterBase):
     """HTTP Adapter for the third party Itunes RSS server."""
 
-    _api_prefix = "/us/rss/customerreviews"
     MAX_PAGES = 10
+    SORT_ORDERS: tuple[SortBy, ...] = ("mostRecent", "mostHelpful")
 
     async def get_reviews(
         self,
         app_id: AppID,
         page: int | None = None,
-        sort_by: Literal["mostRecent"] | None = "mostRecent",
+        sort_by: SortBy | None = "mostRecent",
+        *,
+        country: str = DEFAULT_COUNTRY,
     ) -> schemas.ITunesReviewsResponse:
-        """Get reviews for a given app ID and page."""
-        path = self._build_path(app_id, page, sort_by)
+        """Get reviews for a given app ID and page from the given storefront country."""
+        path = self._build_path(app_id, page, sort_by, country)
         response = await self._call_service(
             HTTPMethod.GET, path, response_schema=schemas.ITunesReviewsResponse
         )
         return response
 
+    @staticmethod
+    def parse_url(url: str) -> tuple[AppID, Country] | None:
+        """App ID and storefront country of the reviews page url, if it is one."""
+        if match := _PATH_PATTERN.search(url):
+            return int(match["id"]), match["country"]
+        return None
+
     def _build_path(
         self,
         app_id: AppID,
         page: int | None,
-        sort_by: Literal["mostRecent"] | None,
+        sort_by: SortBy | None,
+        country: str,
     ) -> httpx.URL:
-        url = f"/id={app_id}"
+        url = f"/{country}/rss/customerreviews/id={app_id}"
         if sort_by:
             url += f"/sortBy={sort_by}"
         if page:
@@ -44,4 +61,4 @@ class ItunesRSSAdapter(HTTPAdapterBase):
             url += f"/page={page}"
 
         url += "/json"
-        return super()._use_url(url)
+        return httpx.URL(url)
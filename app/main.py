@@ -1,8 +1,12 @@
 import asyncio
+import functools
 import logging
 import logging.config
+import multiprocessing
 import os
 from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Callable, get_args
 
 import click
 import httpx
@@ -10,11 +14,28 @@ import uvicorn
 
 from app.api.app import FastAPIApplication
 from app.common import base_schemas as schemas
+from app.common.archive import FeedArchive
+from app.common.circuit_breaker import CircuitBreaker
+from app.common.log import start_queue_listener, stop_queue_listener
 from app.config import AppSettings
 from app.integration.itunes.adapter import ItunesRSSAdapter
+from app.services.autoscaler import WorkerPoolSupervisor
+from app.services.backfill import BackfillService
+from app.services.backoff import PollingBackoff
+from app.services.broker import TaskBroker
+from app.services.compaction import CompactionService
+from app.services.diagnostics import DiagnosticsService
 from app.services.polling import DataPollingWorker
+from app.services.pubsub import ReviewsHub
 from app.services.queue import DataPollingQueue
+from app.services.reingest import reingest as reingest_archive
+from app.services.remote import (
+    BrokerConsumer,
+    RemotePollingWorker,
+    ReportingCircuitBreaker,
+)
 from app.services.scheduller import SchedulerService
+from app.services.snapshot import SnapshotCompression
 from app.services.storage import StorageService
 
 logger = logging.getLogger("app.main")
@@ -31,61 +52,245 @@ async def lifespan(app: FastAPIApplication):
     """
 
     app.state.event_loop_tasks = []
+    app.state.worker_tasks = []
     app.state.workers = []
-    app.state.queue = DataPollingQueue()
+    app.state.queue = DataPollingQueue(
+        backfill_concurrency=app.state.settings.BACKFILL_MAX_CONCURRENCY,
+        jobs_history=app.state.settings.API_JOBS_HISTORY,
+    )
+    app.state.hub = ReviewsHub(buffer_size=app.state.settings.PUBSUB_BUFFER_SIZE)
+    app.state.backoff = PollingBackoff(
+        base_delay=app.state.settings.POLLING_BACKOFF_BASE_DELAY,
+        max_delay=app.state.settings.POLLING_BACKOFF_MAX_DELAY,
+        quarantine_after=app.state.settings.POLLING_QUARANTINE_AFTER,
+    )
 
     try:
+        if app.state.settings.DIAGNOSTICS_ENABLED:
+            setup_diagnostics(app)
+
         app.state.storage = await setup_storage(app)
+        await app.state.queue.load(app.state.settings.POLLING_QUEUE_SNAPSHOT_PATH)
+        app.state.backfill = await setup_backfill(app)
+        setup_compaction(app)
+        if app.state.settings.POLLING_BROKER_ENABLED:
+            app.state.broker = setup_broker(app.state.settings)
+            # API is the only producer, so tasks of the previous run are orphaned
+            await app.state.broker.clear()
 
         async with httpx.AsyncClient(
             base_url=app.state.settings.HTTP_EXTERNAL_RSS_HOST,
             timeout=app.state.settings.HTTP_EXTERNAL_RSS_TIMEOUT,
         ) as client:
-            app.state.external = ItunesRSSAdapter(client)
+            app.state.external = ItunesRSSAdapter(
+                client,
+                circuit_breaker=setup_circuit_breaker(app),
+                archive=setup_feed_archive(app.state.settings),
+            )
             setup_workers(app)
             if app.state.settings.SCHEDULER_ENABLED:
                 setup_scheduler(app)
 
-            yield
+            try:
+                yield
+            finally:
+                # NOTE: workers are drained while the HTTP client is still open
+                await shutdown_workers(app)
     finally:
-        for task in app.state.event_loop_tasks:
+        for task in [*app.state.event_loop_tasks, *app.state.worker_tasks]:
             task.cancel()
 
 
 async def setup_storage(app: FastAPIApplication) -> StorageService:
-    storage = StorageService(app.state.settings.STORAGE_PATH)
+    storage = setup_storage_service(app.state.settings)
     await storage.load()
-    for app_id in app.state.settings.STORAGE_INITIAL_APP_IDS:
-        await storage.create_app(schemas.App(id=app_id))
+    await storage.create_apps(
+        [
+            schemas.App(id=app_id)
+            for app_id in app.state.settings.STORAGE_INITIAL_APP_IDS
+        ]
+    )
     return storage
 
 
+def setup_storage_service(settings: AppSettings) -> StorageService:
+    return StorageService(
+        settings.STORAGE_PATH,
+        format=settings.STORAGE_FORMAT,
+        compression=settings.STORAGE_SNAPSHOT_COMPRESSION,
+        offload_size=settings.STORAGE_READ_OFFLOAD_SIZE,
+    )
+
+
+def setup_feed_archive(settings: AppSettings) -> FeedArchive | None:
+    if not settings.HTTP_EXTERNAL_RSS_ARCHIVE_ENABLED:
+        return None
+    return FeedArchive(settings.HTTP_EXTERNAL_RSS_ARCHIVE_PATH)
+
+
+async def setup_backfill(app: FastAPIApplication) -> BackfillService:
+    settings = app.state.settings
+    backfill = BackfillService(
+        settings.BACKFILL_CHECKPOINT_PATH,
+        retry_base_delay=settings.BACKFILL_RETRY_BASE_DELAY,
+        retry_max_delay=settings.BACKFILL_RETRY_MAX_DELAY,
+        max_attempts=settings.BACKFILL_MAX_ATTEMPTS,
+    )
+    await backfill.load()
+
+    # resume interrupted backfills from their checkpoints
+    for app_id in backfill.get_pending_apps():
+        app.state.queue.push_backfill(app_id)
+    return backfill
+
+
+def setup_compaction(app: FastAPIApplication) -> None:
+    settings = app.state.settings
+    app.state.compaction = CompactionService(
+        app.state.storage,
+        default=settings.STORAGE_RETENTION,
+        overrides=settings.STORAGE_RETENTION_APPS,
+        interval=settings.STORAGE_COMPACTION_INTERVAL,
+    )
+    if app.state.compaction.is_enabled:
+        app.state.event_loop_tasks.append(
+            asyncio.create_task(app.state.compaction.run())
+        )
+
+
+def setup_circuit_breaker(app: FastAPIApplication) -> CircuitBreaker:
+    return CircuitBreaker(
+        "itunes",
+        failure_threshold=app.state.settings.HTTP_EXTERNAL_RSS_BREAKER_THRESHOLD,
+        recovery_timeout=app.state.settings.HTTP_EXTERNAL_RSS_BREAKER_RECOVERY,
+    )
+
+
+def setup_diagnostics(app: FastAPIApplication) -> None:
+    settings = app.state.settings
+    app.state.diagnostics = DiagnosticsService(
+        interval=settings.DIAGNOSTICS_LOOP_LAG_INTERVAL,
+        slow_callback_threshold=settings.DIAGNOSTICS_SLOW_CALLBACK_THRESHOLD,
+        profile_interval=settings.DIAGNOSTICS_PROFILE_INTERVAL,
+    )
+    app.state.event_loop_tasks.append(asyncio.create_task(app.state.diagnostics.run()))
+
+
 def setup_scheduler(app: FastAPIApplication) -> None:
     scheduler = SchedulerService(
         app.state.queue,
         app.state.storage,
         app.state.workers,
+        backoff=app.state.backoff,
+        circuit_breaker=app.state.external.circuit_breaker,
+        slas=app.state.settings.POLLING_TIER_SLA,
+        shed_backlog=app.state.settings.POLLING_SHED_BACKLOG,
     )
+    app.state.scheduler = scheduler
     app.state.event_loop_tasks.append(asyncio.create_task(scheduler.run()))
 
 
+async def shutdown_workers(app: FastAPIApplication) -> None:
+    """
+    Drain polling workers gracefully.
+
+    No new tasks are given out to workers, in progress tasks are given some time
+    to complete, after that they are cancelled (already fetched reviews are stored).
+    Unfinished tasks are saved to be restored at the next startup.
+    """
+    settings = app.state.settings
+    for task in app.state.event_loop_tasks:
+        if task not in app.state.worker_tasks:
+            task.cancel()
+
+    queue = app.state.queue
+    queue.close()
+    if not await queue.wait_in_progress(settings.POLLING_SHUTDOWN_TIMEOUT):
+        logger.warning("Polling tasks are not drained in time, cancel them")
+
+    snapshot = queue.dump()
+    for task in app.state.worker_tasks:
+        task.cancel()
+    await asyncio.gather(*app.state.worker_tasks, return_exceptions=True)
+
+    await queue.save(settings.POLLING_QUEUE_SNAPSHOT_PATH, snapshot)
+    logger.info("Saved %s unfinished polling tasks", len(snapshot.tasks))
+    if settings.POLLING_BROKER_ENABLED:
+        app.state.broker.close()
+
+
+def setup_broker(settings: AppSettings) -> TaskBroker:
+    return TaskBroker(
+        settings.POLLING_BROKER_PATH,
+        visibility_timeout=settings.POLLING_BROKER_VISIBILITY_TIMEOUT,
+        max_attempts=settings.POLLING_BROKER_MAX_ATTEMPTS,
+    )
+
+
 def setup_workers(app: FastAPIApplication) -> None:
-    for idx in range(app.state.settings.POOLING_WORKERS_NUM):
-        worker = DataPollingWorker(
+    settings = app.state.settings
+    fetch_limit = asyncio.Semaphore(settings.POLLING_MAX_CONCURRENT_REQUESTS)
+
+    worker_class: Callable[..., DataPollingWorker] = DataPollingWorker
+    if settings.POLLING_BROKER_ENABLED:
+        worker_class = functools.partial(
+            RemotePollingWorker,
+            broker=app.state.broker,
+            poll_interval=settings.POLLING_BROKER_POLL_INTERVAL,
+        )
+
+    def factory(worker_id: str) -> DataPollingWorker:
+        return worker_class(
             app.state.storage,
             app.state.queue,
             app.state.external,
-            id=f"worker_{idx}",
-            polling_depth=app.state.settings.POLLING_REVIEWS_DEPTH,
+            app.state.hub,
+            id=worker_id,
+            polling_depth=settings.POLLING_REVIEWS_DEPTH,
+            backfill=app.state.backfill,
+            fetch_limit=fetch_limit,
+            backoff=app.state.backoff,
+        )
+
+    if not settings.POOLING_WORKERS_NUM:
+        return
+
+    if settings.POLLING_AUTOSCALE_ENABLED:
+        supervisor = WorkerPoolSupervisor(
+            app.state.queue,
+            factory,
+            min_workers=settings.POLLING_WORKERS_MIN,
+            max_workers=settings.POLLING_WORKERS_MAX,
+            initial_workers=settings.POOLING_WORKERS_NUM,
+            interval=settings.POLLING_AUTOSCALE_INTERVAL,
+            target_wait=settings.POLLING_AUTOSCALE_TARGET_WAIT,
+            max_error_ratio=settings.POLLING_AUTOSCALE_MAX_ERROR_RATIO,
+            circuit_breaker=app.state.external.circuit_breaker,
         )
-        app.state.event_loop_tasks.append(asyncio.create_task(worker.run()))
-        app.state.workers.append(worker)
+        app.state.event_loop_tasks.append(asyncio.create_task(supervisor.run()))
+    else:
+        size = settings.POOLING_WORKERS_NUM
+        supervisor = WorkerPoolSupervisor(
+            app.state.queue, factory, min_workers=size, max_workers=size
+        )
+
+    # NOTE: supervisor updates these lists in place, so the scheduler and shutdown
+    # see the current workers
+    supervisor.start()
+    app.state.supervisor = supervisor
+    app.state.workers = supervisor.workers
+    app.state.worker_tasks = supervisor.tasks
 
 
 def setup_logging(settings: AppSettings) -> None:
     if settings.LOG_DIR_CREATE and not settings.LOG_DIR.exists():
         settings.LOG_DIR.mkdir()
+
+    # NOTE: stop listener of the previous configuration to flush its records
+    stop_queue_listener()
     logging.config.dictConfig(settings.LOGGING)
+    if settings.LOG_ASYNC:
+        start_queue_listener("queue")
 
 
 def setup(settings: AppSettings | None = None) -> FastAPIApplication:
@@ -96,7 +301,56 @@ def setup(settings: AppSettings | None = None) -> FastAPIApplication:
     return FastAPIApplication.startup(settings, lifespan)
 
 
-def main() -> None:
+async def run_broker_consumers(settings: AppSettings, process_idx: int) -> None:
+    broker = setup_broker(settings)
+    fetch_limit = asyncio.Semaphore(settings.POLLING_MAX_CONCURRENT_REQUESTS)
+    async with httpx.AsyncClient(
+        base_url=settings.HTTP_EXTERNAL_RSS_HOST,
+        timeout=settings.HTTP_EXTERNAL_RSS_TIMEOUT,
+    ) as client:
+        adapter = ItunesRSSAdapter(
+            client,
+            circuit_breaker=ReportingCircuitBreaker(
+                "itunes",
+                failure_threshold=settings.HTTP_EXTERNAL_RSS_BREAKER_THRESHOLD,
+                recovery_timeout=settings.HTTP_EXTERNAL_RSS_BREAKER_RECOVERY,
+            ),
+            archive=setup_feed_archive(settings),
+        )
+        consumers = [
+            BrokerConsumer(
+                broker,
+                adapter,
+                id=f"consumer_{process_idx}_{idx}",
+                polling_depth=settings.POLLING_REVIEWS_DEPTH,
+                poll_interval=settings.POLLING_BROKER_POLL_INTERVAL,
+                heartbeat_interval=settings.POLLING_BROKER_VISIBILITY_TIMEOUT / 3,
+                fetch_limit=fetch_limit,
+            )
+            for idx in range(settings.POLLING_BROKER_CONCURRENCY)
+        ]
+        try:
+            await asyncio.gather(*[consumer.run() for consumer in consumers])
+        finally:
+            broker.close()
+
+
+def run_worker_process(settings: AppSettings, process_idx: int) -> None:
+    setup_logging(settings)
+    logger.info("Run polling worker [%s]", click.style(os.getpid(), fg="cyan"))
+    try:
+        asyncio.run(run_broker_consumers(settings, process_idx))
+    except KeyboardInterrupt:
+        pass
+
+
+@click.group(invoke_without_command=True)
+@click.pass_context
+def main(ctx: click.Context) -> None:
+    """Run API server. Polling workers are run with `worker` command."""
+    if ctx.invoked_subcommand:
+        return
+
     settings = AppSettings()
 
     # NOTE: setup logging for main process;
@@ -121,5 +375,104 @@ def main() -> None:
     )
 
 
+@main.command()
+@click.option("--processes", type=int, default=None, help="Worker processes.")
+def worker(processes: int | None) -> None:
+    """
+    Run out-of-process polling workers. They consume polling tasks of the API
+    (with POLLING_BROKER_ENABLED) from the broker and send polled reviews back.
+    """
+    settings = AppSettings()
+    setup_logging(settings)
+    processes = processes or settings.POLLING_BROKER_PROCESSES
+    logger.info("Run %s polling worker processes", processes)
+
+    context = multiprocessing.get_context("spawn")
+    pool = [
+        context.Process(target=run_worker_process, args=(settings, idx))
+        for idx in range(processes)
+    ]
+    for process in pool:
+        process.start()
+    try:
+        for process in pool:
+            process.join()
+    except KeyboardInterrupt:
+        for process in pool:
+            process.join()
+
+
+@main.command()
+@click.argument("path", type=click.Path(dir_okay=False, path_type=Path))
+@click.option(
+    "--compression",
+    type=click.Choice(get_args(SnapshotCompression)),
+    default=None,
+    help="Defaults to STORAGE_SNAPSHOT_COMPRESSION.",
+)
+def export(path: Path, compression: SnapshotCompression | None) -> None:
+    """Export storage to the binary snapshot file for backup."""
+    settings = AppSettings()
+    setup_logging(settings)
+
+    async def run() -> None:
+        storage = setup_storage_service(settings)
+        await storage.load()
+        size = await storage.export_snapshot(
+            path, compression=compression or settings.STORAGE_SNAPSHOT_COMPRESSION
+        )
+        logger.info("Exported storage to %s (%s bytes)", path, size)
+
+    asyncio.run(run())
+
+
+@main.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+def import_(path: Path) -> None:
+    """
+    Restore storage from the snapshot (or JSON storage) file. Current storage is
+    replaced. The API should be stopped, otherwise the storage is overwritten by it.
+    """
+    settings = AppSettings()
+    setup_logging(settings)
+
+    async def run() -> None:
+        storage = setup_storage_service(settings)
+        await storage.load(path)
+        await storage.write()
+        logger.info("Imported storage from %s to %s", path, settings.STORAGE_PATH)
+
+    asyncio.run(run())
+
+
+@main.command()
+@click.option(
+    "--processes",
+    type=int,
+    default=None,
+    help="Defaults to HTTP_EXTERNAL_RSS_REINGEST_PROCESSES.",
+)
+def reingest(processes: int | None) -> None:
+    """
+    Rebuild reviews from the archived upstream pages (HTTP_EXTERNAL_RSS_ARCHIVE_PATH)
+    into the storage, e.g. after a parsing fix. The API should be stopped, otherwise
+    the storage is overwritten by it.
+    """
+    settings = AppSettings()
+    setup_logging(settings)
+
+    async def run() -> None:
+        storage = setup_storage_service(settings)
+        await storage.load()
+        report = await reingest_archive(
+            storage,
+            FeedArchive(settings.HTTP_EXTERNAL_RSS_ARCHIVE_PATH),
+            processes=processes or settings.HTTP_EXTERNAL_RSS_REINGEST_PROCESSES,
+        )
+        logger.info("Re-ingested %s", report)
+
+    asyncio.run(run())
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,241 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable
+
+import numpy as np
+
+from app.common import base_schemas as schemas
+from app.common.base_schemas import AppID, ReviewId, TimeBucket
+
+logger = logging.getLogger(__name__)
+
+_BUCKET_SECONDS: dict[TimeBucket, int] = {
+    "day": 24 * 60 * 60,
+    "week": 7 * 24 * 60 * 60,
+}
+# Unix epoch starts on Thursday, shift week buckets to start on Monday
+_BUCKET_OFFSET: dict[TimeBucket, int] = {
+    "day": 0,
+    "week": 3 * 24 * 60 * 60,
+}
+
+
+_NO_EPOCHS = np.empty(0, dtype=np.int64)
+_NO_SCORES = np.empty(0, dtype=np.int8)
+
+
+@dataclass(frozen=True)
+class TimeSeriesColumns:
+    """Reviews columns of many apps, concatenated."""
+
+    app_ids: list[AppID]
+    owners: np.ndarray
+    """Index of the review App in `app_ids`."""
+    epochs: np.ndarray
+    scores: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.epochs)
+
+
+class ReviewColumns:
+    """Column oriented (updated epoch, score) arrays of a single App reviews."""
+
+    INITIAL_CAPACITY = 64
+
+    def __init__(self) -> None:
+        self._positions: dict[ReviewId, int] = {}
+        self._ids: list[ReviewId] = []
+        self._epochs = np.empty(self.INITIAL_CAPACITY, dtype=np.int64)
+        self._scores = np.empty(self.INITIAL_CAPACITY, dtype=np.int8)
+        self._size = 0
+
+    @property
+    def epochs(self) -> np.ndarray:
+        return self._epochs[: self._size]
+
+    @property
+    def scores(self) -> np.ndarray:
+        return self._scores[: self._size]
+
+    def upsert(self, review: schemas.Review) -> None:
+        position = self._positions.get(review.id)
+        if position is None:
+            if self._size == len(self._epochs):
+                self._grow()
+            position = self._positions[review.id] = self._size
+            self._ids.append(review.id)
+            self._size += 1
+
+        self._epochs[position] = int(review.updated.timestamp())
+        self._scores[position] = review.score
+
+    def extend(
+        self, review_ids: list[ReviewId], epochs: np.ndarray, scores: np.ndarray
+    ) -> None:
+        """Append many new reviews at once (unknown reviews only)."""
+        start, end = self._size, self._size + len(review_ids)
+        while end > len(self._epochs):
+            self._grow()
+        self._positions.update(zip(review_ids, range(start, end)))
+        self._ids.extend(review_ids)
+        self._epochs[start:end] = epochs
+        self._scores[start:end] = scores
+        self._size = end
+
+    def discard(self, review_id: ReviewId) -> None:
+        """Remove review by moving the last row to its place."""
+        position = self._positions.pop(review_id, None)
+        if position is None:
+            return
+
+        self._size -= 1
+        last_id = self._ids.pop()
+        if position != self._size:
+            self._ids[position] = last_id
+            self._positions[last_id] = position
+            self._epochs[position] = self._epochs[self._size]
+            self._scores[position] = self._scores[self._size]
+
+    def _grow(self) -> None:
+        capacity = len(self._epochs) * 2
+        self._epochs = np.resize(self._epochs, capacity)
+        self._scores = np.resize(self._scores, capacity)
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class ReviewsTimeSeries:
+    """
+    Time bucketed analytics over reviews history.
+
+    Keeps per-app NumPy columns next to the StorageService, so aggregates for
+    many apps are computed in a single vectorized pass instead of Python loops over
+    Review models.
+    """
+
+    def __init__(self) -> None:
+        self._columns: dict[AppID, ReviewColumns] = {}
+
+    def upsert(self, reviews: Iterable[schemas.Review]) -> None:
+        for review in reviews:
+            if not (columns := self._columns.get(review.app_id)):
+                columns = self._columns[review.app_id] = ReviewColumns()
+            columns.upsert(review)
+
+    def extend(
+        self,
+        app_id: AppID,
+        review_ids: list[ReviewId],
+        epochs: np.ndarray,
+        scores: np.ndarray,
+    ) -> None:
+        """Add many new reviews of the App from the columns at once."""
+        if not (columns := self._columns.get(app_id)):
+            columns = self._columns[app_id] = ReviewColumns()
+        columns.extend(review_ids, epochs, scores)
+
+    def discard(self, reviews: Iterable[schemas.Review]) -> None:
+        for review in reviews:
+            if columns := self._columns.get(review.app_id):
+                columns.discard(review.id)
+
+    def clear(self) -> None:
+        self._columns.clear()
+
+    def collect(self, app_ids: list[AppID]) -> TimeSeriesColumns:
+        """Copy reviews columns of the given apps, so they are computed on safely."""
+        columns = [self._columns.get(app_id) for app_id in app_ids]
+        sizes = np.array([len(c) if c else 0 for c in columns], dtype=np.int64)
+        return TimeSeriesColumns(
+            app_ids=app_ids,
+            owners=np.repeat(np.arange(len(app_ids)), sizes),
+            epochs=np.concatenate([c.epochs for c in columns if c] or [_NO_EPOCHS]),
+            scores=np.concatenate([c.scores for c in columns if c] or [_NO_SCORES]),
+        )
+
+    def compute(
+        self,
+        app_ids: list[AppID],
+        *,
+        bucket: TimeBucket = "day",
+        window: int = 7,
+    ) -> list[schemas.AppTimeSeries]:
+        return compute_timeseries(self.collect(app_ids), bucket=bucket, window=window)
+
+
+def compute_timeseries(
+    columns: TimeSeriesColumns,
+    *,
+    bucket: TimeBucket = "day",
+    window: int = 7,
+) -> list[schemas.AppTimeSeries]:
+    """
+    Compute per bucket review count, mean score, rolling mean score over the
+    last `window` buckets and trend delta (rolling mean change compared to the
+    previous window) for all given apps at once.
+
+    Only (app, bucket) cells with reviews are materialized, so memory is bounded by
+    the number of reviews regardless of the number of apps and the time span.
+    Rolling sums are differences of cumulative sums found by binary search.
+    """
+    step = _BUCKET_SECONDS[bucket]
+    offset = _BUCKET_OFFSET[bucket]
+    app_ids = columns.app_ids
+    if not len(columns):
+        return [schemas.AppTimeSeries(app_id=app_id, points=[]) for app_id in app_ids]
+
+    buckets = (columns.epochs + offset) // step
+    first_bucket = int(buckets.min())
+    span = int(buckets.max()) - first_bucket + 1
+
+    # sorted unique (app, bucket) cells, cells of an app are contiguous
+    cells, inverse = np.unique(
+        columns.owners * span + (buckets - first_bucket), return_inverse=True
+    )
+    counts = np.bincount(inverse)
+    sums = np.bincount(inverse, weights=columns.scores.astype(np.float64))
+    cumulative_counts = np.concatenate(([0], np.cumsum(counts)))
+    cumulative_sums = np.concatenate(([0.0], np.cumsum(sums)))
+    owners = cells // span
+    positions = cells % span
+    bases = owners * span
+
+    def rolling(ends: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Count and sum of the `window` buckets up to the given cells of each app."""
+        hi = np.searchsorted(cells, ends, side="right")
+        lo = np.searchsorted(cells, np.maximum(ends - window, bases - 1), side="right")
+        return (
+            cumulative_counts[hi] - cumulative_counts[lo],
+            cumulative_sums[hi] - cumulative_sums[lo],
+        )
+
+    rolling_counts, rolling_sums = rolling(cells)
+    previous_counts, previous_sums = rolling(np.maximum(cells - window, bases))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = sums / counts
+        rolling_means = rolling_sums / rolling_counts
+        deltas = rolling_means - previous_sums / previous_counts
+    deltas[positions < window] = np.nan
+
+    bounds = np.searchsorted(owners, np.arange(len(app_ids) + 1))
+    result: list[schemas.AppTimeSeries] = []
+    for idx, app_id in enumerate(app_ids):
+        points = []
+        for cell in range(bounds[idx], bounds[idx + 1]):
+            start = (first_bucket + int(positions[cell])) * step - offset
+            delta = deltas[cell]
+            points.append(
+                schemas.TimeSeriesPoint(
+                    start=datetime.fromtimestamp(start, tz=timezone.utc),
+                    count=int(counts[cell]),
+                    mean_score=float(means[cell]),
+                    rolling_mean_score=float(rolling_means[cell]),
+                    trend_delta=None if np.isnan(delta) else float(delta),
+                )
+            )
+        result.append(schemas.AppTimeSeries(app_id=app_id, points=points))
+
+    return result
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import math
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable
+
+from app.common import base_schemas as schemas
+from app.common.base_schemas import ScaleReason
+from app.common.circuit_breaker import CircuitBreaker
+from app.common.metrics import REGISTRY
+from app.services.polling import DataPollingWorker
+from app.services.queue import DataPollingQueue
+
+logger = logging.getLogger(__name__)
+
+POOL_TARGET = REGISTRY.gauge(
+    "polling_workers_target", "Number of polling workers set by the supervisor."
+)
+POOL_SCALE_EVENTS = REGISTRY.counter(
+    "polling_workers_scale_events_total",
+    "Worker pool scale events.",
+    ("direction", "reason"),
+)
+
+
+class WorkerPoolSupervisor:
+    """
+    Grow and shrink the polling worker pool between `min_workers` and `max_workers`.
+
+    Every `interval` seconds the load is evaluated:
+    - the oldest queued task waits longer than `target_wait`: the pool grows to
+      drain the backlog within `target_wait` at the recent mean task time;
+    - upstream fails (circuit breaker is not closed or `max_error_ratio` of tasks
+      failed): the pool shrinks, more concurrency does not help the upstream;
+    - some workers are idle and nothing is queued for `idle_evaluations` in a row:
+      the pool shrinks by one worker.
+
+    Only idle workers (waiting for a task) are stopped, so no task is interrupted.
+    """
+
+    def __init__(
+        self,
+        queue: DataPollingQueue,
+        factory: Callable[[str], DataPollingWorker],
+        *,
+        min_workers: int,
+        max_workers: int,
+        initial_workers: int | None = None,
+        interval: float = 5.0,  # seconds
+        target_wait: float = 10.0,  # seconds
+        max_error_ratio: float = 0.5,
+        idle_evaluations: int = 3,
+        circuit_breaker: CircuitBreaker | None = None,
+        events_history: int = 100,
+    ) -> None:
+        self._queue = queue
+        self._factory = factory
+        self._min_workers = min_workers
+        self._max_workers = max(max_workers, min_workers)
+        self._initial_workers = initial_workers or min_workers
+        self._interval = interval
+        self._target_wait = target_wait
+        self._max_error_ratio = max_error_ratio
+        self._idle_evaluations = idle_evaluations
+        self._circuit_breaker = circuit_breaker
+
+        self.workers: list[DataPollingWorker] = []
+        """Running workers, the list is updated in place."""
+        self.tasks: list[asyncio.Task] = []
+        """Tasks of the running workers, the list is updated in place."""
+        self.events: deque[schemas.ScaleEvent] = deque(maxlen=events_history)
+
+        self._worker_seq = 0
+        self._idle_streak = 0
+        self._last_totals = (0, 0, 0.0)
+
+    @property
+    def size(self) -> int:
+        return len(self.workers)
+
+    def start(self) -> None:
+        """Start the initial workers."""
+        self._resize(self._clamp(self._initial_workers))
+        self._last_totals = self._totals()
+
+    async def run(self) -> None:
+        """Run the supervisor in the background."""
+        logger.info("Start worker pool supervisor in the background: %s", self)
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                self.evaluate()
+            except Exception as e:
+                logger.exception("%s. Evaluation failed: %r", self, e)
+
+    def evaluate(self) -> schemas.ScaleEvent | None:
+        """Evaluate the load signals and resize the pool. Return the scale event."""
+        completed, failed, busy_seconds = self._totals()
+        last_completed, last_failed, last_busy_seconds = self._last_totals
+        self._last_totals = (completed, failed, busy_seconds)
+        done = completed - last_completed
+        error_ratio = (failed - last_failed) / done if done else 0.0
+        # the mean task time of the interval, the interval itself if nothing is done
+        task_seconds = (busy_seconds - last_busy_seconds) / done if done else None
+
+        backlog = self._queue.backlog
+        wait = self._queue.oldest_wait
+        upstream_failing = error_ratio >= self._max_error_ratio or (
+            self._circuit_breaker is not None
+            and self._circuit_breaker.state != "closed"
+        )
+        idle = [worker for worker in self.workers if worker.is_idle]
+        self._idle_streak = self._idle_streak + 1 if idle and not backlog else 0
+
+        size = self.size
+        target = size
+        reason: ScaleReason | None = None
+        if upstream_failing:
+            target, reason = math.ceil(size / 2), "upstream_errors"
+        elif backlog and wait > self._target_wait:
+            drain = backlog * (task_seconds or self._interval) / self._target_wait
+            target = max(size + 1, self._queue.in_progress + math.ceil(drain))
+            reason = "backlog"
+        elif self._idle_streak >= self._idle_evaluations:
+            target, reason = size - 1, "idle"
+            self._idle_streak = 0
+
+        target = self._clamp(target)
+        if reason is None or target == size:
+            return None
+
+        self._resize(target)
+        if self.size == size:
+            return None  # no idle workers to stop
+
+        event = schemas.ScaleEvent(
+            at=datetime.now(timezone.utc),
+            workers_before=size,
+            workers_after=self.size,
+            reason=reason,
+            backlog=backlog,
+            wait=wait,
+            error_ratio=error_ratio,
+        )
+        self.events.append(event)
+        direction = "up" if event.workers_after > size else "down"
+        POOL_SCALE_EVENTS.labels(direction, reason).inc()
+        logger.info("%s. Scaled %s: %s", self, direction, event)
+        return event
+
+    def status(self) -> schemas.WorkerPoolStatus:
+        return schemas.WorkerPoolStatus(
+            workers=self.size,
+            busy=sum(not worker.is_idle for worker in self.workers),
+            min_workers=self._min_workers,
+            max_workers=self._max_workers,
+            events=list(self.events),
+        )
+
+    def _resize(self, target: int) -> None:
+        while self.size < target:
+            worker = self._factory(f"worker_{self._worker_seq}")
+            self._worker_seq += 1
+            self.workers.append(worker)
+            self.tasks.append(asyncio.create_task(worker.run()))
+
+        # stop idle workers only, the most recently started first
+        for idx in reversed(range(self.size)):
+            if self.size <= target:
+                break
+            if self.workers[idx].is_idle:
+                del self.workers[idx]
+                self.tasks.pop(idx).cancel()
+
+        POOL_TARGET.set(target)
+
+    def _clamp(self, size: int) -> int:
+        return min(max(size, self._min_workers), self._max_workers)
+
+    def _totals(self) -> tuple[int, int, float]:
+        queue = self._queue
+        return queue.completed_total, queue.failed_total, queue.busy_seconds_total
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}"
+            f"({self.size}/{self._min_workers}..{self._max_workers})"
+        )
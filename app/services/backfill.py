@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import NamedTuple
+
+from pydantic import BaseModel
+
+from app.common import base_schemas as schemas
+from app.common.base_schemas import AppID
+from app.integration.itunes.adapter import ItunesRSSAdapter, SortBy
+
+logger = logging.getLogger(__name__)
+
+
+class BackfillCursor(NamedTuple):
+    """Next page to fetch of the feed slice."""
+
+    country: str
+    sort_by: SortBy
+    page: int
+
+    @property
+    def slice(self) -> str:
+        return f"{self.country}:{self.sort_by}"
+
+
+class Checkpoints(BaseModel):
+    apps: dict[AppID, dict[str, int]] = {}
+    """Next page to fetch per feed slice (`country:sortBy`). Zero if the slice is done."""
+
+
+class BackfillService:
+    """
+    Historical reviews backfill progress.
+
+    The upstream feed serves at most `MAX_PAGES` pages of a single ordering, so deep
+    history is collected by walking every supported ordering in every storefront
+    country. Each (country, ordering) pair is a slice. Reviews of all slices are merged
+    by the storage, which dedupes them by review ID.
+
+    Progress is checkpointed page by page to the file, so an interrupted backfill is
+    resumed from the last fetched page. A failed slice is retried with exponentially
+    growing delay, after `max_attempts` failures in a row the backfill is failed
+    until it's started again (or the service is restarted).
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        sort_orders: tuple[SortBy, ...] = ItunesRSSAdapter.SORT_ORDERS,
+        retry_base_delay: float = 60.0,  # seconds
+        retry_max_delay: float = 3600.0,  # seconds
+        max_attempts: int = 5,
+    ) -> None:
+        self._path = path
+        self._checkpoints = Checkpoints()
+        self._sort_orders = sort_orders
+        self._retry_base_delay = retry_base_delay
+        self._retry_max_delay = retry_max_delay
+        self._max_attempts = max_attempts
+        self._failures: dict[AppID, int] = {}
+        self._errors: dict[AppID, str] = {}
+
+    async def start(
+        self, app_id: AppID, countries: list[str]
+    ) -> schemas.BackfillStatus:
+        """
+        Start backfill of the given App storefront countries.
+        Completed backfill is started over, failed one is resumed.
+        """
+        pages = self._checkpoints.apps.get(app_id, {})
+        if not any(pages.values()):
+            pages = {}
+        for country in countries:
+            for sort_by in self._sort_orders:
+                cursor = BackfillCursor(country, sort_by, 1)
+                pages.setdefault(cursor.slice, cursor.page)
+
+        self._checkpoints.apps[app_id] = pages
+        self._failures.pop(app_id, None)
+        self._errors.pop(app_id, None)
+        await self.write()
+        return self.get_status(app_id)  # type: ignore[return-value]
+
+    def get_status(self, app_id: AppID) -> schemas.BackfillStatus | None:
+        if (pages := self._checkpoints.apps.get(app_id)) is None:
+            return None
+        return schemas.BackfillStatus(
+            app_id=app_id,
+            pending=[key for key, page in pages.items() if page],
+            completed=[key for key, page in pages.items() if not page],
+            error=self._errors.get(app_id),
+        )
+
+    def record_failure(
+        self, app_id: AppID, error: str, *, count: bool = True
+    ) -> float | None:
+        """
+        Record failed backfill slice of the App. Return delay to retry it after, or
+        None if the backfill is failed. Failures not caused by the App itself (e.g.
+        upstream is unavailable) are not counted.
+        """
+        failures = self._failures.get(app_id, 0) + count
+        self._failures[app_id] = failures
+        if failures >= self._max_attempts:
+            logger.warning(
+                "App %s backfill is failed after %s attempts: %s",
+                app_id,
+                failures,
+                error,
+            )
+            self._errors[app_id] = error
+            return None
+
+        delay = min(
+            self._retry_base_delay * 2 ** max(failures - 1, 0), self._retry_max_delay
+        )
+        logger.info("App %s backfill is retried in %.0fs: %s", app_id, delay, error)
+        return delay
+
+    def record_success(self, app_id: AppID) -> None:
+        self._failures.pop(app_id, None)
+
+    def get_pending_apps(self) -> list[AppID]:
+        """Apps with slices to fetch yet, but not failed ones."""
+        return [
+            app_id
+            for app_id, pages in self._checkpoints.apps.items()
+            if any(pages.values()) and app_id not in self._errors
+        ]
+
+    def get_cursor(self, app_id: AppID) -> BackfillCursor | None:
+        """Get next page to fetch for the given App. None if backfill is done."""
+        for key, page in self._checkpoints.apps.get(app_id, {}).items():
+            if page:
+                country, sort_by = key.split(":")
+                return BackfillCursor(country, sort_by, page)  # type: ignore[arg-type]
+        return None
+
+    async def advance(self, cursor: BackfillCursor, app_id: AppID, *, done: bool):
+        """Checkpoint the fetched page of the slice."""
+        next_page = 0 if done else cursor.page + 1
+        self._checkpoints.apps[app_id][cursor.slice] = next_page
+        await self.write()
+
+    async def load(self) -> None:
+        if not self._path.exists():
+            return
+
+        content = self._path.read_text()
+        if content == "":
+            return
+
+        self._checkpoints = Checkpoints.model_validate_json(content)
+
+    async def write(self) -> None:
+        await asyncio.to_thread(
+            self._path.write_text, self._checkpoints.model_dump_json()
+        )
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._path})"
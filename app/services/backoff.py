@@ -0,0 +1,83 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from app.common.base_schemas import AppID
+from app.common.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+APPS_QUARANTINED = REGISTRY.gauge(
+    "polling_apps_quarantined", "Number of apps excluded from scheduled polling."
+)
+
+
+@dataclass
+class AppFailures:
+    failures: int
+    """Number of consecutive failed polls."""
+    retry_at: float
+    """Monotonic time the app is polled again at."""
+    quarantined: bool = False
+
+
+class PollingBackoff:
+    """
+    Per-app failures tracking for scheduled polling.
+
+    After every consecutive failed poll the app is skipped by the scheduler for
+    exponentially growing delay. After `quarantine_after` failures in a row (invalid
+    app id, app removed from the store, etc.) the app is quarantined: it is not
+    scheduled anymore until it's polled successfully on user request.
+    """
+
+    def __init__(
+        self,
+        *,
+        base_delay: float = 60.0,  # seconds
+        max_delay: float = 3600.0,  # seconds
+        quarantine_after: int = 10,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._quarantine_after = quarantine_after
+        self._clock = clock
+        self._apps: dict[AppID, AppFailures] = {}
+
+    def record_failure(self, app_id: AppID) -> AppFailures:
+        failures = self._apps[app_id].failures + 1 if app_id in self._apps else 1
+        delay = min(self._base_delay * 2 ** (failures - 1), self._max_delay)
+        state = self._apps[app_id] = AppFailures(
+            failures=failures,
+            retry_at=self._clock() + delay,
+            quarantined=failures >= self._quarantine_after,
+        )
+
+        if state.quarantined:
+            logger.warning("App %s is quarantined after %s failures", app_id, failures)
+        else:
+            logger.info("App %s polling is delayed for %.0fs", app_id, delay)
+        APPS_QUARANTINED.set(len(self.get_quarantined()))
+        return state
+
+    def record_success(self, app_id: AppID) -> None:
+        if self._apps.pop(app_id, None):
+            logger.info("App %s polling is recovered", app_id)
+            APPS_QUARANTINED.set(len(self.get_quarantined()))
+
+    def is_due(self, app_id: AppID) -> bool:
+        """Whether the app should be polled by schedule."""
+        if not (state := self._apps.get(app_id)):
+            return True
+        return not state.quarantined and self._clock() >= state.retry_at
+
+    def get_failures(self, app_id: AppID) -> AppFailures | None:
+        return self._apps.get(app_id)
+
+    def get_quarantined(self) -> list[AppID]:
+        return [app_id for app_id, state in self._apps.items() if state.quarantined]
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}()"
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, TypeVar
+
+from app.common import base_schemas as schemas
+from app.common.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+BROKER_LEASED = REGISTRY.counter(
+    "broker_tasks_leased_total", "Number of leased broker tasks.", ("attempt",)
+)
+BROKER_EXPIRED = REGISTRY.counter(
+    "broker_tasks_expired_total", "Number of broker tasks failed by lease expiration."
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    app TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_token TEXT,
+    lease_until REAL,
+    result BLOB,
+    error TEXT,
+    report TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, created_at);
+"""
+
+
+@dataclass(frozen=True)
+class LeasedTask:
+    id: str
+    app: schemas.App
+    token: str
+    attempt: int
+
+
+@dataclass(frozen=True)
+class TaskResult:
+    id: str
+    result: bytes | None
+    error: str | None
+    report: str | None = None
+    """Details of the processing (JSON) to be handled by the producer."""
+
+
+class TaskBroker:
+    """
+    SQLite based polling tasks broker shared among API and worker processes.
+
+    A task is leased by a single worker for `visibility_timeout` seconds. The worker
+    extends the lease while processing and acknowledges the task with its result.
+    If the worker dies, the lease expires and the task becomes visible to other
+    workers again, up to `max_attempts` times. Results are read back by the
+    producer and the task is deleted.
+
+    SQLite calls are blocking, so they are run in a thread.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        visibility_timeout: float = 60.0,  # seconds
+        max_attempts: int = 3,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._path = path
+        self._visibility_timeout = visibility_timeout
+        self._max_attempts = max_attempts
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._connection:
+            self._connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+        return self._connection
+
+    @property
+    def result_timeout(self) -> float:
+        """
+        Time the task is given to complete: every attempt lease may expire. After
+        that no worker process is alive (or consumes the broker) to complete it.
+        """
+        return self._visibility_timeout * self._max_attempts
+
+    async def _run(self, func: Callable[[sqlite3.Connection], _T]) -> _T:
+        def run() -> _T:
+            with self._lock:
+                return func(self._connect())
+
+        return await asyncio.to_thread(run)
+
+    async def push(self, app: schemas.App) -> str:
+        """Add task to poll reviews of the given App. Return task id."""
+        task_id = f"task_{app.id}_{uuid.uuid4().hex}"
+
+        def push(db: sqlite3.Connection) -> None:
+            db.execute(
+                "INSERT INTO tasks (id, app, status, created_at) "
+                "VALUES (?, ?, 'pending', ?)",
+                (task_id, app.model_dump_json(), self._clock()),
+            )
+
+        await self._run(push)
+        return task_id
+
+    async def lease(self) -> LeasedTask | None:
+        """Lease the oldest visible task. None if there are no tasks."""
+
+        def lease(db: sqlite3.Connection) -> LeasedTask | None:
+            now = self._clock()
+            with db:  # BEGIN ... COMMIT / ROLLBACK
+                db.execute("BEGIN IMMEDIATE")
+                while row := db.execute(
+                    "SELECT id, app, attempts FROM tasks "
+                    "WHERE status = 'pending' "
+                    "OR (status = 'leased' AND lease_until < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now,),
+                ).fetchone():
+                    task_id, app, attempts = row
+                    if attempts >= self._max_attempts:
+                        BROKER_EXPIRED.inc()
+                        db.execute(
+                            "UPDATE tasks SET status = 'failed', error = ? "
+                            "WHERE id = ?",
+                            (f"Lease expired {attempts} times", task_id),
+                        )
+                        continue
+
+                    token = uuid.uuid4().hex
+                    db.execute(
+                        "UPDATE tasks SET status = 'leased', lease_token = ?, "
+                        "lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                        (token, now + self._visibility_timeout, task_id),
+                    )
+                    BROKER_LEASED.labels("retry" if attempts else "first").inc()
+                    return LeasedTask(
+                        id=task_id,
+                        app=schemas.App.model_validate_json(app),
+                        token=token,
+                        attempt=attempts + 1,
+                    )
+                return None
+
+        return await self._run(lease)
+
+    async def extend(self, task: LeasedTask) -> bool:
+        """Extend the task lease. False if the lease is lost."""
+
+        def extend(db: sqlite3.Connection) -> bool:
+            cursor = db.execute(
+                "UPDATE tasks SET lease_until = ? "
+                "WHERE id = ? AND lease_token = ? AND status = 'leased'",
+                (self._clock() + self._visibility_timeout, task.id, task.token),
+            )
+            return cursor.rowcount == 1
+
+        return await self._run(extend)
+
+    async def ack(
+        self,
+        task: LeasedTask,
+        result: bytes | None,
+        error: str | None = None,
+        *,
+        report: str | None = None,
+    ) -> bool:
+        """
+        Complete the leased task with its result or error.
+        False if the lease is lost, so the result is discarded.
+        """
+
+        def ack(db: sqlite3.Connection) -> bool:
+            cursor = db.execute(
+                "UPDATE tasks SET status = ?, result = ?, error = ?, report = ?, "
+                "lease_token = NULL, lease_until = NULL "
+                "WHERE id = ? AND lease_token = ? AND status = 'leased'",
+                (
+                    "failed" if error else "done",
+                    result,
+                    error,
+                    report,
+                    task.id,
+                    task.token,
+                ),
+            )
+            return cursor.rowcount == 1
+
+        acked = await self._run(ack)
+        if not acked:
+            logger.warning("Lease is lost, result is discarded: %s", task.id)
+        return acked
+
+    async def get_result(self, task_id: str) -> TaskResult | None:
+        """Result of the completed task. None if the task is not completed yet."""
+
+        def get_result(db: sqlite3.Connection) -> TaskResult | None:
+            row = db.execute(
+                "SELECT result, error, report FROM tasks "
+                "WHERE id = ? AND status IN ('done', 'failed')",
+                (task_id,),
+            ).fetchone()
+            return TaskResult(task_id, *row) if row else None
+
+        return await self._run(get_result)
+
+    async def delete(self, task_id: str) -> None:
+        def delete(db: sqlite3.Connection) -> None:
+            db.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+        await self._run(delete)
+
+    async def clear(self) -> None:
+        def clear(db: sqlite3.Connection) -> None:
+            db.execute("DELETE FROM tasks")
+
+        await self._run(clear)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection:
+                self._connection.close()
+                self._connection = None
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._path})"
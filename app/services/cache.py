@@ -0,0 +1,53 @@
+import logging
+from collections import OrderedDict
+from typing import NamedTuple
+
+from app.common.base_schemas import AppID
+from app.common.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE = REGISTRY.counter(
+    "response_cache_requests_total", "Response cache lookups.", ("result",)
+)
+
+
+class CachedBody(NamedTuple):
+    version: int
+    body: bytes
+    encoding: str | None
+    """Content encoding of the body. None if it's not compressed."""
+
+
+class ResponseCache:
+    """
+    LRU cache of serialized (and compressed) response bodies per App.
+
+    Entry is valid while the App storage version is the same, so cache is
+    invalidated by ingest implicitly, without any coupling to the storage.
+    """
+
+    def __init__(self, max_size: int = 256) -> None:
+        self._max_size = max_size
+        self._items: OrderedDict[tuple[AppID, str | None], CachedBody] = OrderedDict()
+
+    def get(self, app_id: AppID, version: int, accept: str | None) -> CachedBody | None:
+        """Get body for the App of given version and acceptable encoding."""
+        key = (app_id, accept)
+        if (cached := self._items.get(key)) and cached.version == version:
+            self._items.move_to_end(key)
+            RESPONSE_CACHE.labels("hit").inc()
+            return cached
+
+        RESPONSE_CACHE.labels("miss").inc()
+        return None
+
+    def set(self, app_id: AppID, accept: str | None, cached: CachedBody) -> None:
+        key = (app_id, accept)
+        self._items[key] = cached
+        self._items.move_to_end(key)
+        while len(self._items) > self._max_size:
+            self._items.popitem(last=False)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({len(self._items)}/{self._max_size})"
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+from app.common import base_schemas as schemas
+from app.common.base_schemas import AppID, RetentionPolicy
+from app.common.metrics import REGISTRY
+from app.services.storage import StorageService
+
+logger = logging.getLogger(__name__)
+
+COMPACTION_REMOVED = REGISTRY.counter(
+    "storage_compaction_removed_reviews_total", "Reviews removed by retention policy."
+)
+COMPACTION_RECLAIMED = REGISTRY.counter(
+    "storage_compaction_reclaimed_bytes_total", "Storage file bytes reclaimed."
+)
+COMPACTION_DURATION = REGISTRY.histogram(
+    "storage_compaction_seconds", "Time of a storage compaction run."
+)
+
+
+@dataclass
+class CompactionReport:
+    apps: int
+    """Number of apps with removed reviews."""
+    removed: int
+    """Number of removed reviews."""
+    reclaimed_bytes: int
+    """Storage file size difference."""
+    seconds: float
+
+
+class CompactionService:
+    """
+    Background enforcement of reviews retention.
+
+    Expired reviews of an App are removed at once, publishing a single new snapshot
+    of the App, yielding to the event loop between Apps, so API is responsive during
+    compaction. The whole storage file is re-written once per run and only if
+    something is removed.
+
+    Retention watermark of the App is moved to the latest removed review, so
+    removed reviews are not ingested again when they are polled.
+    """
+
+    def __init__(
+        self,
+        storage: StorageService,
+        *,
+        default: RetentionPolicy,
+        overrides: dict[AppID, RetentionPolicy] | None = None,
+        interval: float = 3600.0,  # seconds
+        clock: Callable[[], datetime] = lambda: datetime.now(timezone.utc),
+    ) -> None:
+        self._storage = storage
+        self._default = default
+        self._overrides = overrides or {}
+        self._interval = interval
+        self._clock = clock
+
+        self.last_report: CompactionReport | None = None
+
+    @property
+    def is_enabled(self) -> bool:
+        return not self._default.is_unlimited or any(
+            not policy.is_unlimited for policy in self._overrides.values()
+        )
+
+    def get_policy(self, app_id: AppID) -> RetentionPolicy:
+        return self._overrides.get(app_id, self._default)
+
+    async def run(self) -> None:
+        """Run compaction in the background."""
+        logger.info("Start storage compaction in the background: %s", self)
+        while True:
+            try:
+                await self.process()
+            except Exception as e:
+                logger.exception("%s. Compaction failed: %r", self, e)
+            await asyncio.sleep(self._interval)
+
+    async def process(self) -> CompactionReport:
+        """Remove expired reviews of all apps and persist the storage."""
+        started = time.perf_counter()
+        size_before = self._file_size()
+        apps = removed = 0
+        for app_id in self._storage.get_app_ids_with_reviews():
+            expired = await self._get_expired(app_id)
+            if expired:
+                self._storage.set_retention_watermark(
+                    app_id, max(review.updated for review in expired)
+                )
+                removed += await self._storage.delete_reviews(
+                    [review.id for review in expired]
+                )
+                apps += 1
+            await asyncio.sleep(0)  # let other tasks run between apps
+
+        if removed:
+            await self._storage.write()
+
+        report = CompactionReport(
+            apps=apps,
+            removed=removed,
+            reclaimed_bytes=max(size_before - self._file_size(), 0),
+            seconds=time.perf_counter() - started,
+        )
+        COMPACTION_REMOVED.inc(report.removed)
+        COMPACTION_RECLAIMED.inc(report.reclaimed_bytes)
+        COMPACTION_DURATION.observe(report.seconds)
+        logger.info("%s. Compaction is done: %s", self, report)
+
+        self.last_report = report
+        return report
+
+    async def _get_expired(self, app_id: AppID) -> list[schemas.Review]:
+        policy = self.get_policy(app_id)
+        if policy.is_unlimited:
+            return []
+
+        # most recent first
+        reviews = await self._storage.get_review_list(app_id)
+        expired = reviews[policy.max_count :] if policy.max_count is not None else []
+        if policy.max_age is not None:
+            updated_min = self._clock() - policy.max_age
+            kept = reviews[: policy.max_count]
+            expired += [review for review in kept if review.updated < updated_min]
+        return expired
+
+    def _file_size(self) -> int:
+        try:
+            return self._storage.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}()"
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from types import FrameType
+
+from app.common.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = REGISTRY.histogram(
+    "event_loop_lag_seconds",
+    "Delay of event loop scheduled callbacks.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+LOOP_STALLS = REGISTRY.counter(
+    "event_loop_stalls_total", "Number of detected blocking callbacks."
+)
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+class DiagnosticsService:
+    """
+    Opt-in runtime diagnostics of the API event loop.
+
+    - event loop lag sampler: a task that wakes up every `interval` and measures
+      how late it is woken up;
+    - slow callback watchdog: a thread that captures the event loop thread stack
+      when the sampler is late more than `slow_callback_threshold`, which points to
+      the blocking code;
+    - sampling profiler: on-demand collapsed-stack profile of the event loop thread,
+      compatible with flamegraph tools.
+
+    Nothing is started unless the service is enabled, so it costs nothing by default.
+    """
+
+    def __init__(
+        self,
+        *,
+        interval: float,
+        slow_callback_threshold: float,
+        profile_interval: float,
+        stalls_history: int = 100,
+    ) -> None:
+        self._interval = interval
+        self._threshold = slow_callback_threshold
+        self._profile_interval = profile_interval
+
+        self._loop_thread_id: int | None = None
+        self._last_tick = time.monotonic()
+        self._stopped = threading.Event()
+        self._watchdog: threading.Thread | None = None
+        self._profiling = threading.Lock()
+
+        self.stalls: deque[str] = deque(maxlen=stalls_history)
+        """Recent captured stacks of blocking callbacks."""
+
+    async def run(self) -> None:
+        """Run lag sampler and watchdog in the background."""
+        logger.info("Start diagnostics in the background: %s", self)
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stopped.clear()
+        self._watchdog = threading.Thread(
+            target=self._watch, name="diagnostics-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+        try:
+            while True:
+                expected = time.monotonic() + self._interval
+                await asyncio.sleep(self._interval)
+                self._last_tick = now = time.monotonic()
+                LOOP_LAG.observe(max(now - expected, 0.0))
+        finally:
+            self._stopped.set()
+
+    def _watch(self) -> None:
+        reported_tick = None
+        while not self._stopped.wait(self._threshold / 2):
+            tick = self._last_tick
+            lag = time.monotonic() - tick - self._interval
+            if lag < self._threshold or tick == reported_tick:
+                continue
+
+            # report every stall only once
+            reported_tick = tick
+            if not (frame := self._loop_frame()):
+                continue
+
+            stack = "".join(traceback.format_stack(frame))
+            self.stalls.append(stack)
+            LOOP_STALLS.inc()
+            logger.warning(
+                "Event loop is blocked for more than %.3fs:\n%s", self._threshold, stack
+            )
+
+    def _loop_frame(self) -> FrameType | None:
+        if self._loop_thread_id is None:
+            return None
+        return sys._current_frames().get(self._loop_thread_id)
+
+    async def profile(self, seconds: float) -> str:
+        """
+        Sample event loop thread stacks for the given time.
+        Return collapsed stacks: `frame;frame;frame count` per line.
+        """
+        if not self._profiling.acquire(blocking=False):
+            raise ProfilerBusyError("Profiling is in progress already")
+        try:
+            return await asyncio.to_thread(self._sample, seconds)
+        finally:
+            self._profiling.release()
+
+    def _sample(self, seconds: float) -> str:
+        stacks: Counter[str] = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            if frame := self._loop_frame():
+                stacks[self._collapse(frame)] += 1
+            time.sleep(self._profile_interval)
+
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+
+    @staticmethod
+    def _collapse(frame: FrameType | None) -> str:
+        names = []
+        while frame:
+            code = frame.f_code
+            names.append(
+                f"{code.co_qualname} ({code.co_filename}:{code.co_firstlineno})"
+            )
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}()"
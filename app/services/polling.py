@@ -1,15 +1,104 @@
 import asyncio
 import logging
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Never
+from typing import Never, Protocol
 
 from app.common import base_schemas as schemas
-from app.integration.itunes.adapter import ItunesRSSAdapter
-from app.services.queue import DataPollingQueue, PollReviewsTask
-from app.services.storage import StorageService
+from app.common.base_schemas import DEFAULT_COUNTRY, AppID, Country, ReviewId
+from app.common.circuit_breaker import CircuitOpenError
+from app.common.metrics import REGISTRY
+from app.integration.itunes import schemas as itunes_schemas
+from app.integration.itunes.adapter import ItunesRSSAdapter, SortBy
+from app.services.backfill import BackfillService
+from app.services.backoff import PollingBackoff
+from app.services.pubsub import ReviewsHub
+from app.services.queue import BackfillReviewsTask, DataPollingQueue, PollReviewsTask
+from app.services.storage import review_digest
 
 logger = logging.getLogger(__name__)
 
+WORKERS = REGISTRY.gauge("polling_workers", "Number of running polling workers.")
+WORKERS_BUSY = REGISTRY.gauge("polling_workers_busy", "Number of busy polling workers.")
+WORKERS_BUSY_SECONDS = REGISTRY.counter(
+    "polling_workers_busy_seconds_total", "Time polling workers spend on tasks."
+)
+TASKS_PROCESSED = REGISTRY.counter(
+    "polling_tasks_total", "Number of processed polling tasks.", ("result",)
+)
+POLL_DURATION = REGISTRY.histogram(
+    "polling_process_seconds", "Time to poll and store reviews for one app."
+)
+POLL_PAGES = REGISTRY.histogram(
+    "polling_pages_per_poll",
+    "Number of fetched upstream pages per poll of a single storefront.",
+    buckets=tuple(range(1, ItunesRSSAdapter.MAX_PAGES + 1)),
+)
+POLL_REVIEWS = REGISTRY.counter(
+    "polling_reviews_total", "Number of polled reviews by ingest class.", ("kind",)
+)
+
+
+def build_review_id(app_id: AppID, country: Country, entry_id: str) -> ReviewId:
+    """
+    Review id might be not unique among all apps and storefronts, so build composed
+    review id. Reviews of the default storefront keep legacy ids without country.
+    """
+    if country == DEFAULT_COUNTRY:
+        return f"{app_id}_{entry_id}"
+    return f"{app_id}_{country}_{entry_id}"
+
+
+def build_review(
+    app_id: AppID, country: Country, entry: itunes_schemas.ReviewEntry
+) -> schemas.Review:
+    return schemas.Review(
+        id=build_review_id(app_id, country, entry.id.label),
+        app_id=app_id,
+        title=entry.title.label,
+        content=entry.content.label,
+        author=entry.author.name.label,
+        score=int(entry.im_rating.label),
+        updated=datetime.fromisoformat(entry.updated.label),
+        country=country,
+    )
+
+
+@dataclass
+class IngestStats:
+    """Per-poll counts of polled reviews."""
+
+    new: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    expired: int = 0
+    """Removed by retention policy before, so they are not ingested again."""
+
+
+class ReviewsSink(Protocol):
+    """
+    Where the polling worker reads known reviews from and writes polled ones to.
+    It's `StorageService` in the API process.
+    """
+
+    async def get_app(self, app_id: AppID) -> schemas.App | None: ...
+
+    async def create_app(self, app: schemas.App) -> None: ...
+
+    async def get_review_digests(
+        self, review_ids: list[ReviewId]
+    ) -> dict[ReviewId, bytes]: ...
+
+    def get_retention_watermark(self, app_id: AppID) -> datetime | None: ...
+
+    async def create_reviews(
+        self, reviews: list[schemas.Review], digests: list[bytes]
+    ) -> list[schemas.Review]:
+        """Store new and changed reviews with their content hashes."""
+        ...
+
 
 class DataPollingWorker:
     """
@@ -19,19 +108,28 @@ class DataPollingWorker:
 
     def __init__(
         self,
-        storage: StorageService,
+        storage: ReviewsSink,
         queue: DataPollingQueue,
         adapter: ItunesRSSAdapter,
+        hub: ReviewsHub,
         *,
         id: str,
         polling_depth: timedelta,
+        backfill: BackfillService | None = None,
+        fetch_limit: asyncio.Semaphore | None = None,
+        backoff: PollingBackoff | None = None,
     ) -> None:
         self._storage = storage
         self._queue = queue
         self._adapter = adapter
+        self._hub = hub
         self._id = id
         self._polling_depth = polling_depth
+        self._backfill = backfill
+        self._fetch_limit = fetch_limit or nullcontext()
+        self._backoff = backoff
         self._is_available = asyncio.Event()
+        self._is_idle = False
 
     @property
     def is_available(self) -> bool:
@@ -40,65 +138,300 @@ class DataPollingWorker:
     async def wait_for_availability(self) -> None:
         await self._is_available.wait()
 
+    @property
+    def is_idle(self) -> bool:
+        """Waiting for the next task, so safe to be stopped (cancelled)."""
+        return self._is_idle
+
+    @property
+    def id(self) -> str:
+        return self._id
+
     async def run(self) -> Never:
         logger.info("Start worker in the background: %s", self)
-        while True:
-            self._is_available.set()
-
-            # wait for the next task, if there is no task, the worker is blocked
-            task = await self._queue.pop()
-
-            try:
-                await self.process(task)
-            except Exception as e:
-                logger.exception(f"Error reviews polling for app {task.app_id}: {e}")
-            finally:
-                # NOTE
-                # No matter are there errors or not, the task is marked as complete.
-                # This is important to avoid blocking the queue.
-                # In case of error, user gets no response for this App.
-                self._queue.mark_complete(task)
-                self._is_available.clear()
-
-    async def process(self, task: PollReviewsTask) -> None:
+        WORKERS.inc()
+        try:
+            while True:
+                self._is_available.set()
+
+                # wait for the next task, if there is no task, the worker is blocked
+                self._is_idle = True
+                try:
+                    task = await self._queue.pop()
+                finally:
+                    self._is_idle = False
+
+                WORKERS_BUSY.inc()
+                started = time.perf_counter()
+                backfill_continues = False
+                backfill_retry: float | None = None
+                error: str | None = None
+                try:
+                    if isinstance(task, BackfillReviewsTask):
+                        await self.process_backfill(task)
+                        backfill_continues = self._is_backfill_pending(task.app_id)
+                        if self._backfill:
+                            self._backfill.record_success(task.app_id)
+                    else:
+                        await self.process(task)
+                        if self._backoff:
+                            self._backoff.record_success(task.app_id)
+                    TASKS_PROCESSED.labels("ok").inc()
+                except CircuitOpenError as e:
+                    # upstream is unavailable, that's not the App failure
+                    TASKS_PROCESSED.labels("skipped").inc()
+                    logger.warning(
+                        "Skip reviews polling for app %s: %s", task.app_id, e.detail
+                    )
+                    error = e.detail
+                    if isinstance(task, BackfillReviewsTask) and self._backfill:
+                        backfill_retry = self._backfill.record_failure(
+                            task.app_id, error, count=False
+                        )
+                except Exception as e:
+                    TASKS_PROCESSED.labels("error").inc()
+                    logger.exception(
+                        f"Error reviews polling for app {task.app_id}: {e}"
+                    )
+                    error = str(e) or type(e).__name__
+                    if isinstance(task, BackfillReviewsTask):
+                        if self._backfill:
+                            backfill_retry = self._backfill.record_failure(
+                                task.app_id, error
+                            )
+                    elif self._backoff:
+                        self._backoff.record_failure(task.app_id)
+                finally:
+                    # NOTE
+                    # No matter are there errors or not, the task is marked as complete.
+                    # This is important to avoid blocking the queue.
+                    # In case of error, user gets no response for this App.
+                    self._queue.mark_complete(task, error=error)
+                    self._is_available.clear()
+                    WORKERS_BUSY.dec()
+                    WORKERS_BUSY_SECONDS.inc(time.perf_counter() - started)
+
+                # NOTE: backfill is processed one slice at a time and re-enqueued,
+                # so the real-time polling tasks are taken in between
+                if backfill_continues:
+                    self._queue.push_backfill(task.app_id)
+                elif backfill_retry is not None:
+                    self._queue.push_backfill(task.app_id, delay=backfill_retry)
+        finally:
+            WORKERS.dec()
+
+    async def process(self, task: PollReviewsTask) -> IngestStats:
         """
         Process task to poll reviews for a given App.
 
         It calls external adapter to get reviews, build compatible with StorageService
-        models and then create these entities in the storage.
+        models and then create these entities in the storage. Newly inserted reviews
+        are published to the hub subscribers.
+
+        Storefront countries of the App are polled concurrently, while the number of
+        upstream requests in flight is limited by the semaphore shared among workers.
+        Reviews of all storefronts are merged and stored at once. If some storefront
+        fails, reviews of the others are stored anyway and the poll succeeds, it's
+        failed only if all storefronts are failed.
+
+        Unchanged entries are skipped without building review models at all, so
+        steady-state polls cost nothing to the storage.
         """
         logger.debug("%s; Processing task: %s", self, task)
 
+        started = time.perf_counter()
+        stats = IngestStats()
+        app = await self._storage.get_app(task.app_id)
+        countries = app.countries if app else [DEFAULT_COUNTRY]
         reviews: list[schemas.Review] = []
+        digests: list[bytes] = []
+        try:
+            results = await asyncio.gather(
+                *[
+                    self._poll_country(task, country, stats, reviews, digests)
+                    for country in countries
+                ],
+                return_exceptions=True,
+            )
+        except asyncio.CancelledError:
+            # NOTE: on shutdown keep already fetched pages, otherwise they are lost
+            if reviews:
+                logger.info("%s; Flush partially polled %s", self, task)
+                await self._store(task.app_id, reviews, digests)
+            raise
+
+        errors = {
+            country: result
+            for country, result in zip(countries, results)
+            if isinstance(result, BaseException)
+        }
+
+        # NOTE: nothing is stored (even the App) if all storefronts are failed,
+        # only then the poll is failed and backed off
+        if len(errors) < len(results):
+            await self._store(task.app_id, reviews, digests)
+            self._report(task, stats)
+        POLL_DURATION.observe(time.perf_counter() - started)
+        if errors and len(errors) == len(results):
+            raise next(iter(errors.values()))
+        for country, error in errors.items():
+            logger.warning(
+                "%s; Failed storefront %s of %s: %r", self, country, task, error
+            )
+        return stats
+
+    async def _poll_country(
+        self,
+        task: PollReviewsTask,
+        country: Country,
+        stats: IngestStats,
+        reviews: list[schemas.Review],
+        digests: list[bytes],
+    ) -> None:
+        app_id = task.app_id
+        pages = 0
         for page in range(1, self._adapter.MAX_PAGES + 1):
-            response = await self._adapter.get_reviews(task.app_id, page)
+            response = await self._fetch(app_id, page, country=country)
+            pages += 1
+            task.pages_fetched += 1
             if not response.feed.entry:
                 break
 
-            for entry in response.feed.entry:
-                review = schemas.Review(
-                    # NOTE:
-                    # review id might be not unique among all apps, so build composed review id
-                    id=f"{task.app_id}_{entry.id.label}",
-                    app_id=task.app_id,
-                    title=entry.title.label,
-                    content=entry.content.label,
-                    author=entry.author.name.label,
-                    score=entry.im_rating.label,  # type: ignore
-                    updated=entry.updated.label,  # type: ignore
-                )
-                reviews.append(review)
+            changed, changed_digests = await self._select_changed(
+                app_id, country, response.feed.entry, stats
+            )
+            reviews += changed
+            digests += changed_digests
+            updated = datetime.fromisoformat(response.feed.entry[-1].updated.label)
 
             now = datetime.now(timezone.utc)
-            if reviews[-1].updated < now - self._polling_depth:
+            if updated < now - self._polling_depth:
                 break
 
-        await self._storage.create_reviews(reviews)
+        POLL_PAGES.observe(pages)
+
+    async def _fetch(
+        self,
+        app_id: AppID,
+        page: int,
+        sort_by: SortBy = "mostRecent",
+        *,
+        country: Country,
+    ) -> itunes_schemas.ITunesReviewsResponse:
+        async with self._fetch_limit:
+            return await self._adapter.get_reviews(
+                app_id, page, sort_by, country=country
+            )
+
+    async def process_backfill(self, task: BackfillReviewsTask) -> IngestStats:
+        """
+        Process one feed slice (storefront country and ordering) of the App backfill.
+
+        Pages are fetched regardless of the polling depth and stored one by one,
+        every stored page is checkpointed, so backfill is resumed from there.
+        """
+        logger.debug("%s; Processing task: %s", self, task)
+
+        stats = IngestStats()
+        if not self._backfill:
+            logger.warning("%s; Backfill is not configured, skip: %s", self, task)
+            return stats
+
+        cursor = self._backfill.get_cursor(task.app_id)
+        while cursor:
+            response = await self._fetch(
+                task.app_id, cursor.page, cursor.sort_by, country=cursor.country
+            )
+            entries = response.feed.entry
+            reviews, digests = await self._select_changed(
+                task.app_id, cursor.country, entries, stats
+            )
+            await self._store(task.app_id, reviews, digests)
+
+            done = not entries or cursor.page >= self._adapter.MAX_PAGES
+            await self._backfill.advance(cursor, task.app_id, done=done)
+            cursor = None if done else cursor._replace(page=cursor.page + 1)
+
+        self._report(task, stats)
+        return stats
+
+    def _is_backfill_pending(self, app_id: AppID) -> bool:
+        return bool(self._backfill and self._backfill.get_cursor(app_id))
+
+    async def _select_changed(
+        self,
+        app_id: AppID,
+        country: Country,
+        entries: list[itunes_schemas.ReviewEntry],
+        stats: IngestStats,
+    ) -> tuple[list[schemas.Review], list[bytes]]:
+        """
+        Build reviews for new and changed entries only, with their content hashes.
+
+        Every entry is classified as new, changed or unchanged by its content hash.
+        Unchanged entries and entries removed by retention policy before are skipped
+        without building review models at all.
+        """
+        ids = [build_review_id(app_id, country, entry.id.label) for entry in entries]
+        known_digests = await self._storage.get_review_digests(ids)
+        watermark = self._storage.get_retention_watermark(app_id)
+
+        reviews, digests = [], []
+        for review_id, entry in zip(ids, entries):
+            score = int(entry.im_rating.label)
+            updated = datetime.fromisoformat(entry.updated.label)
+            if watermark and updated <= watermark:
+                stats.expired += 1
+                continue
+
+            digest = review_digest(
+                entry.title.label,
+                entry.content.label,
+                entry.author.name.label,
+                score,
+                updated,
+            )
+            if (known := known_digests.get(review_id)) == digest:
+                stats.unchanged += 1
+                continue
+
+            if known:
+                stats.changed += 1
+            else:
+                stats.new += 1
+
+            reviews.append(build_review(app_id, country, entry))
+            digests.append(digest)
+        return reviews, digests
+
+    async def _store(
+        self,
+        app_id: AppID,
+        reviews: list[schemas.Review],
+        digests: list[bytes],
+    ):
+        inserted = await self._storage.create_reviews(reviews, digests)
+        self._hub.publish(app_id, inserted)
 
         # create app in case it does not exist
-        if not await self._storage.get_app(task.app_id):
-            app = schemas.App(id=task.app_id)
+        if not await self._storage.get_app(app_id):
+            app = schemas.App(id=app_id)
             await self._storage.create_app(app)
 
+    def _report(self, task: PollReviewsTask, stats: IngestStats) -> None:
+        logger.info(
+            "%s; Polled %s: %s new, %s changed, %s unchanged, %s expired reviews",
+            self,
+            task,
+            stats.new,
+            stats.changed,
+            stats.unchanged,
+            stats.expired,
+        )
+        POLL_REVIEWS.labels("new").inc(stats.new)
+        POLL_REVIEWS.labels("changed").inc(stats.changed)
+        POLL_REVIEWS.labels("unchanged").inc(stats.unchanged)
+        POLL_REVIEWS.labels("expired").inc(stats.expired)
+
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({self._id})"
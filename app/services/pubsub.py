@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from collections import defaultdict
+
+from app.common import base_schemas as schemas
+from app.common.base_schemas import AppID
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Subscription to newly ingested reviews of a single App.
+
+    Has bounded buffer. When subscriber does not keep up with publishing, it is
+    dropped by the hub: buffered deltas are discarded and iteration is stopped.
+    """
+
+    def __init__(self, hub: "ReviewsHub", app_id: AppID, buffer_size: int) -> None:
+        self._hub = hub
+        self._app_id = app_id
+        self._buffer: asyncio.Queue[list[schemas.Review] | None] = asyncio.Queue(
+            buffer_size
+        )
+        self._is_dropped = False
+
+    @property
+    def app_id(self) -> AppID:
+        return self._app_id
+
+    @property
+    def is_dropped(self) -> bool:
+        return self._is_dropped
+
+    def put(self, reviews: list[schemas.Review]) -> None:
+        try:
+            self._buffer.put_nowait(reviews)
+        except asyncio.QueueFull:
+            logger.warning("Slow subscriber is dropped: %s", self)
+            self.drop()
+
+    def drop(self) -> None:
+        self._is_dropped = True
+        self._hub.unsubscribe(self)
+
+        # free buffer and wake up consumer with end of stream marker
+        while not self._buffer.empty():
+            self._buffer.get_nowait()
+        self._buffer.put_nowait(None)
+
+    def close(self) -> None:
+        self._hub.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> list[schemas.Review]:
+        if (reviews := await self._buffer.get()) is None:
+            raise StopAsyncIteration
+        return reviews
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._app_id}, {id(self):x})"
+
+
+class ReviewsHub:
+    """In-process pub/sub hub to push newly ingested reviews to subscribers."""
+
+    def __init__(self, *, buffer_size: int = 100) -> None:
+        self._buffer_size = buffer_size
+        self._subscriptions: defaultdict[AppID, set[Subscription]] = defaultdict(set)
+
+    def subscribe(self, app_id: AppID) -> Subscription:
+        subscription = Subscription(self, app_id, self._buffer_size)
+        self._subscriptions[app_id].add(subscription)
+        logger.debug("New subscription: %s", subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscriptions := self._subscriptions.get(subscription.app_id):
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.app_id]
+
+    def publish(self, app_id: AppID, reviews: list[schemas.Review]) -> None:
+        """Push reviews to all App subscribers. Never blocks publisher."""
+        if not reviews or not (subscriptions := self._subscriptions.get(app_id)):
+            return
+
+        logger.debug("Publishing %s reviews to %s", len(reviews), len(subscriptions))
+        for subscription in list(subscriptions):
+            subscription.put(reviews)
@@ -1,16 +1,64 @@
 import asyncio
+import heapq
 import logging
+import math
+import random
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Literal
+
+from pydantic import AwareDatetime, BaseModel
 
 from app.common.base_schemas import AppID
+from app.common.metrics import REGISTRY
 
 logger = logging.getLogger(__name__)
 
+QUEUE_DEPTH = REGISTRY.gauge("polling_queue_depth", "Number of pending polling tasks.")
+QUEUE_IN_PROGRESS = REGISTRY.gauge(
+    "polling_queue_in_progress", "Number of polling tasks in progress."
+)
+QUEUE_PUSHED = REGISTRY.counter(
+    "polling_queue_pushed_total", "Number of pushed polling tasks.", ("result",)
+)
+QUEUE_WAIT = REGISTRY.histogram(
+    "polling_queue_wait_seconds", "Time polling tasks spend in the queue."
+)
+
+
+class QueueSnapshot(BaseModel):
+    tasks: list[AppID] = []
+    """Unfinished polling tasks in order of priority."""
+    polled_at: dict[AppID, AwareDatetime] = {}
+    """Last time the App polling is completed."""
+    delayed: dict[AppID, float] = {}
+    """Delayed polling tasks: seconds until they are due."""
+
+
+TaskStatus = Literal["pending", "in_progress", "completed", "failed"]
+
 
 class PollReviewsTask:
 
     def __init__(self, app_id: AppID) -> None:
         self._app_id = app_id
         self._is_completed = asyncio.Event()
+        self._created_at = time.monotonic()
+        self._job_id = uuid.uuid4().hex
+
+        self.queued_at = self._created_at
+        """Monotonic time the task joins the queue (delayed ones once they are due)."""
+        self.started_at: float | None = None
+        self.deadline = self._created_at
+        """Monotonic time the task is due by, tasks are taken earliest deadline first."""
+
+        self.status: TaskStatus = "pending"
+        self.pages_fetched = 0
+        """Upstream pages fetched so far (of all storefronts)."""
+        self.error: str | None = None
 
     @property
     def app_id(self) -> AppID:
@@ -20,7 +68,23 @@ class PollReviewsTask:
     def id(self) -> str:
         return f"task_{self._app_id}"
 
-    def mark_complete(self) -> None:
+    @property
+    def job_id(self) -> str:
+        """Unique id of that very task, unlike `id` shared by tasks of the same App."""
+        return self._job_id
+
+    @property
+    def created_at(self) -> float:
+        """Monotonic time the task is created at."""
+        return self._created_at
+
+    @property
+    def is_completed(self) -> bool:
+        return self._is_completed.is_set()
+
+    def mark_complete(self, error: str | None = None) -> None:
+        self.status = "failed" if error else "completed"
+        self.error = error
         self._is_completed.set()
 
     def __await__(self):
@@ -30,54 +94,274 @@ class PollReviewsTask:
         return f"{self.__class__.__name__}({self.id})"
 
 
+class BackfillReviewsTask(PollReviewsTask):
+    """Low priority task to fetch deep reviews history for a given App."""
+
+    @property
+    def id(self) -> str:
+        return f"backfill_{self._app_id}"
+
+
 class DataPollingQueue:
     """
     Queue for data polling tasks.
 
-    Implements both FIFO (First In, First Out) and LIFO (Last In, First Out) principles
-    depending on the urgency of the task.
+    Tasks are taken earliest deadline first (EDF). By default the deadline is the time
+    the task joins the queue, so tasks are taken in FIFO (First In, First Out) order.
+    Scheduled polls are given deadlines by the App freshness SLA, and urgent tasks are
+    taken before any other ones.
+
+    Backfill tasks have the lowest priority: they are taken only when there are no
+    regular tasks and no more than `backfill_concurrency` backfills are in progress,
+    so the real-time polling is never starved.
+
+    Delayed tasks are pending, but join the queue only once they are due.
     """
 
-    def __init__(self) -> None:
-        self._queue: list[PollReviewsTask] = []
+    def __init__(
+        self, *, backfill_concurrency: int = 1, jobs_history: int = 1000
+    ) -> None:
+        # heap of (deadline, sequence, task)
+        self._queue: list[tuple[float, int, PollReviewsTask]] = []
+        # (due monotonic time, sequence, task), entries of promoted tasks are stale
+        self._delayed: list[tuple[float, int, PollReviewsTask]] = []
+        self._due: dict[str, float] = {}
+        self._seq = 0
+        self._backfill_queue: list[BackfillReviewsTask] = []
+        self._backfill_concurrency = backfill_concurrency
+        self._backfill_in_progress = 0
         self._is_queue_filled = asyncio.Event()
+        self._is_closed = False
+        self._polled_at: dict[AppID, datetime] = {}
 
         self._pending: dict[str, PollReviewsTask] = {}
         self._in_progress: dict[str, PollReviewsTask] = {}
         self._completed: dict[str, PollReviewsTask] = {}
+        self._jobs: OrderedDict[str, PollReviewsTask] = OrderedDict()
+        self._jobs_history = jobs_history
+
+        # running totals for load signals (see WorkerPoolSupervisor)
+        self.completed_total = 0
+        self.failed_total = 0
+        self.busy_seconds_total = 0.0
+
+    def push(
+        self,
+        app_id: AppID,
+        *,
+        urgent: bool = False,
+        delay: float = 0.0,
+        deadline: float | None = None,
+    ) -> PollReviewsTask:
+        """
+        Add task for the given App ID to the queue, after `delay` seconds optionally.
+        `deadline` is a monotonic time the task is due by, now by default.
 
-    def push(self, app_id: AppID, *, urgent: bool = False) -> PollReviewsTask:
-        """Add task for the given App ID to the queue. Omit duplicate tasks."""
+        Omit duplicate tasks, but a delayed duplicate of a task due now is due now,
+        and a queued duplicate takes the earlier deadline.
+        """
         task = PollReviewsTask(app_id)
+        if duplicate := self._get_duplicate(task):
+            if delay <= 0 and self._due.pop(duplicate.id, None) is not None:
+                self._enqueue(duplicate, urgent=urgent, deadline=deadline)
+                self._is_queue_filled.set()
+            elif delay <= 0 and duplicate.status == "pending":
+                self._reprioritize(duplicate, urgent=urgent, deadline=deadline)
+            return duplicate
+
+        self._pending[task.id] = task
+        if delay > 0:
+            self._delay(task, delay)
+        else:
+            self._enqueue(task, urgent=urgent, deadline=deadline)
+
+        self._jobs[task.job_id] = task
+        while len(self._jobs) > self._jobs_history:
+            self._jobs.popitem(last=False)
+
+        self._on_pushed()
+        return task
+
+    def push_staggered(
+        self, app_ids: list[AppID], *, rate: float
+    ) -> list[PollReviewsTask]:
+        """
+        Add delayed tasks for many App IDs, due at `rate` tasks per second on average.
+        Every task is due at a random time within its own slot, so neither the first
+        polls nor the following periodic ones of the Apps come in bursts.
+        """
+        return [
+            self.push(app_id, delay=(idx + random.random()) / rate)
+            for idx, app_id in enumerate(app_ids)
+        ]
+
+    def _enqueue(
+        self,
+        task: PollReviewsTask,
+        *,
+        urgent: bool = False,
+        deadline: float | None = None,
+    ) -> None:
+        task.queued_at = time.monotonic()
+        task.deadline = self._get_deadline(task, urgent=urgent, deadline=deadline)
+        heapq.heappush(self._queue, (task.deadline, self._seq, task))
+        self._seq += 1
+
+    def _reprioritize(
+        self,
+        task: PollReviewsTask,
+        *,
+        urgent: bool = False,
+        deadline: float | None = None,
+    ) -> None:
+        """Move the queued task forward, if its new deadline is earlier."""
+        deadline = self._get_deadline(task, urgent=urgent, deadline=deadline)
+        if deadline >= task.deadline:
+            return
+
+        task.deadline = deadline
+        self._queue = [
+            (task.deadline, seq, queued) if queued is task else (due, seq, queued)
+            for due, seq, queued in self._queue
+        ]
+        heapq.heapify(self._queue)
+
+    @staticmethod
+    def _get_deadline(
+        task: PollReviewsTask, *, urgent: bool, deadline: float | None
+    ) -> float:
+        if urgent:
+            return -math.inf
+        return task.queued_at if deadline is None else deadline
+
+    def _delay(self, task: PollReviewsTask, delay: float) -> None:
+        due = time.monotonic() + delay
+        self._due[task.id] = due
+        heapq.heappush(self._delayed, (due, self._seq, task))
+        self._seq += 1
+
+    def _promote_due(self) -> float | None:
+        """Enqueue delayed tasks that are due. Return seconds until the next one."""
+        now = time.monotonic()
+        while self._delayed:
+            due, _, task = self._delayed[0]
+            if self._due.get(task.id) != due or task is not self._pending.get(task.id):
+                heapq.heappop(self._delayed)  # promoted already
+            elif due <= now:
+                heapq.heappop(self._delayed)
+                del self._due[task.id]
+                if isinstance(task, BackfillReviewsTask):
+                    self._backfill_queue.append(task)
+                else:
+                    self._enqueue(task)
+            else:
+                return due - now
+        return None
+
+    @property
+    def backlog(self) -> int:
+        """Number of regular (not backfill) tasks waiting for workers."""
+        return len(self._queue)
 
+    def is_delayed(self, app_id: AppID) -> bool:
+        """Whether the App polling task is delayed and not due yet."""
+        return PollReviewsTask(app_id).id in self._due
+
+    @property
+    def oldest_wait(self) -> float:
+        """Seconds the oldest regular task waits for a worker."""
+        if not self._queue:
+            return 0.0
+        return time.monotonic() - min(task.queued_at for *_, task in self._queue)
+
+    @property
+    def in_progress(self) -> int:
+        return len(self._in_progress)
+
+    @property
+    def delayed(self) -> int:
+        """Number of delayed tasks which are not due yet."""
+        return len(self._due)
+
+    def get_task(self, app_id: AppID) -> PollReviewsTask | None:
+        """Pending or in progress regular task of the given App ID."""
+        task_id = PollReviewsTask(app_id).id
+        return self._pending.get(task_id) or self._in_progress.get(task_id)
+
+    def get_job(self, job_id: str) -> PollReviewsTask | None:
+        """Task by its job id. Only recent `jobs_history` tasks are kept."""
+        return self._jobs.get(job_id)
+
+    def push_backfill(
+        self, app_id: AppID, *, delay: float = 0.0
+    ) -> BackfillReviewsTask:
+        """
+        Add low priority backfill task for the given App ID, after `delay` seconds
+        optionally (e.g. retry of a failed slice). Omit duplicate tasks.
+        """
+        task = BackfillReviewsTask(app_id)
+        if duplicate := self._get_duplicate(task):
+            return duplicate  # type: ignore[return-value]
+
+        self._pending[task.id] = task
+        if delay > 0:
+            self._delay(task, delay)
+        else:
+            self._backfill_queue.append(task)
+
+        self._on_pushed()
+        return task
+
+    def _get_duplicate(self, task: PollReviewsTask) -> PollReviewsTask | None:
         if pending_task := self._pending.get(task.id):
             logger.warning("Task is pending already: %s", task)
+            QUEUE_PUSHED.labels("duplicate").inc()
             return pending_task
         if pending_task := self._in_progress.get(task.id):
             logger.warning("Task in progress already: %s", task)
+            QUEUE_PUSHED.labels("duplicate").inc()
             return pending_task
+        return None
 
-        self._pending[task.id] = task
-        if urgent:
-            self._queue.insert(0, task)
-        else:
-            self._queue.append(task)
-
+    def _on_pushed(self) -> None:
+        QUEUE_PUSHED.labels("new").inc()
+        QUEUE_DEPTH.set(len(self._pending))
         self._is_queue_filled.set()
-        return task
+
+    def _take(self) -> PollReviewsTask | None:
+        self._promote_due()
+        if self._queue:
+            return heapq.heappop(self._queue)[-1]
+        if (
+            self._backfill_queue
+            and self._backfill_in_progress < self._backfill_concurrency
+        ):
+            self._backfill_in_progress += 1
+            return self._backfill_queue.pop(0)
+        return None
 
     async def pop(self) -> PollReviewsTask:
         """Get the next task from the queue. If there is no task, wait for a task."""
-        if not self._queue:
-            logger.debug("No task in queue, waiting for a task...")
-            await self._is_queue_filled.wait()
 
-        task = self._queue.pop(0)
-        if not self._queue:
+        # NOTE: many workers are woken up at once, but only one of them gets the task
+        while self._is_closed or not (task := self._take()):
+            logger.debug("No task in queue, waiting for a task...")
             self._is_queue_filled.clear()
+            # nothing is due now (see `_take`), wake up when the next delayed task is
+            next_due = None if self._is_closed else self._promote_due()
+            try:
+                await asyncio.wait_for(self._is_queue_filled.wait(), next_due)
+            except asyncio.TimeoutError:
+                pass  # delayed task is due
 
         self._pending.pop(task.id)
         self._in_progress[task.id] = task
+        task.status = "in_progress"
+        task.started_at = time.monotonic()
+
+        QUEUE_WAIT.observe(task.started_at - task.queued_at)
+        QUEUE_DEPTH.set(len(self._pending))
+        QUEUE_IN_PROGRESS.set(len(self._in_progress))
         return task
 
     async def wait_all_pending_and_progress(self) -> None:
@@ -85,8 +369,86 @@ class DataPollingQueue:
         tasks = [*self._pending.values(), *self._in_progress.values()]
         await asyncio.gather(*[asyncio.ensure_future(task) for task in tasks])
 
-    def mark_complete(self, task: PollReviewsTask) -> None:
-        """Mark task as complete."""
+    async def wait_in_progress(self, timeout: float | None = None) -> bool:
+        """Wait for in progress tasks to complete. Return False on timeout."""
+        if not self._in_progress:
+            return True
+        tasks = [asyncio.ensure_future(task) for task in self._in_progress.values()]
+        _, not_done = await asyncio.wait(tasks, timeout=timeout)
+        for future in not_done:
+            future.cancel()
+        return not not_done
+
+    def mark_complete(self, task: PollReviewsTask, *, error: str | None = None) -> None:
+        """Mark task as complete. With error, task is failed."""
         self._in_progress.pop(task.id)
         self._completed[task.id] = task
-        task.mark_complete()
+        task.mark_complete(error)
+        self.completed_total += 1
+        self.failed_total += bool(error)
+        if task.started_at is not None:
+            self.busy_seconds_total += time.monotonic() - task.started_at
+        QUEUE_IN_PROGRESS.set(len(self._in_progress))
+
+        if not isinstance(task, BackfillReviewsTask):
+            self._polled_at[task.app_id] = datetime.now(timezone.utc)
+
+        if isinstance(task, BackfillReviewsTask):
+            # backfill slot is released, wake up workers waiting for it
+            self._backfill_in_progress -= 1
+            if self._backfill_queue:
+                self._is_queue_filled.set()
+
+    def get_polled_at(self, app_id: AppID) -> datetime | None:
+        """Last time the App polling is completed."""
+        return self._polled_at.get(app_id)
+
+    def close(self) -> None:
+        """Stop giving out tasks. Pushed tasks are kept pending."""
+        self._is_closed = True
+
+    def dump(self) -> QueueSnapshot:
+        """
+        Snapshot of unfinished tasks: in progress ones go first, as they have been
+        taken already, then pending ones in order of priority. Backfill tasks are
+        omitted, they are resumed from their own checkpoints.
+        """
+        tasks = [
+            *self._in_progress.values(),
+            *(task for *_, task in sorted(self._queue)),
+        ]
+        now = time.monotonic()
+        return QueueSnapshot(
+            tasks=[
+                task.app_id
+                for task in tasks
+                if not isinstance(task, BackfillReviewsTask)
+            ],
+            polled_at=dict(self._polled_at),
+            delayed={
+                task.app_id: max(due - now, 0.0)
+                for task_id, due in self._due.items()
+                if not isinstance(task := self._pending[task_id], BackfillReviewsTask)
+            },
+        )
+
+    def restore(self, snapshot: QueueSnapshot) -> None:
+        for app_id in snapshot.tasks:
+            self.push(app_id)
+        for app_id, delay in snapshot.delayed.items():
+            self.push(app_id, delay=delay)
+        self._polled_at.update(snapshot.polled_at)
+
+    async def save(self, path: Path, snapshot: QueueSnapshot | None = None) -> None:
+        content = (snapshot or self.dump()).model_dump_json()
+        await asyncio.to_thread(path.write_text, content)
+
+    async def load(self, path: Path) -> None:
+        if not path.exists():
+            return
+
+        content = path.read_text()
+        if content == "":
+            return
+
+        self.restore(QueueSnapshot.model_validate_json(content))
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from pydantic import ValidationError
+
+from app.common import base_schemas as schemas
+from app.common.archive import FeedArchive
+from app.integration.itunes import schemas as itunes_schemas
+from app.integration.itunes.adapter import ItunesRSSAdapter
+from app.services.polling import build_review
+from app.services.storage import StorageService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReingestReport:
+    pages: int
+    """Number of archived pages."""
+    reviews: int
+    """Number of parsed reviews, including duplicates of different pages."""
+    inserted: int
+    """Number of reviews new to the storage."""
+    apps: int
+    seconds: float
+
+
+def parse_archived_pages(
+    root: Path, pages: list[tuple[str, str]]
+) -> list[schemas.Review]:
+    """
+    Parse archived (url, digest) pages to reviews.
+    Runs in a worker process, so only picklable arguments and results.
+    """
+    archive = FeedArchive(root)
+    reviews: list[schemas.Review] = []
+    for url, digest in pages:
+        if not (parsed := ItunesRSSAdapter.parse_url(url)):
+            continue
+
+        app_id, country = parsed
+        try:
+            response = itunes_schemas.ITunesReviewsResponse.model_validate_json(
+                archive.read(digest)
+            )
+        except (OSError, ValidationError) as e:
+            logger.warning("Skip broken archived page %s (%s): %r", url, digest, e)
+            continue
+
+        reviews += [
+            build_review(app_id, country, entry) for entry in response.feed.entry
+        ]
+    return reviews
+
+
+async def reingest(
+    storage: StorageService,
+    archive: FeedArchive,
+    *,
+    processes: int | None = None,
+    chunk_size: int = 50,
+) -> ReingestReport:
+    """
+    Rebuild reviews from the archived upstream pages without any upstream calls.
+
+    Pages are parsed in chunks by a pool of worker processes, results are upserted
+    in order of fetching, so the latest archived version of a review wins. Storage
+    is written once for reviews and once for all missing Apps.
+    """
+    started = time.perf_counter()
+    pages = [
+        (entry.url, entry.digest)
+        for entry in sorted(archive.entries(), key=lambda entry: entry.fetched_at)
+    ]
+    chunks = [pages[idx : idx + chunk_size] for idx in range(0, len(pages), chunk_size)]
+    logger.info("Re-ingest %s archived pages of %s", len(pages), archive)
+
+    loop = asyncio.get_running_loop()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(processes, mp_context=context) as pool:
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(pool, parse_archived_pages, archive.root, chunk)
+                for chunk in chunks
+            )
+        )
+
+    reviews = [review for chunk in results for review in chunk]
+    inserted = await storage.create_reviews(reviews)
+    app_ids = sorted({review.app_id for review in reviews})
+    await storage.create_apps([schemas.App(id=app_id) for app_id in app_ids])
+
+    report = ReingestReport(
+        pages=len(pages),
+        reviews=len(reviews),
+        inserted=len(inserted),
+        apps=len(app_ids),
+        seconds=time.perf_counter() - started,
+    )
+    logger.info("Re-ingest is done: %s", report)
+    return report
@@ -0,0 +1,322 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Iterator, Literal, Never
+
+from pydantic import BaseModel
+
+from app.common import base_schemas as schemas
+from app.common.base_schemas import AppID, ReviewId
+from app.common.circuit_breaker import CircuitBreaker
+from app.integration.itunes.adapter import ItunesRSSAdapter
+from app.services.broker import LeasedTask, TaskBroker, TaskResult
+from app.services.polling import POLL_DURATION, DataPollingWorker, IngestStats
+from app.services.pubsub import ReviewsHub
+from app.services.queue import DataPollingQueue, PollReviewsTask
+from app.services.snapshot import ReviewsBlock, decode_snapshot, encode_snapshot
+from app.services.storage import StorageService
+
+logger = logging.getLogger(__name__)
+
+
+class RemotePollingError(RuntimeError):
+    pass
+
+
+Verdict = Literal["success", "failure", "release"]
+
+_verdicts: ContextVar[list[Verdict] | None] = ContextVar("verdicts", default=None)
+
+
+class PollReport(BaseModel):
+    """Sent back with the polled reviews by the worker process."""
+
+    pages: int = 0
+    """Number of fetched upstream pages."""
+    upstream: list[Verdict] = []
+    """Verdicts of the upstream calls, replayed on the API process circuit breaker."""
+
+
+class ReportingCircuitBreaker(CircuitBreaker):
+    """
+    Circuit breaker of the worker process. Verdicts of the upstream calls are kept
+    to be reported to the API process, as its breaker never sees these calls.
+    The breaker is shared by concurrent consumers, so verdicts are kept per task,
+    see `recording_verdicts`.
+    """
+
+    def record_success(self) -> None:
+        super().record_success()
+        self._record("success")
+
+    def record_failure(self) -> None:
+        super().record_failure()
+        self._record("failure")
+
+    def release(self) -> None:
+        super().release()
+        self._record("release")
+
+    @staticmethod
+    def _record(verdict: Verdict) -> None:
+        if (verdicts := _verdicts.get()) is not None:
+            verdicts.append(verdict)
+
+
+@contextmanager
+def recording_verdicts() -> Iterator[list[Verdict]]:
+    """Collect verdicts of `ReportingCircuitBreaker` in the current task."""
+    verdicts: list[Verdict] = []
+    token = _verdicts.set(verdicts)
+    try:
+        yield verdicts
+    finally:
+        _verdicts.reset(token)
+
+
+class RemotePollingWorker(DataPollingWorker):
+    """
+    Polling worker of the API process that delegates polling to the worker processes.
+
+    Upstream requests and responses parsing are done out of the API process: the
+    polled reviews are sent back via the broker with their content hashes, so API
+    process builds models of the new and changed reviews only and merges them into
+    the storage. Backfill tasks are processed locally.
+    """
+
+    _storage: StorageService
+
+    def __init__(
+        self,
+        storage: StorageService,
+        queue: DataPollingQueue,
+        adapter: ItunesRSSAdapter,
+        hub: ReviewsHub,
+        *,
+        broker: TaskBroker,
+        poll_interval: float = 0.1,  # seconds
+        **kwargs,
+    ) -> None:
+        super().__init__(storage, queue, adapter, hub, **kwargs)
+        self._broker = broker
+        self._poll_interval = poll_interval
+
+    async def process(self, task: PollReviewsTask) -> IngestStats:
+        logger.debug("%s; Processing task: %s", self, task)
+
+        # NOTE: upstream calls of the worker processes are accounted by the API
+        # process breaker, so polling is not delegated while it's open
+        breaker = self._adapter.circuit_breaker
+        if breaker:
+            breaker.check()
+
+        started = time.perf_counter()
+        app = await self._storage.get_app(task.app_id) or schemas.App(id=task.app_id)
+        report = PollReport()
+        try:
+            task_id = await self._broker.push(app)
+            try:
+                result = await self._wait_result(task_id)
+            finally:
+                # NOTE: cancelled task is removed from broker as well, it's restored
+                # with the polling queue at the next startup
+                await self._broker.delete(task_id)
+            if result.report:
+                report = PollReport.model_validate_json(result.report)
+        finally:
+            task.pages_fetched += report.pages
+            if breaker:
+                self._replay(breaker, report.upstream)
+
+        stats = IngestStats()
+        if result.result:
+            block = decode_snapshot(result.result).blocks[0]
+            reviews, digests = await self._classify(block, stats)
+            await self._store(task.app_id, reviews, digests)
+        if result.result or not result.error:
+            self._report(task, stats)
+        POLL_DURATION.observe(time.perf_counter() - started)
+
+        if result.error:
+            raise RemotePollingError(result.error)
+        return stats
+
+    async def _wait_result(self, task_id: str) -> TaskResult:
+        """
+        Wait for the task to be completed by a worker process. It's failed once
+        every attempt lease might expire, so no worker process is consuming it.
+        """
+        deadline = time.monotonic() + self._broker.result_timeout
+        while not (result := await self._broker.get_result(task_id)):
+            if time.monotonic() > deadline:
+                raise RemotePollingError(
+                    f"Task {task_id} is not completed in "
+                    f"{self._broker.result_timeout:.0f}s. "
+                    "Are worker processes running?"
+                )
+            await asyncio.sleep(self._poll_interval)
+        return result
+
+    @staticmethod
+    def _replay(breaker: CircuitBreaker, verdicts: list[Verdict]) -> None:
+        for verdict in verdicts:
+            if verdict == "success":
+                breaker.record_success()
+            elif verdict == "failure":
+                breaker.record_failure()
+            else:
+                breaker.release()
+        if not verdicts:
+            breaker.release()  # no upstream calls, no verdict
+
+    async def _classify(
+        self, block: ReviewsBlock, stats: IngestStats
+    ) -> tuple[list[schemas.Review], list[bytes]]:
+        """
+        Drop unchanged reviews and reviews removed by retention policy, count new
+        and changed ones. Content hashes are computed by the worker process, they
+        are not re-computed, and models of unchanged reviews are not built at all.
+        """
+        known = await self._storage.get_review_digests(block.ids)
+        selected = []
+        for idx, (review_id, digest) in enumerate(zip(block.ids, block.digests)):
+            if known.get(review_id) == digest:
+                stats.unchanged += 1
+            else:
+                selected.append(idx)
+
+        reviews, digests = [], []
+        for idx, review in zip(selected, block.select(selected)):
+            if self._storage.is_expired(review):
+                stats.expired += 1
+                continue
+
+            if review.id in known:
+                stats.changed += 1
+            else:
+                stats.new += 1
+            reviews.append(review)
+            digests.append(block.digests[idx])
+        return reviews, digests
+
+
+class ReviewsCollector:
+    """
+    Reviews sink of the worker process: storage is owned by the API process, so
+    polled reviews are only collected with their content hashes to be sent back
+    via broker. No reviews are known here, the API process skips unchanged ones.
+    """
+
+    def __init__(self, app: schemas.App) -> None:
+        self._app = app
+        self.reviews: list[schemas.Review] = []
+        self.digests: dict[ReviewId, bytes] = {}
+
+    async def get_app(self, app_id: AppID) -> schemas.App | None:
+        return self._app if app_id == self._app.id else None
+
+    async def create_app(self, app: schemas.App) -> None:
+        pass
+
+    async def get_review_digests(
+        self, review_ids: list[ReviewId]
+    ) -> dict[ReviewId, bytes]:
+        return {}
+
+    def get_retention_watermark(self, app_id: AppID) -> datetime | None:
+        return None
+
+    async def create_reviews(
+        self, reviews: list[schemas.Review], digests: list[bytes]
+    ) -> list[schemas.Review]:
+        self.reviews += reviews
+        self.digests.update(
+            zip((review.id for review in reviews), digests, strict=True)
+        )
+        return reviews
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._app.id}, {len(self.reviews)})"
+
+
+class BrokerConsumer:
+    """
+    Worker process service: lease polling tasks from the broker, poll reviews with
+    DataPollingWorker and send them back. The lease is extended while polling.
+    """
+
+    def __init__(
+        self,
+        broker: TaskBroker,
+        adapter: ItunesRSSAdapter,
+        *,
+        id: str,
+        polling_depth: timedelta,
+        poll_interval: float = 0.1,  # seconds
+        heartbeat_interval: float = 10.0,  # seconds
+        fetch_limit: asyncio.Semaphore | None = None,
+    ) -> None:
+        self._broker = broker
+        self._adapter = adapter
+        self._id = id
+        self._polling_depth = polling_depth
+        self._poll_interval = poll_interval
+        self._heartbeat_interval = heartbeat_interval
+        self._fetch_limit = fetch_limit
+
+    async def run(self) -> Never:
+        logger.info("Start broker consumer in the background: %s", self)
+        while True:
+            if task := await self._broker.lease():
+                await self.process(task)
+            else:
+                await asyncio.sleep(self._poll_interval)
+
+    async def process(self, task: LeasedTask) -> None:
+        logger.debug(
+            "%s; Processing task: %s (attempt %s)", self, task.id, task.attempt
+        )
+
+        collector = ReviewsCollector(task.app)
+        worker = DataPollingWorker(
+            collector,
+            DataPollingQueue(),
+            self._adapter,
+            ReviewsHub(),
+            id=self._id,
+            polling_depth=self._polling_depth,
+            fetch_limit=self._fetch_limit,
+        )
+        poll = PollReviewsTask(task.app.id)
+        heartbeat = asyncio.create_task(self._heartbeat(task))
+        error = None
+        with recording_verdicts() as verdicts:
+            try:
+                await worker.process(poll)
+            except Exception as e:
+                logger.exception(f"Error reviews polling for app {task.app.id}: {e}")
+                error = f"{type(e).__name__}: {e}"
+            finally:
+                heartbeat.cancel()
+
+        # NOTE: reviews are sent even on error, as some storefronts might succeed
+        result = None
+        if collector.reviews:
+            result = encode_snapshot(
+                [], {task.app.id: collector.reviews}, collector.digests
+            )
+        report = PollReport(pages=poll.pages_fetched, upstream=verdicts)
+        await self._broker.ack(task, result, error, report=report.model_dump_json())
+
+    async def _heartbeat(self, task: LeasedTask) -> None:
+        while True:
+            await asyncio.sleep(self._heartbeat_interval)
+            if not await self._broker.extend(task):
+                logger.warning("%s; Lease is lost: %s", self, task.id)
+                return
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._id})"
@@ -1,15 +1,43 @@
 import asyncio
 import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import get_args
 
+from app.common import base_schemas as schemas
+from app.common.base_schemas import AppTier
+from app.common.circuit_breaker import CircuitBreaker
+from app.common.metrics import REGISTRY
+from app.services.backoff import PollingBackoff
 from app.services.polling import DataPollingWorker
 from app.services.queue import DataPollingQueue
 from app.services.storage import StorageService
 
 logger = logging.getLogger(__name__)
 
+FRESHNESS_LAG = REGISTRY.gauge(
+    "polling_freshness_lag_seconds",
+    "Seconds since the last poll of the stalest App per tier.",
+    ("tier",),
+)
+SLA_BREACHES = REGISTRY.gauge(
+    "polling_sla_breaches", "Apps not polled within their tier SLA.", ("tier",)
+)
+POLLS_SHED = REGISTRY.counter(
+    "polling_shed_total", "Scheduled polls skipped as workers are saturated.", ("tier",)
+)
+
 
 class SchedulerService:
-    """Service to schedule background tasks to workers."""
+    """
+    Service to schedule background tasks to workers.
+
+    Every App is polled within the SLA of its freshness tier: it is scheduled one
+    scheduling interval before its reviews get stale, with the deadline of the SLA,
+    so the queue gives out the most urgent polls first. While the queue backlog is
+    above `shed_backlog`, scheduled polls of the lowest tiers are shed first.
+    """
 
     def __init__(
         self,
@@ -17,11 +45,29 @@ class SchedulerService:
         storage: StorageService,
         workers: list[DataPollingWorker],
         delay: float = 60.0,  # seconds
+        *,
+        backoff: PollingBackoff | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        slas: dict[AppTier, timedelta] | None = None,
+        shed_backlog: int | None = None,
     ) -> None:
         self._queue = queue
         self._storage = storage
         self._workers = workers
         self._delay = delay
+        self._backoff = backoff
+        self._circuit_breaker = circuit_breaker
+        self._slas = slas or {}
+        self._shed_backlog = shed_backlog
+        # the most important tier (of the shortest SLA) first
+        self._tiers: list[AppTier] = sorted(get_args(AppTier), key=self.get_sla)
+
+        self.last_shed: Counter[AppTier] = Counter()
+        """Polls shed per tier at the last scheduling."""
+
+    def get_sla(self, tier: AppTier) -> timedelta:
+        """Max age of reviews of the tier Apps. Polling interval, if not configured."""
+        return self._slas.get(tier, timedelta(seconds=self._delay))
 
     async def run(self) -> None:
         """Run the scheduler in the background."""
@@ -40,14 +86,114 @@ class SchedulerService:
         )
 
     async def process(self) -> None:
-        """Schedule review polling for all apps."""
+        """
+        Schedule review polling for all apps.
+        Apps in failure backoff are skipped, the whole cycle is skipped while the
+        upstream circuit breaker is open.
+
+        Apps polled recently enough for their tier (on user request or before restart)
+        are skipped too, so there is no re-polling storm after deploy. As well as Apps
+        with delayed polling (e.g. bulk onboarded ones), they are polled when due.
+        """
+        if self._circuit_breaker and self._circuit_breaker.state == "open":
+            logger.warning("%s. Skip scheduling: %s", self, self._circuit_breaker)
+            return
+
         logger.debug("%s. Scheduling reviews polling for all apps", self)
         apps = await self._storage.get_app_list()
+        now = datetime.now(timezone.utc)
+        self._report_freshness(apps, now)
 
+        interval = timedelta(seconds=self._delay)
+        due: list[tuple[float, schemas.App]] = []
         for app in apps:
+            sla = self.get_sla(app.tier)
+            polled_at = self._queue.get_polled_at(app.id)
+            if polled_at and polled_at > now - max(sla - interval, interval / 2):
+                logger.debug("%s. Skip recently polled app: %s", self, app.id)
+                continue
+            if self._queue.is_delayed(app.id):
+                logger.debug("%s. Skip app with delayed polling: %s", self, app.id)
+                continue
+            if self._backoff and not self._backoff.is_due(app.id):
+                logger.debug("%s. Skip app in failure backoff: %s", self, app.id)
+                continue
+
+            # deadline as monotonic time, never polled Apps are due now
+            stale_in = (polled_at + sla - now).total_seconds() if polled_at else 0.0
+            due.append((time.monotonic() + stale_in, app))
+
+        for deadline, app in sorted(
+            self._shed(due), key=lambda item: (item[0], self._rank(item[1]))
+        ):
             logger.debug("%s. Actualizing reviews for app: %s", self, app.id)
             await self.wait_available_worker()
-            self._queue.push(app.id)
+            self._queue.push(app.id, deadline=deadline)
+
+    def _shed(
+        self, due: list[tuple[float, schemas.App]]
+    ) -> list[tuple[float, schemas.App]]:
+        """
+        Polls within the backlog budget: the most important tiers are admitted first,
+        earliest deadline first within a tier. The top tier is never shed.
+        """
+        self.last_shed = Counter()
+        if self._shed_backlog is None:
+            return due
+
+        budget = self._shed_backlog - self._queue.backlog
+        admitted = []
+        for deadline, app in sorted(
+            due, key=lambda item: (self._rank(item[1]), item[0])
+        ):
+            if budget <= 0 and self._rank(app) > 0:
+                self.last_shed[app.tier] += 1
+                continue
+            budget -= 1
+            admitted.append((deadline, app))
+
+        for tier, shed in self.last_shed.items():
+            logger.warning("%s. Shed %s polls of %s tier apps", self, shed, tier)
+            POLLS_SHED.labels(tier).inc(shed)
+        return admitted
+
+    def _rank(self, app: schemas.App) -> int:
+        return self._tiers.index(app.tier)
+
+    async def get_freshness(self) -> list[schemas.TierFreshness]:
+        """Reviews freshness per App tier."""
+        apps = await self._storage.get_app_list()
+        return self._get_freshness(apps, datetime.now(timezone.utc))
+
+    def _get_freshness(
+        self, apps: list[schemas.App], now: datetime
+    ) -> list[schemas.TierFreshness]:
+        report = {
+            tier: schemas.TierFreshness(
+                tier=tier,
+                sla=self.get_sla(tier).total_seconds(),
+                apps=0,
+                lag=0.0,
+                breaches=0,
+                shed=self.last_shed[tier],
+            )
+            for tier in self._tiers
+        }
+        for app in apps:
+            freshness = report[app.tier]
+            freshness.apps += 1
+            if not (polled_at := self._queue.get_polled_at(app.id)):
+                freshness.breaches += 1
+                continue
+            lag = (now - polled_at).total_seconds()
+            freshness.lag = max(freshness.lag, lag)
+            freshness.breaches += lag > freshness.sla
+        return list(report.values())
+
+    def _report_freshness(self, apps: list[schemas.App], now: datetime) -> None:
+        for freshness in self._get_freshness(apps, now):
+            FRESHNESS_LAG.labels(freshness.tier).set(freshness.lag)
+            SLA_BREACHES.labels(freshness.tier).set(freshness.breaches)
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}()"
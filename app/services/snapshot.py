@@ -0,0 +1,308 @@
+"""
+Binary storage snapshot format.
+
+Layout (little-endian):
+
+    header:  MAGIC | version u8 | compression u8
+    payload: records, compressed as a whole (optionally)
+    record:  kind u8 | length u64 | body
+
+App record body is the App JSON, watermarks record body is JSON of the App retention
+watermarks. Reviews record body is a column oriented block of all reviews of a
+single App:
+
+    app_id i64 | count u32
+    updated_us i64[count] | utc_offset_s i32[count] | score i8[count]
+    digest 16B[count]
+    text_lengths u32[count * 5]  (id, title, content, author, country in chars)
+    text utf-8
+
+So reviews are restored without JSON parsing and hashing, and per App aggregates
+are built from the columns at once. Review models are built from the block lazily,
+on the first access to the App reviews; until then the block is written to the next
+snapshot as is.
+"""
+
+import json
+import struct
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from functools import cached_property
+from typing import Iterable, Literal
+
+import numpy as np
+from pydantic import TypeAdapter
+
+from app.common import base_schemas as schemas
+from app.common.base_schemas import AppID, ReviewId
+
+try:  # optional dependency: `compression` extra
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+_REVIEWS_ADAPTER = TypeAdapter(list[schemas.Review])
+
+SnapshotCompression = Literal["none", "zlib", "zstd"]
+
+MAGIC = b"ASRV\x00SNP"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sBB")
+_RECORD = struct.Struct("<BQ")
+_BLOCK = struct.Struct("<qI")
+
+_KIND_APP = 1
+_KIND_REVIEWS = 2
+_KIND_WATERMARKS = 3
+
+_COMPRESSION_IDS: dict[SnapshotCompression, int] = {"none": 0, "zlib": 1, "zstd": 2}
+_COMPRESSION_NAMES = {v: k for k, v in _COMPRESSION_IDS.items()}
+
+_REVIEW_TEXTS = ("id", "title", "content", "author", "country")
+_DIGEST_SIZE = 16
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+@dataclass
+class ReviewsBlock:
+    app_id: AppID
+    ids: list[ReviewId]
+    digests: list[bytes]
+    epochs: np.ndarray
+    """Reviews updated time, seconds since epoch (int64)."""
+    scores: np.ndarray
+    """Reviews scores (int8)."""
+    body: bytes
+    """Encoded block, it's never changed."""
+
+    @cached_property
+    def reviews(self) -> list[schemas.Review]:
+        """Review models, built on the first access."""
+        return _decode_reviews(self.body)
+
+    def select(self, indices: list[int]) -> list[schemas.Review]:
+        """Review models of the given rows only."""
+        if "reviews" in vars(self):
+            return [self.reviews[idx] for idx in indices]
+        return _decode_reviews(self.body, indices)
+
+
+@dataclass
+class Snapshot:
+    apps: list[schemas.App]
+    blocks: list[ReviewsBlock]
+    watermarks: dict[AppID, datetime] = field(default_factory=dict)
+    """Retention watermarks of the apps, see `StorageService.is_expired`."""
+
+
+def is_snapshot(content: bytes) -> bool:
+    return content.startswith(MAGIC)
+
+
+def encode_snapshot(
+    apps: Iterable[schemas.App],
+    reviews: dict[AppID, Iterable[schemas.Review] | ReviewsBlock],
+    digests: dict[str, bytes],
+    *,
+    watermarks: dict[AppID, datetime] | None = None,
+    compression: SnapshotCompression = "none",
+) -> bytes:
+    chunks: list[bytes] = []
+    for app in apps:
+        _append_record(chunks, _KIND_APP, app.model_dump_json().encode())
+    if watermarks:
+        body = {app_id: updated.isoformat() for app_id, updated in watermarks.items()}
+        _append_record(chunks, _KIND_WATERMARKS, json.dumps(body).encode())
+    for app_id, app_reviews in reviews.items():
+        if isinstance(app_reviews, ReviewsBlock):
+            body = app_reviews.body  # restored block of unchanged reviews
+        else:
+            body = _encode_block(app_id, list(app_reviews), digests)
+        _append_record(chunks, _KIND_REVIEWS, body)
+
+    payload = b"".join(chunks)
+    if compression == "zlib":
+        payload = zlib.compress(payload, 1)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise SnapshotError("zstd compression requires `zstandard` package")
+        payload = zstandard.compress(payload, 3)
+
+    header = _HEADER.pack(MAGIC, VERSION, _COMPRESSION_IDS[compression])
+    return header + payload
+
+
+def decode_snapshot(content: bytes) -> Snapshot:
+    magic, version, compression_id = _HEADER.unpack_from(content)
+    if magic != MAGIC:
+        raise SnapshotError("Not a storage snapshot")
+    if version != VERSION:
+        raise SnapshotError(f"Unsupported snapshot version: {version}")
+
+    payload = memoryview(content)[_HEADER.size :]
+    match _COMPRESSION_NAMES.get(compression_id):
+        case "none":
+            pass
+        case "zlib":
+            payload = memoryview(zlib.decompress(payload))
+        case "zstd":
+            if zstandard is None:
+                raise SnapshotError("zstd snapshot requires `zstandard` package")
+            payload = memoryview(zstandard.decompress(payload))
+        case _:
+            raise SnapshotError(f"Unknown snapshot compression: {compression_id}")
+
+    snapshot = Snapshot(apps=[], blocks=[])
+    offset = 0
+    while offset < len(payload):
+        kind, length = _RECORD.unpack_from(payload, offset)
+        offset += _RECORD.size
+        body = payload[offset : offset + length]
+        offset += length
+        if kind == _KIND_APP:
+            snapshot.apps.append(schemas.App.model_validate_json(bytes(body)))
+        elif kind == _KIND_REVIEWS:
+            snapshot.blocks.append(_decode_block(body))
+        elif kind == _KIND_WATERMARKS:
+            snapshot.watermarks = {
+                int(app_id): datetime.fromisoformat(updated)
+                for app_id, updated in json.loads(bytes(body)).items()
+            }
+        # unknown records (of newer versions) are skipped
+
+    return snapshot
+
+
+def _append_record(chunks: list[bytes], kind: int, body: bytes) -> None:
+    chunks.append(_RECORD.pack(kind, len(body)))
+    chunks.append(body)
+
+
+def _encode_block(
+    app_id: AppID, reviews: list[schemas.Review], digests: dict[str, bytes]
+) -> bytes:
+    updated = [review.updated for review in reviews]
+    offsets = [
+        int(value.utcoffset().total_seconds())  # type: ignore[union-attr]
+        for value in updated
+    ]
+    texts = [getattr(review, name) for review in reviews for name in _REVIEW_TEXTS]
+    return b"".join(
+        (
+            _BLOCK.pack(app_id, len(reviews)),
+            np.array(
+                [(value - _EPOCH) // timedelta(microseconds=1) for value in updated],
+                dtype="<i8",
+            ).tobytes(),
+            np.array(offsets, dtype="<i4").tobytes(),
+            np.array([review.score for review in reviews], dtype="i1").tobytes(),
+            b"".join(digests[review.id] for review in reviews),
+            np.array([len(text) for text in texts], dtype="<u4").tobytes(),
+            "".join(texts).encode(),
+        )
+    )
+
+
+@dataclass
+class _BlockColumns:
+    app_id: AppID
+    updated_us: np.ndarray
+    offsets: np.ndarray
+    scores: np.ndarray
+    digests: bytes
+    bounds: np.ndarray
+    """Start of every text and the end of the last one, in chars."""
+    text: str
+
+
+def _read_block(body: bytes) -> _BlockColumns:
+    app_id, count = _BLOCK.unpack_from(body)
+    offset = _BLOCK.size
+
+    def column(dtype: str, size: int) -> np.ndarray:
+        nonlocal offset
+        values = np.frombuffer(body, dtype=dtype, count=size, offset=offset)
+        offset += values.nbytes
+        return values
+
+    updated_us = column("<i8", count)
+    offsets = column("<i4", count)
+    scores = column("i1", count)
+    digests = body[offset : offset + count * _DIGEST_SIZE]
+    offset += count * _DIGEST_SIZE
+    lengths = column("<u4", count * len(_REVIEW_TEXTS))
+    bounds = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=bounds[1:])
+    return _BlockColumns(
+        app_id=app_id,
+        updated_us=updated_us,
+        offsets=offsets,
+        scores=scores,
+        digests=digests,
+        bounds=bounds,
+        text=str(body[offset:], "utf-8"),
+    )
+
+
+def _decode_block(body: memoryview) -> ReviewsBlock:
+    """Decode everything but review models, which are built on demand."""
+    body = bytes(body)
+    columns = _read_block(body)
+    starts = columns.bounds[: -1 : len(_REVIEW_TEXTS)].tolist()
+    ends = columns.bounds[1 :: len(_REVIEW_TEXTS)].tolist()
+    text, digests = columns.text, columns.digests
+    return ReviewsBlock(
+        app_id=columns.app_id,
+        ids=[text[start:end] for start, end in zip(starts, ends)],
+        digests=[
+            digests[idx : idx + _DIGEST_SIZE]
+            for idx in range(0, len(digests), _DIGEST_SIZE)
+        ],
+        epochs=columns.updated_us // 1_000_000,
+        scores=columns.scores,
+        body=body,
+    )
+
+
+def _decode_reviews(
+    body: bytes, indices: list[int] | None = None
+) -> list[schemas.Review]:
+    columns = _read_block(body)
+    app_id, text, bounds = columns.app_id, columns.text, columns.bounds.tolist()
+    texts = iter([text[start:end] for start, end in zip(bounds, bounds[1:])])
+    values = list(
+        zip(
+            columns.updated_us.tolist(),
+            columns.offsets.tolist(),
+            columns.scores.tolist(),
+            *[texts] * len(_REVIEW_TEXTS),
+        )
+    )
+    if indices is not None:
+        values = [values[idx] for idx in indices]
+    zones: dict[int, timezone] = {}
+    rows = []
+    for us, utc_offset, score, review_id, title, content, author, country in values:
+        if (tz := zones.get(utc_offset)) is None:
+            tz = zones[utc_offset] = timezone(timedelta(seconds=utc_offset))
+        updated = datetime.fromtimestamp(us // 1_000_000, tz)
+        rows.append(
+            {
+                "id": review_id,
+                "app_id": app_id,
+                "title": title,
+                "content": content,
+                "author": author,
+                "score": score,
+                "updated": updated.replace(microsecond=us % 1_000_000),
+                "country": country,
+            }
+        )
+    # NOTE: strict validation of python values is cheaper than `model_construct`
+    return _REVIEWS_ADAPTER.validate_python(rows, strict=True)
@@ -1,33 +1,339 @@
 import asyncio
+import hashlib
+import heapq
 import logging
-from datetime import datetime
+import uuid
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from functools import cached_property
+from itertools import count
+from operator import attrgetter
 from pathlib import Path
+from types import MappingProxyType
+from typing import Literal, Mapping
 
-from pydantic import BaseModel
+import numpy as np
+from pydantic import AwareDatetime, BaseModel
 
 from app.common import base_schemas as schemas
-from app.common.base_schemas import AppID, ReviewId
+from app.common.base_schemas import (
+    AppID,
+    Country,
+    ReviewId,
+    ReviewsSort,
+    TimeBucket,
+)
+from app.common.metrics import REGISTRY
+from app.services.analytics import ReviewsTimeSeries, compute_timeseries
+from app.services.snapshot import (
+    ReviewsBlock,
+    Snapshot,
+    SnapshotCompression,
+    decode_snapshot,
+    encode_snapshot,
+    is_snapshot,
+)
 
 logger = logging.getLogger(__name__)
 
+STORAGE_WRITE = REGISTRY.histogram(
+    "storage_write_seconds", "Time to serialize and persist the storage file."
+)
+STORAGE_QUERY_PLANS = REGISTRY.counter(
+    "storage_query_plans_total", "Reviews queries by the chosen index.", ("index",)
+)
+
+StorageFormat = Literal["json", "binary"]
+
 
 class Storage(BaseModel):
     apps: dict[AppID, schemas.App] = {}
     reviews: dict[ReviewId, schemas.Review] = {}
+    """Storage file content only, reviews are kept in per App snapshots."""
+    watermarks: dict[AppID, AwareDatetime] = {}
+    """Reviews updated not later than that are removed by retention policy."""
+
+
+def review_digest(
+    title: str, content: str, author: str, score: int, updated: datetime
+) -> bytes:
+    """Content hash of the review fields, used to detect changed reviews on ingest."""
+    data = "\x1f".join((title, content, author, str(score), str(updated.timestamp())))
+    return hashlib.blake2b(data.encode(), digest_size=16).digest()
+
+
+class ReviewsAggregate:
+    """
+    Running aggregates over reviews of a single App.
+
+    Updated incrementally on every review upsert, so stats are never computed by
+    scanning the storage.
+    """
+
+    SCORES = range(1, 6)
+    DAY_SECONDS = 24 * 60 * 60
+    EPOCH_DATE = date(1970, 1, 1)
+
+    def __init__(self) -> None:
+        self._count = 0
+        self._score_sum = 0
+        self._histogram: Counter[int] = Counter()
+        self._daily: Counter[date] = Counter()
+
+    def add(self, review: schemas.Review) -> None:
+        self._count += 1
+        self._score_sum += review.score
+        self._histogram[review.score] += 1
+        self._daily[self._day(review)] += 1
+
+    def add_columns(self, epochs: np.ndarray, scores: np.ndarray) -> None:
+        """Add many reviews given by updated epoch seconds and scores at once."""
+        self._count += len(scores)
+        self._score_sum += int(scores.sum(dtype=np.int64))
+        for score, count in enumerate(np.bincount(scores).tolist()):
+            if count:
+                self._histogram[score] += count
+        days, counts = np.unique(epochs // self.DAY_SECONDS, return_counts=True)
+        for day, count in zip(days.tolist(), counts.tolist()):
+            self._daily[self.EPOCH_DATE + timedelta(days=day)] += count
+
+    def discard(self, review: schemas.Review) -> None:
+        self._count -= 1
+        self._score_sum -= review.score
+        self._histogram[review.score] -= 1
+        day = self._day(review)
+        self._daily[day] -= 1
+        if not self._daily[day]:
+            del self._daily[day]
+
+    def build(self, app_id: AppID) -> schemas.AppStats:
+        return schemas.AppStats(
+            app_id=app_id,
+            count=self._count,
+            mean_score=self._score_sum / self._count if self._count else None,
+            histogram={score: self._histogram[score] for score in self.SCORES},
+            daily=dict(sorted(self._daily.items())),
+        )
+
+    @staticmethod
+    def _day(review: schemas.Review) -> date:
+        return review.updated.astimezone(timezone.utc).date()
+
+
+_updated = attrgetter("updated")
+_score = attrgetter("score")
+
+
+@dataclass(frozen=True)
+class ReviewsQuery:
+    """Filters (all of them must match) and ordering of the App reviews."""
+
+    updated_min: datetime | None = None
+    updated_max: datetime | None = None
+    country: Country | None = None
+    score_in: frozenset[int] | None = None
+    author: str | None = None
+    sort: ReviewsSort = "newest"
+
+    @property
+    def is_default(self) -> bool:
+        return self == _DEFAULT_QUERY
+
+
+_DEFAULT_QUERY = ReviewsQuery()
+
+
+class AppReviews:
+    """
+    Immutable versioned snapshot of reviews of a single App.
+
+    Writers never mutate a published snapshot, they build the next version and
+    replace it at once. So readers work on a consistent snapshot without locks, in
+    the event loop or in another thread. Derived indexes are built lazily, once per
+    snapshot.
+
+    All indexes are postings in order of update: the whole App, storefronts, scores
+    and authors. So the updated time range is applied to any of them by bisection
+    and the query is executed over the most selective one.
+
+    Snapshot restored from the binary storage block builds review models on the
+    first access to them (see `ReviewsBlock`).
+    """
+
+    def __init__(
+        self, version: int, reviews: dict[ReviewId, schemas.Review] | ReviewsBlock
+    ) -> None:
+        self.version = version
+        self.block = reviews if isinstance(reviews, ReviewsBlock) else None
+        self._source = reviews
+        self._size = len(reviews.ids if isinstance(reviews, ReviewsBlock) else reviews)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @cached_property
+    def reviews(self) -> Mapping[ReviewId, schemas.Review]:
+        # NOTE: concurrent readers of the fresh block might build the models twice,
+        # both are equal, so it's harmless
+        if isinstance(source := self._source, ReviewsBlock):
+            return MappingProxyType(dict(zip(source.ids, source.reviews)))
+        return MappingProxyType(source)
+
+    @cached_property
+    def ordered(self) -> list[schemas.Review]:
+        """Reviews in order of update, the oldest first."""
+        return sorted(self.reviews.values(), key=_updated)
+
+    @cached_property
+    def countries(self) -> dict[Country, list[schemas.Review]]:
+        """Reviews of every storefront in order of update."""
+        return self._group_by(attrgetter("country"))
+
+    @cached_property
+    def scores(self) -> dict[int, list[schemas.Review]]:
+        """Reviews of every score in order of update."""
+        return self._group_by(_score)
+
+    @cached_property
+    def authors(self) -> dict[str, list[schemas.Review]]:
+        """Reviews of every author in order of update."""
+        return self._group_by(attrgetter("author"))
+
+    def _group_by(self, key: attrgetter) -> dict:
+        groups: defaultdict[object, list[schemas.Review]] = defaultdict(list)
+        for review in self.ordered:
+            groups[key(review)].append(review)
+        return dict(groups)
+
+    def select(self, query: ReviewsQuery = _DEFAULT_QUERY) -> list[schemas.Review]:
+        """Reviews matching the query, the most recent first by default."""
+        index, postings = self._plan(query)
+        STORAGE_QUERY_PLANS.labels(index).inc()
+        if len(postings) == 1:
+            reviews: list[schemas.Review] = postings[0]
+        else:
+            reviews = list(heapq.merge(*postings, key=_updated))
+
+        # the chosen index predicate holds already, check the rest ones
+        checks = []
+        if query.country and index != "country":
+            checks.append(lambda review: review.country == query.country)
+        if query.author is not None and index != "author":
+            checks.append(lambda review: review.author == query.author)
+        if (scores := query.score_in) is not None and index != "score":
+            checks.append(lambda review: review.score in scores)
+        if checks:
+            reviews = [review for review in reviews if all(c(review) for c in checks)]
+
+        match query.sort:
+            case "oldest":
+                return reviews
+            case "highest":
+                return sorted(reviews[::-1], key=_score, reverse=True)
+            case "lowest":
+                return sorted(reviews[::-1], key=_score)
+        return reviews[::-1]
+
+    def _plan(self, query: ReviewsQuery) -> tuple[str, list[list[schemas.Review]]]:
+        """
+        Choose the index with the least number of reviews in the updated time range.
+        Return the index name and its postings (several ones for scores) in the range.
+        """
+        plans = [("updated", [self.ordered])]
+        if query.country:
+            plans.append(("country", [self.countries.get(query.country, [])]))
+        if query.author is not None:
+            plans.append(("author", [self.authors.get(query.author, [])]))
+        if query.score_in is not None:
+            plans.append(
+                ("score", [self.scores.get(score, []) for score in query.score_in])
+            )
+
+        best: tuple[str, list[list[schemas.Review]]] | None = None
+        best_size = 0
+        for index, postings in plans:
+            ranged = [self._slice(reviews, query) for reviews in postings]
+            size = sum(len(reviews) for reviews in ranged)
+            if best is None or size < best_size:
+                best, best_size = (index, ranged), size
+        return best  # type: ignore[return-value]
+
+    @staticmethod
+    def _slice(reviews: list[schemas.Review], query: ReviewsQuery) -> list:
+        start, end = 0, len(reviews)
+        if query.updated_min is not None:
+            start = bisect_left(reviews, query.updated_min, key=_updated)
+        if query.updated_max is not None:
+            end = bisect_right(reviews, query.updated_max, key=_updated)
+        if (start, end) == (0, len(reviews)):
+            return reviews
+        return reviews[start:end]
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(v{self.version}, {len(self)} reviews)"
+
+
+EMPTY_APP_REVIEWS = AppReviews(0, {})
 
 
 class StorageService:
-    """Simple file based persistence service."""
+    """
+    Simple file based persistence service.
 
-    def __init__(self, path: Path) -> None:
+    Storage file is written as JSON or binary snapshot, load detects the format.
+    Reviews are served from per App copy-on-write snapshots (see `AppReviews`),
+    reads of large Apps are offloaded to a thread.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        format: StorageFormat = "json",
+        compression: SnapshotCompression = "none",
+        offload_size: int = 10_000,
+    ) -> None:
         self._storage = Storage()
+        self._snapshots: dict[AppID, AppReviews] = {}
+        # NOTE: versions are never reused within a process, the counter restarts
+        # on reload, so together with the per boot `epoch` any version seen by a
+        # reader identifies the content of the App reviews
+        self._version_counter = count(1)
+        self.epoch = uuid.uuid4().hex[:8]
+        self._offload_size = offload_size
+        self._digests: dict[ReviewId, bytes] = {}
+        self._review_apps: dict[ReviewId, AppID] = {}
+        self._stats: defaultdict[AppID, ReviewsAggregate] = defaultdict(
+            ReviewsAggregate
+        )
+        self._timeseries = ReviewsTimeSeries()
         self._path = path
+        self._format = format
+        self._compression = compression
 
     async def create_app(self, app: schemas.App):
         logger.debug("Creating app: %s", app)
         self._storage.apps[app.id] = app
         await self.write()
 
+    async def create_apps(self, apps: list[schemas.App]) -> list[schemas.App]:
+        """
+        Create many apps with a single write. Existing apps are kept as is.
+        Return only newly created ones.
+        """
+        logger.debug("Creating apps: %s", len(apps))
+        created = []
+        for app in apps:
+            if app.id not in self._storage.apps:
+                self._storage.apps[app.id] = app
+                created.append(app)
+
+        if created:
+            await self.write()
+        return created
+
     async def get_app(self, app_id: AppID) -> schemas.App | None:
         logger.debug("Getting app: %s", app_id)
         return self._storage.apps.get(app_id)
@@ -36,37 +342,278 @@ class StorageService:
         logger.debug("Getting apps")
         return list(self._storage.apps.values())
 
-    async def create_reviews(self, reviews: list[schemas.Review]):
+    async def create_reviews(
+        self, reviews: list[schemas.Review], digests: list[bytes] | None = None
+    ) -> list[schemas.Review]:
+        """
+        Upsert reviews. Return only newly inserted ones.
+        Reviews identical to the stored ones are skipped and do not trigger write.
+        Reviews expired by retention policy (see `set_retention_watermark`) are
+        skipped as well. Content hashes of the reviews are computed unless given.
+        """
         logger.debug("Creating reviews: %s", len(reviews))
-        for review in reviews:
-            self._storage.reviews[review.id] = review
-        await self.write()
+        inserted: list[schemas.Review] = []
+        upserted: dict[ReviewId, schemas.Review] = {}
+        if digests is None:
+            digests = [self._review_digest(review) for review in reviews]
+        for review, digest in zip(reviews, digests, strict=True):
+            if self._digests.get(review.id) == digest or self.is_expired(review):
+                continue
+
+            # re-ingest of an existing review replaces its contribution to the stats
+            if previous := upserted.get(review.id) or self._find_review(review.id):
+                self._stats[previous.app_id].discard(previous)
+            else:
+                inserted.append(review)
+            self._review_apps[review.id] = review.app_id
+            self._digests[review.id] = digest
+            self._stats[review.app_id].add(review)
+            upserted[review.id] = review
+
+        if upserted:
+            self._publish(list(upserted.values()), [])
+            self._timeseries.upsert(upserted.values())
+            await self.write()
+        return inserted
+
+    async def delete_reviews(self, review_ids: list[ReviewId]) -> int:
+        """
+        Remove reviews from the memory. Return number of removed ones.
+        NOTE: it's not persisted, call `write` after that (once for many deletes).
+        """
+        logger.debug("Deleting reviews: %s", len(review_ids))
+        removed: list[schemas.Review] = []
+        for review_id in review_ids:
+            if not (review := self._find_review(review_id)):
+                continue
+            del self._review_apps[review.id]
+            del self._digests[review.id]
+            self._stats[review.app_id].discard(review)
+            removed.append(review)
+
+        if removed:
+            self._publish([], removed)
+            self._timeseries.discard(removed)
+        return len(removed)
+
+    def set_retention_watermark(self, app_id: AppID, updated: datetime) -> None:
+        """
+        Mark the App reviews updated not later than that as removed by retention
+        policy, so they are not ingested again. Watermark is never moved back.
+        NOTE: it's not persisted, call `write` after that.
+        """
+        current = self._storage.watermarks.get(app_id)
+        if current is None or updated > current:
+            self._storage.watermarks[app_id] = updated
+
+    def get_retention_watermark(self, app_id: AppID) -> datetime | None:
+        return self._storage.watermarks.get(app_id)
+
+    def is_expired(self, review: schemas.Review) -> bool:
+        watermark = self._storage.watermarks.get(review.app_id)
+        return watermark is not None and review.updated <= watermark
+
+    def _publish(
+        self, upserted: list[schemas.Review], removed: list[schemas.Review]
+    ) -> None:
+        """Build and publish the next snapshot of every changed App."""
+        changes: defaultdict[AppID, dict[ReviewId, schemas.Review | None]] = (
+            defaultdict(dict)
+        )
+        for review in removed:
+            changes[review.app_id][review.id] = None
+        for review in upserted:
+            changes[review.app_id][review.id] = review
+
+        for app_id, app_changes in changes.items():
+            reviews = dict(self.get_app_reviews(app_id).reviews)
+            for review_id, change in app_changes.items():
+                if change is None:
+                    reviews.pop(review_id, None)
+                else:
+                    reviews[review_id] = change
+            self._set_app_reviews(app_id, reviews)
+
+    def _set_app_reviews(
+        self, app_id: AppID, reviews: dict[ReviewId, schemas.Review] | ReviewsBlock
+    ) -> None:
+        snapshot = AppReviews(next(self._version_counter), reviews)
+        if len(snapshot):
+            self._snapshots[app_id] = snapshot
+        else:
+            self._snapshots.pop(app_id, None)
+
+    def get_app_reviews(self, app_id: AppID) -> AppReviews:
+        """Current snapshot of the App reviews. Safe to read in any thread."""
+        return self._snapshots.get(app_id, EMPTY_APP_REVIEWS)
+
+    def get_app_version(self, app_id: AppID) -> int:
+        """Version of the App reviews. Used to invalidate derived caches."""
+        return self.get_app_reviews(app_id).version
+
+    async def get_review_digests(
+        self, review_ids: list[ReviewId]
+    ) -> dict[ReviewId, bytes]:
+        """Content hashes of the stored reviews. Unknown review ids are omitted."""
+        return {
+            review_id: digest
+            for review_id in review_ids
+            if (digest := self._digests.get(review_id))
+        }
+
+    @staticmethod
+    def _review_digest(review: schemas.Review) -> bytes:
+        return review_digest(
+            review.title, review.content, review.author, review.score, review.updated
+        )
 
     async def get_review(self, review_id: ReviewId) -> schemas.Review | None:
         logger.debug("Getting review: %s", review_id)
-        return self._storage.reviews.get(review_id)
+        return self._find_review(review_id)
+
+    def _find_review(self, review_id: ReviewId) -> schemas.Review | None:
+        if (app_id := self._review_apps.get(review_id)) is None:
+            return None
+        return self.get_app_reviews(app_id).reviews.get(review_id)
 
     async def get_review_list(
-        self, app_id: AppID, *, updated_min: datetime | None = None
+        self,
+        app_id: AppID,
+        *,
+        updated_min: datetime | None = None,
+        country: Country | None = None,
     ) -> list[schemas.Review]:
         logger.debug("Getting reviews for app: %s", app_id)
-        filtered = [
-            review
-            for review in self._storage.reviews.values()
-            if review.app_id == app_id
-            and (updated_min is None or review.updated >= updated_min)
-        ]
-        return list(reversed(sorted(filtered, key=lambda x: x.updated)))
-
-    async def load(self) -> None:
-        if not self._path.exists():
+        return await self.select_reviews(
+            self.get_app_reviews(app_id),
+            ReviewsQuery(updated_min=updated_min, country=country),
+        )
+
+    async def get_review_lists(
+        self, app_ids: list[AppID], *, updated_min: datetime | None = None
+    ) -> dict[AppID, list[schemas.Review]]:
+        logger.debug("Getting reviews for apps: %s", len(app_ids))
+        return {
+            app_id: await self.select_reviews(
+                self.get_app_reviews(app_id), ReviewsQuery(updated_min=updated_min)
+            )
+            for app_id in app_ids
+        }
+
+    async def select_reviews(
+        self, snapshot: AppReviews, query: ReviewsQuery
+    ) -> list[schemas.Review]:
+        """Query reviews of the snapshot, in a thread if the snapshot is large."""
+        if not self.is_offloaded(snapshot):
+            return snapshot.select(query)
+        return await asyncio.to_thread(snapshot.select, query)
+
+    def is_offloaded(self, snapshot: AppReviews) -> bool:
+        """Whether processing of the snapshot reviews should run in a thread."""
+        return len(snapshot) >= self._offload_size
+
+    def get_app_ids_with_reviews(self) -> list[AppID]:
+        return list(self._snapshots.keys())
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    async def get_app_stats(self, app_id: AppID) -> schemas.AppStats:
+        logger.debug("Getting stats for app: %s", app_id)
+        if aggregate := self._stats.get(app_id):
+            return aggregate.build(app_id)
+        return ReviewsAggregate().build(app_id)
+
+    async def get_app_timeseries(
+        self, app_ids: list[AppID], *, bucket: TimeBucket, window: int
+    ) -> list[schemas.AppTimeSeries]:
+        logger.debug("Getting timeseries for apps: %s", app_ids)
+        columns = self._timeseries.collect(app_ids)
+        if len(columns) < self._offload_size:
+            return compute_timeseries(columns, bucket=bucket, window=window)
+        return await asyncio.to_thread(
+            compute_timeseries, columns, bucket=bucket, window=window
+        )
+
+    async def load(self, path: Path | None = None) -> None:
+        """Load storage file (or another file, e.g. snapshot to import) of any format."""
+        path = path or self._path
+        if not path.exists():
             return
 
-        content = self._path.read_text()
-        if content == "":
+        content = path.read_bytes()
+        if content == b"":
             return
 
-        self._storage = Storage.model_validate_json(content)
+        self._clear()
+        if is_snapshot(content):
+            self._restore_snapshot(decode_snapshot(content))
+            return
+
+        storage = Storage.model_validate_json(content)
+        self._storage = storage.model_copy(update={"reviews": {}})
+        apps: defaultdict[AppID, dict[ReviewId, schemas.Review]] = defaultdict(dict)
+        for review in storage.reviews.values():
+            apps[review.app_id][review.id] = review
+            self._review_apps[review.id] = review.app_id
+            self._digests[review.id] = self._review_digest(review)
+            self._stats[review.app_id].add(review)
+        for app_id, reviews in apps.items():
+            self._set_app_reviews(app_id, reviews)
+        self._timeseries.upsert(storage.reviews.values())
+
+    def _restore_snapshot(self, snapshot: Snapshot) -> None:
+        self._storage.apps = {app.id: app for app in snapshot.apps}
+        self._storage.watermarks = snapshot.watermarks
+        for block in snapshot.blocks:
+            self._set_app_reviews(block.app_id, block)
+            self._review_apps.update(dict.fromkeys(block.ids, block.app_id))
+            self._digests.update(zip(block.ids, block.digests))
+            self._stats[block.app_id].add_columns(block.epochs, block.scores)
+            self._timeseries.extend(block.app_id, block.ids, block.epochs, block.scores)
+
+    def _clear(self) -> None:
+        self._storage = Storage()
+        self._snapshots.clear()
+        self._digests.clear()
+        self._review_apps.clear()
+        self._stats.clear()
+        self._timeseries.clear()
 
     async def write(self) -> None:
-        await asyncio.to_thread(self._path.write_text, self._storage.model_dump_json())
+        with STORAGE_WRITE.time():
+            if self._format == "binary":
+                content = self._dump_snapshot(self._compression)
+            else:
+                content = self._dump_json()
+            await asyncio.to_thread(self._path.write_bytes, content)
+
+    async def export_snapshot(
+        self, path: Path, *, compression: SnapshotCompression = "none"
+    ) -> int:
+        """Write binary snapshot of the storage. Return its size in bytes."""
+        content = self._dump_snapshot(compression)
+        await asyncio.to_thread(path.write_bytes, content)
+        return len(content)
+
+    def _dump_json(self) -> bytes:
+        reviews = {
+            review_id: review
+            for snapshot in self._snapshots.values()
+            for review_id, review in snapshot.reviews.items()
+        }
+        storage = self._storage.model_copy(update={"reviews": reviews})
+        return storage.model_dump_json().encode()
+
+    def _dump_snapshot(self, compression: SnapshotCompression) -> bytes:
+        return encode_snapshot(
+            self._storage.apps.values(),
+            {
+                app_id: snapshot.block or snapshot.reviews.values()
+                for app_id, snapshot in self._snapshots.items()
+            },
+            self._digests,
+            watermarks=self._storage.watermarks,
+            compression=compression,
+        )
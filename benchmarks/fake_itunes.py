@@ -0,0 +1,148 @@
+import asyncio
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import click
+import uvicorn
+from fastapi import FastAPI, HTTPException, status
+
+
+@dataclass(frozen=True)
+class FakeFeedConfig:
+    """Synthetic iTunes RSS feed configuration."""
+
+    reviews_per_app: int = 500
+    page_size: int = 50
+    latency: float = 0.0
+    """Response delay in seconds."""
+    error_rate: float = 0.0
+    """Probability of 503 response, from 0 to 1."""
+    history: timedelta = timedelta(days=5)
+    """Time span of generated reviews, counted back from the start time."""
+    seed: int = 0
+
+
+class FakeItunesFeed:
+    """Deterministic synthetic paginated reviews feed in iTunes RSS format."""
+
+    MAX_PAGES = 10
+
+    def __init__(self, config: FakeFeedConfig) -> None:
+        self.config = config
+        self.started_at = datetime.now(timezone.utc)
+        self._errors = random.Random(config.seed)
+
+    def should_fail(self) -> bool:
+        return self._errors.random() < self.config.error_rate
+
+    def entries(self, app_id: int, page: int) -> list[dict[str, Any]]:
+        first = (page - 1) * self.config.page_size
+        last = min(first + self.config.page_size, self.config.reviews_per_app)
+        step = self.config.history / max(self.config.reviews_per_app, 1)
+        rnd = random.Random(hash((self.config.seed, app_id, page)))
+
+        return [
+            self.entry(
+                review_id=idx,
+                score=rnd.randint(1, 5),
+                updated=self.started_at - step * idx,
+                words=rnd.randint(5, 80),
+            )
+            for idx in range(first, last)
+        ]
+
+    @staticmethod
+    def entry(
+        *, review_id: int, score: int, updated: datetime, words: int
+    ) -> dict[str, Any]:
+        return {
+            "author": {
+                "uri": {"label": f"https://itunes.apple.com/us/reviews/id{review_id}"},
+                "name": {"label": f"user_{review_id}"},
+                "label": "",
+            },
+            "updated": {"label": updated.isoformat()},
+            "im:rating": {"label": str(score)},
+            "im:version": {"label": "1.0.0"},
+            "id": {"label": str(review_id)},
+            "title": {"label": f"Review {review_id}"},
+            "content": {
+                "label": " ".join(["lorem"] * words),
+                "attributes": {"type": "text"},
+            },
+            "link": {"attributes": {"rel": "related", "href": ""}},
+            "im:voteSum": {"label": "0"},
+            "im:contentType": {
+                "attributes": {"term": "Application", "label": "Application"}
+            },
+            "im:voteCount": {"label": "0"},
+        }
+
+    def page(self, app_id: int, page: int) -> dict[str, Any]:
+        return {
+            "feed": {
+                "author": {"name": _label("iTunes Store"), "uri": _label("")},
+                "entry": self.entries(app_id, page),
+                "updated": _label(self.started_at.isoformat()),
+                "rights": _label(""),
+                "title": _label("iTunes Store: Customer Reviews"),
+                "icon": _label(""),
+                "link": [{"attributes": {"rel": "self", "href": ""}}],
+                "id": _label(f"{app_id}"),
+            }
+        }
+
+
+def _label(value: str) -> dict[str, str]:
+    return {"label": value}
+
+
+def build_app(config: FakeFeedConfig) -> FastAPI:
+    """Local stand-in for the iTunes RSS customer reviews server."""
+    app = FastAPI(title="Fake iTunes RSS")
+    feed = FakeItunesFeed(config)
+
+    @app.get(
+        "/{country}/rss/customerreviews/id={app_id}/sortBy={sort_by}/page={page}/json"
+    )
+    async def get_reviews(country: str, app_id: int, sort_by: str, page: int):
+        if config.latency:
+            await asyncio.sleep(config.latency)
+        if feed.should_fail():
+            raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE)
+        if page > feed.MAX_PAGES:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST)
+        return feed.page(app_id, page)
+
+    return app
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1")
+@click.option("--port", default=9000)
+@click.option("--reviews-per-app", default=FakeFeedConfig.reviews_per_app)
+@click.option("--latency", default=FakeFeedConfig.latency, help="Seconds.")
+@click.option("--error-rate", default=FakeFeedConfig.error_rate)
+@click.option("--seed", default=FakeFeedConfig.seed)
+def main(
+    host: str,
+    port: int,
+    reviews_per_app: int,
+    latency: float,
+    error_rate: float,
+    seed: int,
+) -> None:
+    """Run fake iTunes RSS server as a standalone HTTP server."""
+    config = FakeFeedConfig(
+        reviews_per_app=reviews_per_app,
+        latency=latency,
+        error_rate=error_rate,
+        seed=seed,
+    )
+    uvicorn.run(build_app(config), host=host, port=port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+import asyncio
+import json
+import logging
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+import click
+import httpx
+from asgi_lifespan import LifespanManager
+from fastapi import FastAPI
+
+from app.api.responses import PydanticJSONResponse
+from app.common import base_schemas as schemas
+from app.config import AppSettings
+from app.integration.itunes.adapter import ItunesRSSAdapter
+from app.main import setup
+from app.services.polling import DataPollingWorker
+from app.services.pubsub import ReviewsHub
+from app.services.queue import DataPollingQueue
+from app.services.snapshot import SnapshotCompression
+from app.services.storage import StorageService
+from benchmarks.fake_itunes import FakeFeedConfig, build_app
+
+logger = logging.getLogger("benchmarks")
+
+FAKE_ITUNES_URL = "http://fake-itunes"
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def make_reviews(app_id: int, count: int, now: datetime) -> list[schemas.Review]:
+    return [
+        schemas.Review.model_construct(
+            id=f"{app_id}_{idx}",
+            app_id=app_id,
+            title=f"Review {idx}",
+            content="lorem " * (5 + idx % 50),
+            author=f"user_{idx}",
+            score=1 + idx % 5,
+            updated=now - timedelta(minutes=idx),
+        )
+        for idx in range(count)
+    ]
+
+
+async def populate_storage(
+    path: Path, *, total: int, target_app_id: int, target_reviews: int, app_size: int
+) -> None:
+    """Create storage file with `total` reviews: target app and background apps."""
+    storage = StorageService(path)
+    now = datetime.now(timezone.utc)
+
+    reviews = make_reviews(target_app_id, min(target_reviews, total), now)
+    await storage.create_app(schemas.App(id=target_app_id))
+
+    app_id = target_app_id
+    while len(reviews) < total:
+        app_id += 1
+        reviews += make_reviews(app_id, min(app_size, total - len(reviews)), now)
+        await storage.create_app(schemas.App(id=app_id))
+
+    await storage.create_reviews(reviews)
+
+
+async def bench_ingest(
+    *, apps: int, workers: int, feed: FakeFeedConfig, tmp_dir: Path
+) -> dict[str, Any]:
+    """End-to-end ingest throughput: fake upstream -> workers -> storage."""
+    storage = StorageService(tmp_dir / "ingest.json")
+    queue = DataPollingQueue()
+    hub = ReviewsHub()
+
+    transport = httpx.ASGITransport(build_app(feed))
+    async with httpx.AsyncClient(
+        transport=transport, base_url=FAKE_ITUNES_URL
+    ) as client:
+        adapter = ItunesRSSAdapter(client)
+        tasks = [
+            asyncio.create_task(
+                DataPollingWorker(
+                    storage,
+                    queue,
+                    adapter,
+                    hub,
+                    id=f"bench_{idx}",
+                    polling_depth=feed.history * 2,
+                ).run()
+            )
+            for idx in range(workers)
+        ]
+
+        started = time.perf_counter()
+        for app_id in range(1, apps + 1):
+            queue.push(app_id)
+        await queue.wait_all_pending_and_progress()
+        elapsed = time.perf_counter() - started
+
+        for task in tasks:
+            task.cancel()
+
+    stored = 0
+    for app_id in range(1, apps + 1):
+        stored += len(await storage.get_review_list(app_id))
+    return {
+        "apps": apps,
+        "workers": workers,
+        "reviews": stored,
+        "seconds": elapsed,
+        "apps_per_second": apps / elapsed,
+        "reviews_per_second": stored / elapsed,
+    }
+
+
+async def bench_load(path: Path) -> dict[str, Any]:
+    """Cold start time of StorageService.load."""
+    storage = StorageService(path)
+    started = time.perf_counter()
+    await storage.load()
+    return {
+        "file_bytes": path.stat().st_size,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+async def bench_snapshot(
+    path: Path, *, compression: SnapshotCompression
+) -> dict[str, Any]:
+    """Export storage JSON file to binary snapshot and measure its cold start time."""
+    storage = StorageService(path)
+    await storage.load()
+    snapshot = path.with_suffix(f".{compression}.snap")
+    started = time.perf_counter()
+    await storage.export_snapshot(snapshot, compression=compression)
+    export_seconds = time.perf_counter() - started
+    del storage
+
+    result = {
+        "compression": compression,
+        "export_seconds": export_seconds,
+        **await bench_load(snapshot),
+    }
+
+    # review models are built on the first access to the App, measure all of them
+    storage = StorageService(snapshot)
+    await storage.load()
+    started = time.perf_counter()
+    for app_id in storage.get_app_ids_with_reviews():
+        storage.get_app_reviews(app_id).reviews
+    result["materialize_seconds"] = time.perf_counter() - started
+    return result
+
+
+async def bench_api(
+    path: Path, *, app_id: int, requests: int, warmup: int = 5
+) -> dict[str, Any]:
+    """Latency of GET /api/reviews/{app_id} with pre-populated storage."""
+    settings = AppSettings(
+        SCHEDULER_ENABLED=False,
+        POOLING_WORKERS_NUM=0,  # no upstream calls
+        STORAGE_PATH=path,
+        STORAGE_INITIAL_APP_IDS=[],
+        BACKFILL_CHECKPOINT_PATH=path.with_suffix(".backfill.json"),
+        POLLING_QUEUE_SNAPSHOT_PATH=path.with_suffix(".queue.json"),
+        LOG_LEVEL="CRITICAL",
+        LOG_LEVEL_HTTPX="CRITICAL",
+        LOG_HANDLERS=[],
+        LOG_DIR_CREATE=False,
+    )
+    app = setup(settings)
+    samples: list[float] = []
+    async with LifespanManager(app):
+        transport = httpx.ASGITransport(app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api") as c:
+            for idx in range(warmup + requests):
+                started = time.perf_counter()
+                response = await c.get(f"/api/reviews/{app_id}")
+                response.raise_for_status()
+                if idx >= warmup:
+                    samples.append(time.perf_counter() - started)
+
+    return {
+        "requests": requests,
+        "response_bytes": len(response.content),
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+    }
+
+
+async def bench_encoding(
+    *, reviews: int, requests: int, warmup: int = 2
+) -> dict[str, Any]:
+    """
+    Throughput of responding with `reviews` reviews: FastAPI default response path
+    (response model re-validation and `jsonable_encoder`) against PydanticJSONResponse.
+    """
+    items = make_reviews(1, reviews, datetime.now(timezone.utc))
+    app = FastAPI()
+
+    @app.get("/default")
+    async def default() -> schemas.GetReviewsResponse:
+        return schemas.GetReviewsResponse.model_construct(items=items)
+
+    @app.get("/fast", response_model=schemas.GetReviewsResponse)
+    async def fast() -> PydanticJSONResponse:
+        return PydanticJSONResponse(
+            schemas.GetReviewsResponse.model_construct(items=items)
+        )
+
+    result: dict[str, Any] = {"reviews": reviews, "requests": requests}
+    transport = httpx.ASGITransport(app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api") as c:
+        contents = []
+        for path in ("/default", "/fast"):
+            for _ in range(warmup):
+                (await c.get(path)).raise_for_status()
+
+            started = time.perf_counter()
+            for _ in range(requests):
+                response = await c.get(path)
+            elapsed = time.perf_counter() - started
+            contents.append(response.json())
+            result[path.strip("/")] = {
+                "requests_per_second": requests / elapsed,
+                "mean_ms": elapsed / requests * 1000,
+            }
+
+    assert contents[0] == contents[1], "Responses content mismatch"
+    result["speedup"] = (
+        result["fast"]["requests_per_second"] / result["default"]["requests_per_second"]
+    )
+    return result
+
+
+async def run(
+    *,
+    sizes: list[int],
+    apps: int,
+    workers: int,
+    requests: int,
+    target_reviews: int,
+    feed: FakeFeedConfig,
+    encoding_sizes: list[int] | None = None,
+    encoding_requests: int = 20,
+) -> dict[str, Any]:
+    result: dict[str, Any] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "feed": {
+            "reviews_per_app": feed.reviews_per_app,
+            "latency": feed.latency,
+            "error_rate": feed.error_rate,
+            "seed": feed.seed,
+        },
+        "ingest": {},
+        "storage": [],
+        "encoding": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+
+        logger.info("Ingest: %s apps, %s workers", apps, workers)
+        result["ingest"] = await bench_ingest(
+            apps=apps, workers=workers, feed=feed, tmp_dir=tmp_dir
+        )
+
+        for size in sizes:
+            logger.info("Storage of %s reviews", size)
+            path = tmp_dir / f"storage_{size}.json"
+            await populate_storage(
+                path,
+                total=size,
+                target_app_id=1,
+                target_reviews=target_reviews,
+                app_size=1000,
+            )
+            load = await bench_load(path)
+            snapshots = [
+                await bench_snapshot(path, compression="none"),
+                await bench_snapshot(path, compression="zlib"),
+            ]
+            for snapshot in snapshots:
+                snapshot["load_speedup"] = load["seconds"] / snapshot["seconds"]
+            result["storage"].append(
+                {
+                    "reviews": size,
+                    "load": load,
+                    "load_snapshot": snapshots,
+                    "get_reviews": await bench_api(path, app_id=1, requests=requests),
+                }
+            )
+
+    for size in encoding_sizes or []:
+        logger.info("Encoding of %s reviews", size)
+        result["encoding"].append(
+            await bench_encoding(reviews=size, requests=encoding_requests)
+        )
+
+    return result
+
+
+@click.command()
+@click.option(
+    "--sizes",
+    default="10000,100000,1000000",
+    help="Comma separated numbers of stored reviews.",
+)
+@click.option("--apps", default=50, help="Apps to ingest.")
+@click.option("--workers", default=10, help="Polling workers.")
+@click.option("--requests", default=100, help="API requests per storage size.")
+@click.option("--target-reviews", default=500, help="Reviews of the requested app.")
+@click.option(
+    "--encoding-sizes",
+    default="1000,10000,50000",
+    help="Comma separated numbers of reviews per response for encoding benchmark.",
+)
+@click.option("--encoding-requests", default=20, help="Requests per encoding size.")
+@click.option("--reviews-per-app", default=FakeFeedConfig.reviews_per_app)
+@click.option("--latency", default=FakeFeedConfig.latency, help="Upstream delay, s.")
+@click.option("--error-rate", default=FakeFeedConfig.error_rate)
+@click.option("--seed", default=FakeFeedConfig.seed)
+@click.option("--output", type=click.Path(path_type=Path), default=None)
+def main(
+    sizes: str,
+    apps: int,
+    workers: int,
+    requests: int,
+    target_reviews: int,
+    encoding_sizes: str,
+    encoding_requests: int,
+    reviews_per_app: int,
+    latency: float,
+    error_rate: float,
+    seed: int,
+    output: Path | None,
+) -> None:
+    """Run benchmark suite and emit results as JSON."""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    logging.getLogger("app").setLevel(logging.CRITICAL)
+    logging.getLogger("httpx").setLevel(logging.ERROR)
+
+    feed = FakeFeedConfig(
+        reviews_per_app=reviews_per_app,
+        latency=latency,
+        error_rate=error_rate,
+        seed=seed,
+    )
+    result = asyncio.run(
+        run(
+            sizes=[int(size) for size in sizes.split(",")],
+            apps=apps,
+            workers=workers,
+            requests=requests,
+            target_reviews=target_reviews,
+            feed=feed,
+            encoding_sizes=[int(size) for size in encoding_sizes.split(",")],
+            encoding_requests=encoding_requests,
+        )
+    )
+
+    content = json.dumps(result, indent=2)
+    if output:
+        output.write_text(content)
+    click.echo(content)
+
+
+if __name__ == "__main__":
+    main()
@@ -37,6 +37,8 @@ def settings_overrides(tmp_path: Path) -> AppSettings | None:
     return AppSettings(
         SCHEDULER_ENABLED=False,
         STORAGE_PATH=tmp_path / "storage.json",
+        BACKFILL_CHECKPOINT_PATH=tmp_path / "backfill.json",
+        POLLING_QUEUE_SNAPSHOT_PATH=tmp_path / "queue.json",
         LOG_DIR=tmp_path / "logs",
     )
 
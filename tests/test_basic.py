@@ -1,13 +1,27 @@
 import asyncio
+import gzip
+import json
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+from pathlib import Path
 
 import pytest
+from fastapi import HTTPException
 from pytest_mock import MockerFixture
 
 from app.api.adapter import AppStoreReviewViewerAdapter
 from app.api.app import FastAPIApplication
+from app.common import base_schemas as schemas
+from app.common.archive import FeedArchive
+from app.common.compression import negotiate_encoding
+from app.integration.itunes.adapter import ItunesRSSAdapter
+from app.services.analytics import ReviewsTimeSeries
+from app.services.backfill import BackfillService
+from app.services.compaction import CompactionService
 from app.services.queue import PollReviewsTask
+from app.services.reingest import reingest
+from app.services.snapshot import SnapshotCompression
+from app.services.storage import ReviewsQuery, StorageService
 from tests.conftest import (
     TEST_APP_ID_INITIAL_1,
     TEST_APP_ID_NO_REVIEWS,
@@ -127,3 +141,644 @@ async def test_get_unknown_reviews_race_condition(
     res = task.result()
     assert len(res.items) == TEST_REVIEWS_COUNT
     assert spy.call_count == 1  # only one worker initially polled reviews for targe app
+
+
+async def test_get_app_stats(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication
+) -> None:
+    res = await client.get_reviews(TEST_APP_ID_UNKNOWN)
+    stats = await client.get_app_stats(TEST_APP_ID_UNKNOWN)
+
+    assert stats.count == TEST_REVIEWS_COUNT
+    assert sum(stats.histogram.values()) == TEST_REVIEWS_COUNT
+    assert sum(stats.daily.values()) == TEST_REVIEWS_COUNT
+    assert stats.mean_score == sum(r.score for r in res.items) / TEST_REVIEWS_COUNT
+
+    # re-ingest of the same reviews does not affect stats
+    await client.get_reviews(TEST_APP_ID_UNKNOWN)
+    await app.state.queue.wait_all_pending_and_progress()
+    assert await client.get_app_stats(TEST_APP_ID_UNKNOWN) == stats
+
+
+async def test_get_apps_timeseries(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication
+) -> None:
+    await client.get_reviews(TEST_APP_ID_UNKNOWN)
+    await client.get_reviews(TEST_APP_ID_ORDERED)
+
+    res = await client.get_apps_timeseries(
+        [TEST_APP_ID_UNKNOWN, TEST_APP_ID_ORDERED], window=2
+    )
+    unknown, ordered = res.items
+
+    assert sum(point.count for point in unknown.points) == TEST_REVIEWS_COUNT
+    assert [point.start.day for point in ordered.points] == [1, 2, 3]
+    assert [point.count for point in ordered.points] == [1, 1, 1]
+
+    scores = [r.score for r in (await client.get_reviews(TEST_APP_ID_ORDERED)).items]
+    day_1, day_2, day_3 = reversed(scores)
+    assert ordered.points[2].mean_score == day_3
+    assert ordered.points[2].rolling_mean_score == (day_2 + day_3) / 2
+    assert ordered.points[2].trend_delta == (day_2 + day_3) / 2 - day_1
+
+
+def test_timeseries_sparse_buckets() -> None:
+    timeseries = ReviewsTimeSeries()
+    start = datetime.fromisoformat("2025-01-01T00:00:00Z")
+    timeseries.upsert(
+        schemas.Review(
+            id=f"{app_id}_{day}",
+            app_id=app_id,
+            title="",
+            content="",
+            author="",
+            score=score,
+            updated=start + timedelta(days=day),
+        )
+        for app_id, day, score in [(1, 0, 5), (1, 1, 3), (1, 900, 1), (2, 2, 4)]
+    )
+
+    first, second, unknown = timeseries.compute([1, 2, 3], window=2)
+    assert [point.start.date() for point in first.points] == [
+        (start + timedelta(days=day)).date() for day in (0, 1, 900)
+    ]
+    assert [point.rolling_mean_score for point in first.points] == [5, 4, 1]
+    # the previous window of the last point has no reviews
+    assert [point.trend_delta for point in first.points] == [None, None, None]
+    assert [point.count for point in second.points] == [1]
+    assert unknown.points == []
+
+
+async def test_get_reviews_batch(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication, mocker: MockerFixture
+) -> None:
+    spy = mocker.spy(app.state.external, "get_reviews")
+
+    app_ids = [TEST_APP_ID_UNKNOWN, TEST_APP_ID_ORDERED, TEST_APP_ID_INITIAL_1]
+    res = await client.get_reviews_batch(app_ids)
+
+    assert list(res.items) == app_ids
+    assert len(res.items[TEST_APP_ID_UNKNOWN]) == TEST_REVIEWS_COUNT
+    assert len(res.items[TEST_APP_ID_ORDERED]) == 3
+    assert res.items[TEST_APP_ID_ORDERED][0].updated == datetime.fromisoformat(
+        "2025-01-03T00:00:00Z"
+    )
+    assert spy.call_count == 2  # unknown apps are polled once, known ones are not
+
+    res = await client.get_reviews_batch(
+        [TEST_APP_ID_ORDERED],
+        updated_min=datetime.fromisoformat("2025-01-02T00:00:00Z"),
+    )
+    assert len(res.items[TEST_APP_ID_ORDERED]) == 2
+
+    # too many apps are rejected before polling any of them
+    max_apps = app.state.settings.API_BATCH_MAX_APPS
+    with pytest.raises(HTTPException) as e:
+        await client.get_reviews_batch(list(range(1, max_apps + 2)))
+    assert e.value.status_code == 422
+
+    # known apps are not re-polled on every request
+    await client.get_reviews_batch(app_ids)
+    await app.state.queue.wait_all_pending_and_progress()
+    assert spy.call_count == 2
+
+
+async def test_metrics(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication
+) -> None:
+    await client.get_reviews(TEST_APP_ID_UNKNOWN)
+
+    response = await client._client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+    metrics = response.text
+    assert 'polling_tasks_total{result="ok"}' in metrics
+    assert "polling_queue_wait_seconds_count" in metrics
+    assert "storage_write_seconds_count" in metrics
+    assert (
+        'http_client_request_seconds_count{adapter="ItunesRSSAdapter",method="GET",result="ok"}'
+        in metrics
+    )
+    assert (
+        'http_server_request_seconds_bucket{method="GET",route="/api/reviews/{app_id}",status="200",le="+Inf"}'
+        in metrics
+    )
+
+
+def test_negotiate_encoding() -> None:
+    preferred = ["zstd", "br", "gzip"]
+    assert negotiate_encoding("", preferred) is None
+    assert negotiate_encoding("gzip, deflate", preferred) == "gzip"
+    assert negotiate_encoding("*, zstd;q=0, br;q=0", preferred) == "gzip"
+    assert negotiate_encoding("identity", preferred) is None
+
+
+def test_negotiate_optional_encoding() -> None:
+    pytest.importorskip("brotli")
+    pytest.importorskip("zstandard")
+
+    preferred = ["zstd", "br", "gzip"]
+    assert negotiate_encoding("gzip;q=0.5, br", preferred) == "br"
+    assert negotiate_encoding("*", preferred) == "zstd"
+
+
+async def test_reviews_compression(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication, mocker: MockerFixture
+) -> None:
+    session = client._client
+    url = f"/api/reviews/{TEST_APP_ID_UNKNOWN}"
+    spy = mocker.spy(app.state.response_cache, "set")  # cache misses
+
+    # precompressed and cached response
+    async with session.stream("GET", url, headers={"Accept-Encoding": "gzip"}) as r:
+        assert r.headers["content-encoding"] == "gzip"
+        assert r.headers["vary"] == "Accept-Encoding"
+        raw = b"".join([chunk async for chunk in r.aiter_raw()])
+    content = json.loads(gzip.decompress(raw))
+    assert len(content["items"]) == TEST_REVIEWS_COUNT
+    assert spy.call_count == 1
+
+    response = await session.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.json() == content
+    assert spy.call_count == 1  # served from cache
+
+    # no encoding is accepted
+    response = await session.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == content
+    assert spy.call_count == 2
+
+    # ingest invalidates cache
+    await app.state.queue.wait_all_pending_and_progress()  # actualization polls
+    [review, *_] = await app.state.storage.get_review_list(TEST_APP_ID_UNKNOWN)
+    await app.state.storage.create_reviews([review.model_copy(update={"score": 1})])
+    response = await session.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.json()["items"][0]["score"] == 1
+    assert spy.call_count == 3
+
+    # other responses are compressed by middleware
+    response = await session.get(
+        f"{url}?country=us", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == (await session.get(url)).json()
+
+    # tiny responses are not
+    response = await session.get("/api/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+async def test_ingest_change_detection(
+    app: FastAPIApplication, mocker: MockerFixture
+) -> None:
+    worker = app.state.workers[0]
+    spy = mocker.spy(app.state.storage, "write")
+    # content hashes of the classification are stored, not re-computed
+    rehash = mocker.spy(StorageService, "_review_digest")
+
+    stats = await worker.process(PollReviewsTask(TEST_APP_ID_UNKNOWN))
+    assert (stats.new, stats.changed, stats.unchanged) == (TEST_REVIEWS_COUNT, 0, 0)
+    assert spy.call_count == 2  # reviews and app created
+    assert not rehash.called
+
+    # steady-state poll: nothing to persist
+    stats = await worker.process(PollReviewsTask(TEST_APP_ID_UNKNOWN))
+    assert (stats.new, stats.changed, stats.unchanged) == (0, 0, TEST_REVIEWS_COUNT)
+    assert spy.call_count == 2
+
+    # one review is edited by its author
+    [review, *_] = await app.state.storage.get_review_list(TEST_APP_ID_UNKNOWN)
+    app.state.storage._digests[review.id] = b"outdated"
+    stats = await worker.process(PollReviewsTask(TEST_APP_ID_UNKNOWN))
+    assert (stats.new, stats.changed, stats.unchanged) == (0, 1, 49)
+    assert spy.call_count == 3
+
+
+async def test_backfill(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication, mocker: MockerFixture
+) -> None:
+    spy = mocker.spy(app.state.external, "get_reviews")
+
+    status = await client.start_backfill(TEST_APP_ID_UNKNOWN)
+    assert status.pending == ["us:mostRecent", "us:mostHelpful"]
+    assert status.completed == []
+
+    # backfill is re-enqueued slice by slice
+    while app.state.backfill.get_pending_apps():
+        await app.state.queue.wait_all_pending_and_progress()
+
+    status = await client.get_backfill(TEST_APP_ID_UNKNOWN)
+    assert status.pending == []
+    assert status.completed == ["us:mostRecent", "us:mostHelpful"]
+
+    # every slice is walked up to the upstream pages limit, results are deduped
+    assert spy.call_count == 2 * ItunesRSSAdapter.MAX_PAGES
+    assert {call.args[2] for call in spy.call_args_list} == {
+        "mostRecent",
+        "mostHelpful",
+    }
+    reviews = await app.state.storage.get_review_list(TEST_APP_ID_UNKNOWN)
+    assert len(reviews) == TEST_REVIEWS_COUNT
+
+    # progress is checkpointed
+    backfill = BackfillService(app.state.settings.BACKFILL_CHECKPOINT_PATH)
+    await backfill.load()
+    assert backfill.get_status(TEST_APP_ID_UNKNOWN) == status
+
+    # history is fetched from every storefront of the App
+    await client.update_app(
+        TEST_APP_ID_ORDERED, schemas.UpdateAppRequest(countries=["us", "gb"])
+    )
+    status = await client.start_backfill(TEST_APP_ID_ORDERED)
+    assert status.pending == [
+        "us:mostRecent",
+        "us:mostHelpful",
+        "gb:mostRecent",
+        "gb:mostHelpful",
+    ]
+
+
+async def test_multi_country_polling(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication, mocker: MockerFixture
+) -> None:
+    spy = mocker.spy(app.state.external, "get_reviews")
+
+    payload = schemas.UpdateAppRequest(countries=["us", "gb", "au"])
+    res = await client.update_app(TEST_APP_ID_UNKNOWN, payload)
+    assert res.countries == ["us", "gb", "au"]
+    await app.state.queue.wait_all_pending_and_progress()
+
+    assert {call.kwargs["country"] for call in spy.call_args_list} == {"us", "gb", "au"}
+
+    # reviews of every storefront are stored separately
+    res = await client.get_reviews(TEST_APP_ID_UNKNOWN)
+    assert len(res.items) == 3 * TEST_REVIEWS_COUNT
+    assert len({review.id for review in res.items}) == 3 * TEST_REVIEWS_COUNT
+
+    res = await client.get_reviews(TEST_APP_ID_UNKNOWN, country="gb")
+    assert len(res.items) == TEST_REVIEWS_COUNT
+    assert {review.country for review in res.items} == {"gb"}
+    assert res.items[0].id.startswith(f"{TEST_APP_ID_UNKNOWN}_gb_")
+
+    res = await client.get_reviews(TEST_APP_ID_UNKNOWN, country="fr")
+    assert res.items == []
+
+
+async def test_reviews_snapshot_etag(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication
+) -> None:
+    session = client._client
+    storage = app.state.storage
+    url = f"/api/reviews/{TEST_APP_ID_UNKNOWN}"
+    response = await session.get(url)
+    etag = response.headers["etag"]
+    await app.state.queue.wait_all_pending_and_progress()  # actualization polls
+
+    for params in ({}, {"country": "us"}):
+        response = await session.get(
+            url, params=params, headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert not response.content
+    await app.state.queue.wait_all_pending_and_progress()  # polls of 304 requests
+
+    # published snapshot is never changed by writers
+    snapshot = storage.get_app_reviews(TEST_APP_ID_UNKNOWN)
+    [review, *_] = snapshot.select()
+    await storage.create_reviews([review.model_copy(update={"score": 1})])
+    assert snapshot.select()[0] == review
+    assert storage.get_app_reviews(TEST_APP_ID_UNKNOWN).version > snapshot.version
+
+    response = await session.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["items"][0]["score"] == 1
+
+    # large snapshots are read in a thread with the same result
+    await app.state.queue.wait_all_pending_and_progress()
+    expected = await storage.get_review_list(TEST_APP_ID_UNKNOWN)
+    storage._offload_size = 1
+    assert await storage.get_review_list(TEST_APP_ID_UNKNOWN, country="us") == expected
+    response = await session.get(url, headers={"Accept-Encoding": "identity"})
+    assert len(response.json()["items"]) == len(expected)
+
+    await storage.delete_reviews([review.id])
+    assert storage.get_app_reviews(TEST_APP_ID_UNKNOWN).version > snapshot.version
+    assert len(snapshot) == TEST_REVIEWS_COUNT
+
+    # versions restart on reload, ETags of a previous boot never match
+    await app.state.queue.wait_all_pending_and_progress()
+    response = await session.get(url)
+    etag = response.headers["etag"]
+    restarted = StorageService(storage.path)
+    await restarted.load()
+    assert restarted.epoch != storage.epoch
+    app.state.storage = restarted
+    try:
+        response = await session.get(url, headers={"If-None-Match": etag})
+    finally:
+        app.state.storage = storage
+    assert response.status_code == 200
+
+
+async def test_reviews_query(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication
+) -> None:
+    everything = (await client.get_reviews(TEST_APP_ID_UNKNOWN)).items
+    await app.state.queue.wait_all_pending_and_progress()  # actualization polls
+    updated_min, updated_max = everything[30].updated, everything[10].updated
+    author = everything[5].author
+
+    res = await client.get_reviews(
+        TEST_APP_ID_UNKNOWN,
+        updated_min=updated_min,
+        updated_max=updated_max,
+        score_in=[1, 5],
+    )
+    expected = [
+        review
+        for review in everything
+        if updated_min <= review.updated <= updated_max and review.score in (1, 5)
+    ]
+    assert res.items == expected and expected
+
+    res = await client.get_reviews(TEST_APP_ID_UNKNOWN, author=author, country="us")
+    assert res.items == [review for review in everything if review.author == author]
+
+    # naive time is ambiguous, it's rejected
+    url = f"/api/reviews/{TEST_APP_ID_UNKNOWN}"
+    response = await client._client.get(url, params={"updated_min": "2025-01-02T00:00"})
+    assert response.status_code == 422
+
+    res = await client.get_reviews(TEST_APP_ID_UNKNOWN, sort="oldest")
+    assert res.items == everything[::-1]
+    res = await client.get_reviews(TEST_APP_ID_UNKNOWN, sort="lowest")
+    assert res.items == sorted(everything, key=lambda review: review.score)
+    res = await client.get_reviews(TEST_APP_ID_UNKNOWN, sort="highest", score_in=[3])
+    assert {review.score for review in res.items} == {3}
+
+    # the most selective index is chosen
+    snapshot = app.state.storage.get_app_reviews(TEST_APP_ID_UNKNOWN)
+    for query, index in (
+        (ReviewsQuery(), "updated"),
+        (ReviewsQuery(author=author, score_in=frozenset(range(1, 6))), "author"),
+        (ReviewsQuery(updated_min=updated_max, country="us"), "updated"),
+        (ReviewsQuery(score_in=frozenset([5]), country="us"), "score"),
+    ):
+        assert snapshot._plan(query)[0] == index
+
+    with pytest.raises(HTTPException) as e:
+        await client.get_reviews(TEST_APP_ID_UNKNOWN, score_in=[6])
+    assert e.value.status_code == 422
+
+
+async def test_bulk_apps(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication, mocker: MockerFixture
+) -> None:
+    queue = app.state.queue
+    await queue.wait_all_pending_and_progress()
+    write = mocker.spy(app.state.storage, "write")
+
+    res = await client.create_apps_bulk(
+        schemas.CreateAppsBulkRequest(
+            app_ids=[
+                TEST_APP_ID_UNKNOWN,
+                TEST_APP_ID_ORDERED,
+                TEST_APP_ID_INITIAL_1,
+                TEST_APP_ID_UNKNOWN,
+            ],
+            countries=["us", "gb"],
+        )
+    )
+    assert res.created == [TEST_APP_ID_UNKNOWN, TEST_APP_ID_ORDERED]
+    assert res.existing == [TEST_APP_ID_INITIAL_1]
+    rate = app.state.settings.POLLING_ONBOARDING_RATE
+    assert res.polling_window == 2 / rate
+    assert write.call_count == 1
+    app_info = await app.state.storage.get_app(TEST_APP_ID_ORDERED)
+    assert app_info and app_info.countries == ["us", "gb"]
+
+    # first polls are delayed: every one within its own slot
+    assert queue.delayed == 2 and queue.backlog == 0
+    dues = [queue._due[PollReviewsTask(app_id).id] for app_id in res.created]
+    assert 0 < dues[1] - dues[0] < 2 / rate
+
+    # but user request makes it due now
+    await client.get_reviews(TEST_APP_ID_UNKNOWN)
+    assert not queue.is_delayed(TEST_APP_ID_UNKNOWN)
+    assert queue.is_delayed(TEST_APP_ID_ORDERED)
+
+    await queue.wait_all_pending_and_progress()
+    assert await app.state.storage.get_review_list(TEST_APP_ID_ORDERED)
+    assert queue.delayed == 0
+
+
+async def test_retention_compaction(app: FastAPIApplication) -> None:
+    storage = app.state.storage
+    worker = app.state.workers[0]
+    await worker.process(PollReviewsTask(TEST_APP_ID_UNKNOWN))
+    await worker.process(PollReviewsTask(TEST_APP_ID_INITIAL_1))
+    reviews = await storage.get_review_list(TEST_APP_ID_INITIAL_1)
+    size = storage.path.stat().st_size
+
+    compaction = CompactionService(
+        storage,
+        default=schemas.RetentionPolicy(max_age=timedelta(days=1)),
+        overrides={TEST_APP_ID_UNKNOWN: schemas.RetentionPolicy(max_count=10)},
+        clock=lambda: reviews[9].updated + timedelta(days=1),
+    )
+    assert compaction.is_enabled
+    report = await compaction.process()
+    assert report.apps == 2
+    assert report.removed == 2 * (TEST_REVIEWS_COUNT - 10)
+    assert report.reclaimed_bytes == size - storage.path.stat().st_size > 0
+
+    for app_id in (TEST_APP_ID_UNKNOWN, TEST_APP_ID_INITIAL_1):
+        assert len(await storage.get_review_list(app_id)) == 10
+        assert (await storage.get_app_stats(app_id)).count == 10
+        [series] = await storage.get_app_timeseries([app_id], bucket="day", window=1)
+        assert sum(point.count for point in series.points) == 10
+    assert len(await storage.get_review_list(TEST_APP_ID_UNKNOWN, country="us")) == 10
+
+    # nothing to compact more
+    report = await compaction.process()
+    assert (report.removed, report.reclaimed_bytes) == (0, 0)
+
+    # removed reviews are not ingested again, even after reload
+    watermark = storage.get_retention_watermark(TEST_APP_ID_UNKNOWN)
+    assert watermark
+    await storage.load()
+    assert storage.get_retention_watermark(TEST_APP_ID_UNKNOWN) == watermark
+    path = storage.path.with_name("retention.snap")
+    await storage.export_snapshot(path)
+    await storage.load(path)
+    assert storage.get_retention_watermark(TEST_APP_ID_UNKNOWN) == watermark
+    stats = await worker.process(PollReviewsTask(TEST_APP_ID_UNKNOWN))
+    assert (stats.new, stats.changed) == (0, 0)
+    assert stats.expired == TEST_REVIEWS_COUNT - 10
+    assert len(await storage.get_review_list(TEST_APP_ID_UNKNOWN)) == 10
+    await storage.create_reviews(reviews[10:])
+    assert len(await storage.get_review_list(TEST_APP_ID_INITIAL_1)) == 10
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib", "zstd"])
+async def test_storage_snapshot(
+    app: FastAPIApplication, tmp_path: Path, compression: SnapshotCompression
+) -> None:
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    storage = app.state.storage
+    worker = app.state.workers[0]
+    await storage.create_app(
+        schemas.App(id=TEST_APP_ID_UNKNOWN, countries=["us", "gb"])
+    )
+    await worker.process(PollReviewsTask(TEST_APP_ID_UNKNOWN))
+    await worker.process(PollReviewsTask(TEST_APP_ID_INITIAL_1))
+    app_ids = [TEST_APP_ID_UNKNOWN, TEST_APP_ID_INITIAL_1]
+
+    path = tmp_path / "backup.snap"
+    await storage.export_snapshot(path, compression=compression)
+    assert path.stat().st_size < storage.path.stat().st_size
+
+    restored = StorageService(tmp_path / "storage.bin", format="binary")
+    await restored.load(path)
+    assert restored._storage == storage._storage
+    assert restored._digests == storage._digests
+
+    # review models are built on the first access
+    snapshot = restored.get_app_reviews(TEST_APP_ID_INITIAL_1)
+    assert snapshot.block and "reviews" not in vars(snapshot.block)
+    assert len(snapshot) == len(storage.get_app_reviews(TEST_APP_ID_INITIAL_1))
+    assert await restored.get_review(next(iter(snapshot.block.ids)))
+    for app_id in app_ids:
+        assert restored.get_app_reviews(app_id).reviews == (
+            storage.get_app_reviews(app_id).reviews
+        )
+    assert await restored.get_review_list(
+        TEST_APP_ID_UNKNOWN, country="gb"
+    ) == await storage.get_review_list(TEST_APP_ID_UNKNOWN, country="gb")
+    for app_id in (TEST_APP_ID_UNKNOWN, TEST_APP_ID_INITIAL_1):
+        assert await restored.get_app_stats(app_id) == await storage.get_app_stats(
+            app_id
+        )
+    assert await restored.get_app_timeseries(
+        app_ids, bucket="week", window=2
+    ) == await storage.get_app_timeseries(app_ids, bucket="week", window=2)
+
+    # restored reviews are not changed for change detection
+    assert not await restored.create_reviews(await storage.get_review_list(app_id))
+
+    # binary storage file is detected on load, unchanged blocks are written as is
+    restored = StorageService(tmp_path / "storage.bin", format="binary")
+    await restored.load(path)
+    await restored.write()
+    if compression == "none":
+        assert restored.path.read_bytes() == path.read_bytes()
+    loaded = StorageService(restored.path)
+    await loaded.load()
+    assert loaded._storage == storage._storage
+    for app_id in app_ids:
+        assert loaded.get_app_reviews(app_id).reviews == (
+            storage.get_app_reviews(app_id).reviews
+        )
+
+
+async def test_feed_archive_reingest(app: FastAPIApplication, tmp_path: Path) -> None:
+    storage = app.state.storage
+    worker = app.state.workers[0]
+    archive = app.state.external.archive = FeedArchive(tmp_path / "archive")
+    await storage.create_app(
+        schemas.App(id=TEST_APP_ID_UNKNOWN, countries=["us", "gb"])
+    )
+    for _ in range(2):  # same pages are archived once
+        await worker.process(PollReviewsTask(TEST_APP_ID_UNKNOWN))
+        await worker.process(PollReviewsTask(TEST_APP_ID_INITIAL_1))
+
+    entries = list(archive.entries())
+    assert len(entries) == 3
+    assert ItunesRSSAdapter.parse_url(entries[0].url) == (TEST_APP_ID_UNKNOWN, "us")
+    # storefronts of the same app have the same content in tests
+    assert len(list((tmp_path / "archive" / "objects").glob("*/*.gz"))) == 2
+    assert json.loads(archive.read(entries[0].digest))["feed"]["entry"]
+
+    restored = StorageService(tmp_path / "restored.json")
+    report = await reingest(restored, archive, processes=2, chunk_size=1)
+    assert (report.pages, report.apps) == (3, 2)
+    assert report.inserted == 3 * TEST_REVIEWS_COUNT
+    for app_id in (TEST_APP_ID_UNKNOWN, TEST_APP_ID_INITIAL_1):
+        assert restored.get_app_reviews(app_id).reviews == (
+            storage.get_app_reviews(app_id).reviews
+        )
+        assert len(restored.get_app_reviews(app_id)) > 0
+    assert await restored.get_app(TEST_APP_ID_INITIAL_1)
+
+    # re-ingest of the same archive changes nothing
+    report = await reingest(restored, archive, processes=1)
+    assert report.inserted == 0
+
+
+async def test_async_reviews_job(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication, mocker: MockerFixture
+) -> None:
+    response = await client._client.get(
+        f"/api/reviews/{TEST_APP_ID_UNKNOWN}", headers={"Prefer": "respond-async"}
+    )
+    assert response.status_code == 202
+    assert response.headers["retry-after"] == "2"
+    job = schemas.PollingJob.model_validate(response.json())
+    assert job.status == "pending"
+    assert response.headers["location"] == f"/api/jobs/{job.id}"
+
+    # the same job for the same App
+    assert (await client.request_reviews(TEST_APP_ID_UNKNOWN)).id == job.id
+
+    await app.state.queue.wait_all_pending_and_progress()
+    job = await client.get_job(job.id)
+    assert job.status == "completed"
+    assert job.pages_fetched == 1  # example reviews are older than polling depth
+    assert len((await client.get_reviews(TEST_APP_ID_UNKNOWN)).items) == (
+        TEST_REVIEWS_COUNT
+    )
+
+    # known App reviews are returned at once
+    res = await client._client.get(
+        f"/api/reviews/{TEST_APP_ID_UNKNOWN}", headers={"Prefer": "respond-async"}
+    )
+    assert res.status_code == 200
+
+    # failed job
+    mocker.patch.object(
+        app.state.external, "get_reviews", side_effect=RuntimeError("upstream")
+    )
+    job = await client.request_reviews(TEST_APP_ID_NO_REVIEWS)
+    await app.state.queue.wait_all_pending_and_progress()
+    job = await client.get_job(job.id)
+    assert (job.status, job.pages_fetched, job.error) == ("failed", 0, "upstream")
+
+    response = await client._client.get("/api/jobs/unknown")
+    assert response.status_code == 404
+
+
+async def test_polling_admission(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication
+) -> None:
+    app.state.settings = app.state.settings.model_copy(
+        update={"POLLING_MAX_BACKLOG": 1}
+    )
+    app.state.queue.close()  # workers take nothing, backlog is kept
+    task = app.state.queue.push(TEST_APP_ID_ORDERED)
+
+    response = await client._client.get(f"/api/reviews/{TEST_APP_ID_UNKNOWN}")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "2"
+
+    # App already in the queue is admitted
+    job = await client.request_reviews(TEST_APP_ID_ORDERED)
+    assert job.id == task.job_id
+
+    # the same for unknown apps of a batch
+    with pytest.raises(HTTPException) as e:
+        await client.get_reviews_batch([TEST_APP_ID_UNKNOWN])
+    assert e.value.status_code == 503
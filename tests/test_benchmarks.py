@@ -0,0 +1,31 @@
+from benchmarks.fake_itunes import FakeFeedConfig
+from benchmarks.run import run
+
+
+async def test_benchmarks_smoke() -> None:
+    feed = FakeFeedConfig(reviews_per_app=120)
+    result = await run(
+        sizes=[1000],
+        apps=3,
+        workers=2,
+        requests=3,
+        target_reviews=100,
+        feed=feed,
+        encoding_sizes=[100],
+        encoding_requests=2,
+    )
+
+    assert result["ingest"]["reviews"] == 3 * 120
+    assert result["ingest"]["reviews_per_second"] > 0
+
+    [storage] = result["storage"]
+    assert storage["reviews"] == 1000
+    assert storage["load"]["seconds"] > 0
+    for snapshot in storage["load_snapshot"]:
+        assert snapshot["file_bytes"] < storage["load"]["file_bytes"]
+        assert snapshot["load_speedup"] > 0
+    assert storage["get_reviews"]["p99_ms"] >= storage["get_reviews"]["p50_ms"]
+
+    [encoding] = result["encoding"]
+    assert encoding["fast"]["requests_per_second"] > 0
+    assert encoding["default"]["requests_per_second"] > 0
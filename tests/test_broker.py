@@ -0,0 +1,212 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from pytest_httpx import HTTPXMock
+from pytest_mock import MockerFixture
+
+from app.api.adapter import AppStoreReviewViewerAdapter
+from app.api.app import FastAPIApplication
+from app.common import base_schemas as schemas
+from app.config import AppSettings
+from app.integration.itunes.adapter import ItunesRSSAdapter
+from app.services.broker import TaskBroker
+from app.services.queue import PollReviewsTask
+from app.services.remote import (
+    BrokerConsumer,
+    PollReport,
+    RemotePollingError,
+    RemotePollingWorker,
+    ReportingCircuitBreaker,
+    ReviewsCollector,
+    recording_verdicts,
+)
+from tests.conftest import TEST_APP_ID_UNKNOWN, TEST_REVIEWS_COUNT
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def test_broker_leases(tmp_path: Path) -> None:
+    clock = FakeClock()
+    broker = TaskBroker(
+        tmp_path / "broker.sqlite3", visibility_timeout=10, max_attempts=2, clock=clock
+    )
+    assert broker.result_timeout == 20
+    task_id = await broker.push(schemas.App(id=1, countries=["gb"]))
+
+    task = await broker.lease()
+    assert task and task.id == task_id
+    assert task.app.countries == ["gb"]
+    assert await broker.lease() is None  # leased task is invisible
+
+    # worker is dead, task is visible again after visibility timeout
+    clock.now = 11
+    retried = await broker.lease()
+    assert retried and retried.id == task_id and retried.attempt == 2
+
+    # lease of the dead worker is lost
+    assert not await broker.ack(task, b"[]")
+    assert await broker.get_result(task_id) is None
+
+    # lease extension keeps task invisible
+    clock.now = 20
+    assert await broker.extend(retried)
+    clock.now = 25
+    assert await broker.lease() is None
+
+    assert await broker.ack(retried, b"[]", report="{}")
+    result = await broker.get_result(task_id)
+    assert result and result.result == b"[]" and result.error is None
+    assert result.report == "{}"
+
+    # task is failed after max attempts
+    task_id = await broker.push(schemas.App(id=2))
+    for _ in range(2):
+        assert await broker.lease()
+        clock.now += 11
+    assert await broker.lease() is None
+    result = await broker.get_result(task_id)
+    assert result and result.error
+
+
+@pytest.fixture
+def settings_overrides(settings_overrides: AppSettings) -> AppSettings:
+    return AppSettings(
+        **dict(
+            settings_overrides.model_dump(exclude_unset=True),
+            POLLING_BROKER_ENABLED=True,
+            POLLING_BROKER_PATH=settings_overrides.STORAGE_PATH.with_name("broker.db"),
+            POLLING_BROKER_POLL_INTERVAL=0.01,
+            POLLING_BROKER_VISIBILITY_TIMEOUT=0.1,
+            POLLING_BROKER_MAX_ATTEMPTS=1,
+            # example reviews are old, all of them are within the depth
+            POLLING_REVIEWS_DEPTH=timedelta(days=365 * 100),
+        )
+    )
+
+
+def run_consumer(
+    app: FastAPIApplication, broker: TaskBroker
+) -> tuple[BrokerConsumer, ReportingCircuitBreaker]:
+    """Worker process consumer is run within the same event loop for the test."""
+    breaker = ReportingCircuitBreaker("itunes")
+    adapter = ItunesRSSAdapter(app.state.external._client, circuit_breaker=breaker)
+    consumer = BrokerConsumer(
+        broker,
+        adapter,
+        id="consumer",
+        polling_depth=app.state.settings.POLLING_REVIEWS_DEPTH,
+        poll_interval=0.01,
+    )
+    return consumer, breaker
+
+
+@pytest.mark.usefixtures("mock_external_http_requests")
+async def test_remote_polling(
+    client: AppStoreReviewViewerAdapter,
+    app: FastAPIApplication,
+    mocker: MockerFixture,
+) -> None:
+    worker = app.state.workers[0]
+    assert isinstance(worker, RemotePollingWorker)
+
+    broker = TaskBroker(app.state.settings.POLLING_BROKER_PATH)
+    consumer, _ = run_consumer(app, broker)
+    consumer_task = asyncio.create_task(consumer.run())
+    try:
+        res = await client.get_reviews(TEST_APP_ID_UNKNOWN)
+        assert len(res.items) == TEST_REVIEWS_COUNT
+        assert await app.state.storage.get_app(TEST_APP_ID_UNKNOWN)
+
+        # completed tasks are removed from broker
+        assert await broker.lease() is None
+
+        # models of reviews known to the API process are not built
+        ack = mocker.spy(broker, "ack")
+        store = mocker.spy(worker, "_store")
+        task = PollReviewsTask(TEST_APP_ID_UNKNOWN)
+        stats = await worker.process(task)
+        assert (stats.new, stats.changed) == (0, 0)
+        assert stats.unchanged
+        assert store.call_args.args[1] == []
+        leased, result, error = ack.call_args.args
+        assert result and error is None
+
+        # upstream calls are reported to the API process breaker, pages to the task
+        report = PollReport.model_validate_json(ack.call_args.kwargs["report"])
+        assert report.upstream and set(report.upstream) == {"success"}
+        assert task.pages_fetched == report.pages > 0
+    finally:
+        consumer_task.cancel()
+        broker.close()
+
+
+async def test_remote_polling_failures(
+    app: FastAPIApplication, httpx_mock: HTTPXMock
+) -> None:
+    httpx_mock.add_response(status_code=503, is_reusable=True, is_optional=True)
+    worker = app.state.workers[0]
+    api_breaker = app.state.external.circuit_breaker
+    assert api_breaker
+
+    broker = TaskBroker(app.state.settings.POLLING_BROKER_PATH)
+    consumer, _ = run_consumer(app, broker)
+    consumer_task = asyncio.create_task(consumer.run())
+    try:
+        # upstream failures of the worker process are seen by the API breaker
+        with pytest.raises(RemotePollingError, match="503"):
+            await worker.process(PollReviewsTask(TEST_APP_ID_UNKNOWN))
+        assert api_breaker.failures
+    finally:
+        consumer_task.cancel()
+        broker.close()
+
+    # no worker process consumes the broker, task is failed after its timeout
+    with pytest.raises(RemotePollingError, match="not completed"):
+        await worker.process(PollReviewsTask(TEST_APP_ID_UNKNOWN))
+
+
+async def test_breaker_verdicts_per_task() -> None:
+    breaker = ReportingCircuitBreaker("itunes")
+    breaker.record_success()  # out of any task, not recorded
+
+    async def call(verdict: str) -> list:
+        with recording_verdicts() as verdicts:
+            await asyncio.sleep(0)
+            if verdict == "success":
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+            await asyncio.sleep(0)
+        return verdicts
+
+    assert await asyncio.gather(call("success"), call("failure")) == [
+        ["success"],
+        ["failure"],
+    ]
+
+
+async def test_reviews_collector() -> None:
+    collector = ReviewsCollector(schemas.App(id=1))
+    assert await collector.get_app(1)
+    assert await collector.get_app(2) is None
+
+    # content hashes of the polling worker are kept as is
+    review = schemas.Review(
+        id="1_1",
+        app_id=1,
+        title="title",
+        content="content",
+        author="author",
+        score=5,
+        updated=datetime.now(timezone.utc),
+    )
+    assert await collector.create_reviews([review], [b"digest"]) == [review]
+    assert collector.digests == {review.id: b"digest"}
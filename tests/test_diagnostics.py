@@ -0,0 +1,51 @@
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+
+from app.api.adapter import AppStoreReviewViewerAdapter
+from app.api.app import FastAPIApplication
+from app.config import AppSettings
+from app.main import setup
+
+
+@pytest.fixture
+def settings_overrides(settings_overrides: AppSettings) -> AppSettings:
+    return AppSettings(
+        **dict(
+            settings_overrides.model_dump(exclude_unset=True),
+            DIAGNOSTICS_ENABLED=True,
+            DIAGNOSTICS_LOOP_LAG_INTERVAL=0.01,
+            DIAGNOSTICS_SLOW_CALLBACK_THRESHOLD=0.05,
+        )
+    )
+
+
+def blocking_call() -> None:
+    time.sleep(0.2)
+
+
+async def test_slow_callback_detected(app: FastAPIApplication) -> None:
+    await asyncio.sleep(0.05)
+    blocking_call()
+    await asyncio.sleep(0.05)
+
+    assert app.state.diagnostics.stalls
+    assert "blocking_call" in app.state.diagnostics.stalls[-1]
+
+
+async def test_profile(
+    app: FastAPIApplication, client: AppStoreReviewViewerAdapter
+) -> None:
+    response = await client._client.get("/api/debug/profile", params={"seconds": 0.1})
+    assert response.status_code == 200
+
+    lines = response.text.splitlines()
+    assert lines
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_diagnostics_disabled_by_default(tmp_path: Path) -> None:
+    app = setup(AppSettings(STORAGE_PATH=tmp_path / "storage.json", LOG_DIR=tmp_path))
+    assert not [r for r in app.routes if "/debug/" in getattr(r, "path", "")]
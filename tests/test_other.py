@@ -1,10 +1,12 @@
 import asyncio
+import json
 import logging
 
 import pytest
 from asgi_lifespan import LifespanManager
 
 from app.api.app import FastAPIApplication
+from app.common.log import RateLimitFilter, stop_queue_listener
 from app.config import AppSettings
 from app.main import setup
 from tests.conftest import TEST_APP_IDS_INITIAL
@@ -26,12 +28,21 @@ def settings_overrides(settings_overrides) -> AppSettings | None:
     )
 
 
+async def wait_scheduled_polls(app: FastAPIApplication) -> None:
+    """Wait for the scheduler to push polls of the initial apps and their completion."""
+    queue = app.state.queue
+    async with asyncio.timeout(5):
+        while queue.completed_total < len(TEST_APP_IDS_INITIAL):
+            await queue.wait_all_pending_and_progress()
+            await asyncio.sleep(0.01)  # let scheduler push the next ones
+
+
 async def test_scheduler_enabled(
     app: FastAPIApplication, settings_overrides: AppSettings
 ) -> None:
     app = setup(settings_overrides)
     async with LifespanManager(app):
-        await asyncio.sleep(0.1)
+        await wait_scheduled_polls(app)
         assert await app.state.storage.get_review_list(TEST_APP_IDS_INITIAL[0])
         assert await app.state.storage.get_review_list(TEST_APP_IDS_INITIAL[1])
         assert await app.state.storage.get_review_list(TEST_APP_IDS_INITIAL[2])
@@ -42,7 +53,7 @@ async def test_file_persistence(
 ) -> None:
     app = setup(settings_overrides)
     async with LifespanManager(app):
-        await asyncio.sleep(0.1)
+        await wait_scheduled_polls(app)
         assert await app.state.storage.get_review_list(TEST_APP_IDS_INITIAL[0])
 
     settings = AppSettings(
@@ -53,5 +64,34 @@ async def test_file_persistence(
     )
     app = setup(settings)
     async with LifespanManager(app):
-        await asyncio.sleep(0.1)
         assert await app.state.storage.get_review_list(TEST_APP_IDS_INITIAL[0])
+
+
+async def test_json_logs(
+    app: FastAPIApplication, settings_overrides: AppSettings
+) -> None:
+    stop_queue_listener()  # flush records
+
+    path = settings_overrides.LOG_DIR / settings_overrides.LOG_JSON_FILE
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert any(r["message"].startswith("Start worker") for r in records)
+    assert {"timestamp", "level", "logger", "message"} <= set(records[0])
+
+
+def test_rate_limit_filter() -> None:
+    log_filter = RateLimitFilter(rate=2, period=1.0)
+
+    def record(msg: str, created: float, level: int = logging.DEBUG):
+        r = logging.LogRecord("app", level, "", 0, msg, (1,), None)
+        r.created = created
+        return r
+
+    assert log_filter.filter(record("Getting app: %s", 0.0))
+    assert log_filter.filter(record("Getting app: %s", 0.1))
+    assert not log_filter.filter(record("Getting app: %s", 0.2))
+    assert log_filter.filter(record("Getting apps: %s", 0.2))  # another template
+    assert log_filter.filter(record("Getting app: %s", 0.3, logging.INFO))
+
+    passed = record("Getting app: %s", 1.5)  # next period
+    assert log_filter.filter(passed)
+    assert "1 similar records suppressed" in passed.getMessage()
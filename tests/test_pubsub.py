@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from app.api.adapter import AppStoreReviewViewerAdapter
+from app.api.app import FastAPIApplication
+from app.services.pubsub import ReviewsHub
+from tests.conftest import TEST_APP_ID_UNKNOWN, TEST_REVIEWS_COUNT
+
+pytestmark = [
+    pytest.mark.usefixtures("mock_external_http_requests"),
+]
+
+
+async def test_publish_new_reviews(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication
+) -> None:
+    subscription = app.state.hub.subscribe(TEST_APP_ID_UNKNOWN)
+
+    await client.get_reviews(TEST_APP_ID_UNKNOWN)
+    delta = await asyncio.wait_for(anext(subscription), 1)
+    assert len(delta) == TEST_REVIEWS_COUNT
+
+    # re-ingest of the same reviews publishes nothing
+    await client.get_reviews(TEST_APP_ID_UNKNOWN)
+    await app.state.queue.wait_all_pending_and_progress()
+    with pytest.raises(TimeoutError):
+        await asyncio.wait_for(anext(subscription), 0.1)
+
+
+async def test_slow_subscriber_dropped() -> None:
+    hub = ReviewsHub(buffer_size=2)
+    slow = hub.subscribe(TEST_APP_ID_UNKNOWN)
+    fast = hub.subscribe(TEST_APP_ID_UNKNOWN)
+
+    for _ in range(2):
+        hub.publish(TEST_APP_ID_UNKNOWN, [])  # nothing to publish
+        hub.publish(TEST_APP_ID_UNKNOWN, ["review"])  # type: ignore
+        assert await anext(fast) == ["review"]
+        assert not slow.is_dropped
+
+    hub.publish(TEST_APP_ID_UNKNOWN, ["review"])  # type: ignore
+    assert slow.is_dropped
+    assert not fast.is_dropped
+
+    # buffered deltas are discarded for dropped subscriber
+    assert [delta async for delta in slow] == []
@@ -0,0 +1,402 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from asgi_lifespan import LifespanManager
+from fastapi import HTTPException
+from pytest_httpx import HTTPXMock
+from pytest_mock import MockerFixture
+
+from app.api.adapter import AppStoreReviewViewerAdapter
+from app.api.app import FastAPIApplication
+from app.common import base_schemas as schemas
+from app.common.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.config import AppSettings
+from app.main import setup
+from app.services.backoff import PollingBackoff
+from app.services.polling import DataPollingWorker
+from app.services.queue import DataPollingQueue, PollReviewsTask, QueueSnapshot
+from app.services.scheduller import SchedulerService
+from tests.conftest import (
+    TEST_APP_ID_INITIAL_1,
+    TEST_APP_ID_UNKNOWN,
+    TEST_APP_IDS_INITIAL,
+    TEST_REVIEWS_COUNT,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_circuit_breaker() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker(
+        "test", failure_threshold=2, recovery_timeout=10, clock=clock
+    )
+
+    breaker.record_failure()
+    breaker.check()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+    # only one probe call is let through after recovery timeout
+    clock.now = 10
+    assert breaker.state == "half_open"
+    breaker.check()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+    # failed probe opens circuit again
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.retry_after == 10
+
+    clock.now = 20
+    breaker.check()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def test_polling_backoff() -> None:
+    clock = FakeClock()
+    backoff = PollingBackoff(
+        base_delay=10, max_delay=25, quarantine_after=4, clock=clock
+    )
+    app_id = TEST_APP_ID_UNKNOWN
+
+    # exponential delays: 10, 20, 25 (max)
+    for delay in (10, 20, 25):
+        state = backoff.record_failure(app_id)
+        assert state.retry_at == clock.now + delay
+        assert not backoff.is_due(app_id)
+        clock.now = state.retry_at
+        assert backoff.is_due(app_id)
+
+    backoff.record_failure(app_id)
+    clock.now += 1000
+    assert not backoff.is_due(app_id)
+    assert backoff.get_quarantined() == [app_id]
+
+    backoff.record_success(app_id)
+    assert backoff.is_due(app_id)
+    assert backoff.get_quarantined() == []
+
+
+@pytest.fixture
+def mock_external_failures(httpx_mock: HTTPXMock) -> None:
+    httpx_mock.add_response(status_code=503, is_reusable=True, is_optional=True)
+
+
+@pytest.mark.usefixtures("mock_external_failures")
+async def test_upstream_failures(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication
+) -> None:
+    worker = app.state.workers[0]
+    breaker = app.state.external.circuit_breaker
+    assert breaker
+    threshold = app.state.settings.HTTP_EXTERNAL_RSS_BREAKER_THRESHOLD
+
+    for _ in range(threshold):
+        with pytest.raises(HTTPException):
+            await worker.process(PollReviewsTask(TEST_APP_ID_UNKNOWN))
+
+    # failed app is not created
+    assert not await app.state.storage.get_app(TEST_APP_ID_UNKNOWN)
+
+    health = await client.get_health()
+    assert health.status == "degraded"
+    assert health.upstream.state == "open"
+    assert health.upstream.failures == threshold
+
+    # polls are skipped without upstream calls
+    with pytest.raises(CircuitOpenError):
+        await worker.process(PollReviewsTask(TEST_APP_ID_UNKNOWN))
+
+    scheduler = SchedulerService(
+        app.state.queue,
+        app.state.storage,
+        app.state.workers,
+        circuit_breaker=breaker,
+    )
+    await scheduler.process()
+    assert not app.state.queue._pending
+
+
+@pytest.mark.usefixtures("mock_external_failures")
+async def test_failed_app_backoff(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication
+) -> None:
+    await client.get_reviews(TEST_APP_ID_UNKNOWN)
+    failures = app.state.backoff.get_failures(TEST_APP_ID_UNKNOWN)
+    assert failures and failures.failures == 1
+    assert not app.state.backoff.is_due(TEST_APP_ID_UNKNOWN)
+
+
+@pytest.mark.usefixtures("mock_external_http_requests")
+async def test_partial_storefront_failure(
+    app: FastAPIApplication, mocker: MockerFixture, caplog: pytest.LogCaptureFixture
+) -> None:
+    queue = app.state.queue
+    await app.state.storage.create_app(
+        schemas.App(id=TEST_APP_ID_UNKNOWN, countries=["us", "gb"])
+    )
+    get_reviews = app.state.external.get_reviews
+
+    async def fail_gb(*args, country: str, **kwargs):
+        if country == "gb":
+            raise RuntimeError("storefront is down")
+        return await get_reviews(*args, country=country, **kwargs)
+
+    mocker.patch.object(app.state.external, "get_reviews", side_effect=fail_gb)
+
+    # reviews of the other storefront are stored, the App is not backed off
+    task = queue.push(TEST_APP_ID_UNKNOWN)
+    await queue.wait_all_pending_and_progress()
+    assert task.error is None
+    assert not app.state.backoff.get_failures(TEST_APP_ID_UNKNOWN)
+    reviews = await app.state.storage.get_review_list(TEST_APP_ID_UNKNOWN)
+    assert len(reviews) == TEST_REVIEWS_COUNT
+    assert {review.country for review in reviews} == {"us"}
+    assert "Failed storefront gb" in caplog.text
+
+
+@pytest.mark.usefixtures("mock_external_failures")
+async def test_failed_backfill_retry(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication, mocker: MockerFixture
+) -> None:
+    queue = app.state.queue
+    backfill = app.state.backfill
+    await queue.wait_all_pending_and_progress()
+    mocker.patch.object(app.state.external.circuit_breaker, "_failure_threshold", 100)
+    mocker.patch.object(backfill, "_retry_base_delay", 0.01)
+    push = mocker.spy(queue, "push_backfill")
+
+    await client.start_backfill(TEST_APP_ID_UNKNOWN)
+    while backfill.get_pending_apps():
+        await queue.wait_all_pending_and_progress()
+
+    # failed slice is retried with growing delay, then backfill is failed
+    max_attempts = app.state.settings.BACKFILL_MAX_ATTEMPTS
+    delays = [call.kwargs.get("delay", 0) for call in push.call_args_list]
+    assert delays == [0, *(0.01 * 2**idx for idx in range(max_attempts - 1))]
+    status = await client.get_backfill(TEST_APP_ID_UNKNOWN)
+    assert status.error and status.pending and not status.completed
+
+    # started again, it's resumed
+    status = await client.start_backfill(TEST_APP_ID_UNKNOWN)
+    assert status.error is None
+    assert backfill.get_pending_apps() == [TEST_APP_ID_UNKNOWN]
+
+
+@pytest.mark.usefixtures("mock_external_http_requests")
+async def test_graceful_shutdown(
+    settings_overrides: AppSettings, mocker: MockerFixture
+) -> None:
+    app = setup(settings_overrides)
+    async with LifespanManager(app):
+        await app.state.queue.push(TEST_APP_ID_INITIAL_1)
+        polled_at = app.state.queue.get_polled_at(TEST_APP_ID_INITIAL_1)
+        assert polled_at
+
+        # workers are busy while shutdown, so tasks are left pending
+        app.state.queue.close()
+        app.state.queue.push(TEST_APP_ID_UNKNOWN, urgent=True)
+        app.state.queue.push(TEST_APP_ID_INITIAL_1)
+
+    snapshot = QueueSnapshot.model_validate_json(
+        settings_overrides.POLLING_QUEUE_SNAPSHOT_PATH.read_text()
+    )
+    assert snapshot.tasks == [TEST_APP_ID_UNKNOWN, TEST_APP_ID_INITIAL_1]
+    assert snapshot.polled_at[TEST_APP_ID_INITIAL_1] == polled_at
+
+    # pending tasks are restored, recently polled apps are not scheduled again
+    app = setup(settings_overrides)
+    async with LifespanManager(app):
+        await app.state.queue.wait_all_pending_and_progress()
+        assert app.state.queue.get_polled_at(TEST_APP_ID_UNKNOWN)
+
+        spy = mocker.spy(app.state.queue, "push")
+        scheduler = SchedulerService(
+            app.state.queue, app.state.storage, app.state.workers
+        )
+        await scheduler.process()
+        assert {call.args[0] for call in spy.call_args_list} == {
+            app_id for app_id in TEST_APP_IDS_INITIAL if app_id != TEST_APP_ID_INITIAL_1
+        }
+
+
+async def test_flush_partially_polled_reviews(
+    app: FastAPIApplication, httpx_mock: HTTPXMock, mocker: MockerFixture
+) -> None:
+    pages = 0
+
+    async def callback(request: httpx.Request) -> httpx.Response:
+        nonlocal pages
+        pages += 1
+        if pages > 1:
+            await asyncio.Event().wait()  # hangs forever
+
+        path = app.state.settings.ROOT_DIR / "data" / "examples" / "2.json"
+        return httpx.Response(200, content=path.read_bytes())
+
+    httpx_mock.add_callback(callback, is_reusable=True, is_optional=True)
+
+    worker = app.state.workers[0]
+    mocker.patch.object(worker, "_polling_depth", timedelta(days=365 * 100))
+    task = asyncio.create_task(worker.process(PollReviewsTask(TEST_APP_ID_UNKNOWN)))
+    async with asyncio.timeout(1):
+        while pages < 2:
+            await asyncio.sleep(0.01)
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    reviews = await app.state.storage.get_review_list(TEST_APP_ID_UNKNOWN)
+    assert len(reviews) == 3
+
+
+@pytest.mark.usefixtures("mock_external_http_requests")
+async def test_worker_pool_autoscaling(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication, mocker: MockerFixture
+) -> None:
+    queue = app.state.queue
+    supervisor = app.state.supervisor
+    await queue.wait_all_pending_and_progress()
+    initial = supervisor.size
+    assert supervisor.evaluate() is None
+
+    release = asyncio.Event()
+    failure: Exception | None = None
+
+    async def process(self: DataPollingWorker, task: PollReviewsTask) -> None:
+        await release.wait()
+        if failure:
+            raise failure
+
+    mocker.patch.object(DataPollingWorker, "process", process)
+
+    # backlog is waiting too long: grow to drain it in time
+    for app_id in range(100, 100 + 3 * initial):
+        queue.push(app_id)
+    await asyncio.sleep(0)
+    for *_, task in queue._queue:
+        task.queued_at -= 60
+    event = supervisor.evaluate()
+    assert event and event.reason == "backlog"
+    assert event.workers_before == initial
+    assert event.workers_after == supervisor.size > initial
+    await asyncio.sleep(0)
+    assert queue.in_progress == supervisor.size
+
+    release.set()
+    await queue.wait_all_pending_and_progress()
+
+    # idle for a while: shrink by one worker at a time
+    assert supervisor.evaluate() is None
+    assert supervisor.evaluate() is None
+    event = supervisor.evaluate()
+    assert event and event.reason == "idle"
+    assert event.workers_after == event.workers_before - 1
+
+    # upstream fails: shrink to the half, but not below the minimum
+    failure = RuntimeError("upstream is down")
+    for app_id in range(100, 110):
+        queue.push(app_id)
+    await queue.wait_all_pending_and_progress()
+    event = supervisor.evaluate()
+    assert event and event.reason == "upstream_errors"
+    assert event.error_ratio == 1.0
+    assert event.workers_after == max(
+        -(-event.workers_before // 2), app.state.settings.POLLING_WORKERS_MIN
+    )
+
+    status = await client.get_worker_pool()
+    assert status.workers == supervisor.size == len(app.state.workers)
+    assert [event.reason for event in status.events] == [
+        "backlog",
+        "idle",
+        "upstream_errors",
+    ]
+
+
+def test_queue_earliest_deadline_first() -> None:
+    queue = DataPollingQueue()
+    now = time.monotonic()
+    queue.push(1, deadline=now + 100)
+    queue.push(2, deadline=now + 10)
+    queue.push(3)
+    queue.push(4, urgent=True)
+    queue.push(1, deadline=now - 1)  # duplicate moves forward, not backward
+    queue.push(2, deadline=now + 1000)
+
+    assert [queue._take() for _ in range(4)] == [
+        queue.get_task(app_id) for app_id in (4, 1, 3, 2)
+    ]
+
+
+@pytest.mark.usefixtures("mock_external_http_requests")
+async def test_freshness_tiers(
+    client: AppStoreReviewViewerAdapter, app: FastAPIApplication, mocker: MockerFixture
+) -> None:
+    queue = app.state.queue
+    settings = app.state.settings
+    app_info = await client.update_app(
+        TEST_APP_ID_UNKNOWN, schemas.UpdateAppRequest(countries=["us"], tier="flagship")
+    )
+    assert app_info.tier == "flagship"
+    await queue.wait_all_pending_and_progress()
+    stored = await app.state.storage.get_app(TEST_APP_ID_UNKNOWN)
+    assert stored and stored.tier == "flagship"
+
+    # tier is kept if it's not given
+    app_info = await client.update_app(
+        TEST_APP_ID_UNKNOWN, schemas.UpdateAppRequest(countries=["us"])
+    )
+    assert app_info.tier == "flagship"
+    await queue.wait_all_pending_and_progress()
+
+    for app_id in TEST_APP_IDS_INITIAL:
+        await app.state.workers[0].process(PollReviewsTask(app_id))
+        queue._polled_at[app_id] = datetime.now(timezone.utc) - timedelta(minutes=20)
+    queue._polled_at[TEST_APP_ID_UNKNOWN] -= timedelta(seconds=90)
+
+    # workers are saturated: only the flagship app is scheduled, due by its SLA
+    spy = mocker.spy(queue, "push")
+    scheduler = SchedulerService(
+        queue,
+        app.state.storage,
+        app.state.workers,
+        slas=settings.POLLING_TIER_SLA,
+        shed_backlog=0,
+    )
+    await scheduler.process()
+    assert [call.args[0] for call in spy.call_args_list] == [TEST_APP_ID_UNKNOWN]
+    task = queue.get_task(TEST_APP_ID_UNKNOWN)
+    assert task and 0 < task.deadline - time.monotonic() <= 30
+    assert scheduler.last_shed == {"standard": len(TEST_APP_IDS_INITIAL)}
+    await queue.wait_all_pending_and_progress()
+
+    app.state.scheduler = scheduler
+    health = await client.get_health()
+    freshness = {item.tier: item for item in health.freshness}
+    assert freshness["flagship"].apps == 1
+    assert freshness["flagship"].breaches == 0
+    assert freshness["flagship"].lag < settings.POLLING_TIER_SLA["flagship"].seconds
+    assert freshness["standard"].apps == len(TEST_APP_IDS_INITIAL)
+    assert freshness["standard"].breaches == len(TEST_APP_IDS_INITIAL)
+    assert freshness["standard"].lag >= 20 * 60
+    assert freshness["standard"].shed == len(TEST_APP_IDS_INITIAL)
+    assert freshness["low"].apps == 0